@@ -0,0 +1,193 @@
+# admissao.py - Controle de admissão das rotas que chamam a IA
+#
+# No máximo `limite` requisições conversam com a API Gemini ao mesmo tempo;
+# as seguintes esperam numa fila de tamanho limitado, por ordem de chegada, até
+# `espera_max` segundos. Fila cheia ou prazo estourado viram Sobrecarga na hora
+# (o app responde 503 com Retry-After) em vez de empilhar chamadas que a API vai
+# estrangular: sob pico, a latência de quem entra fica previsível.
+#
+# Serve tanto para threads (app Flask) quanto para o loop asyncio (app_asgi):
+# quem libera a vaga a entrega diretamente ao primeiro da fila.
+
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+FILA_CHEIA = "fila_cheia"
+PRAZO = "prazo"
+
+
+class Sobrecarga(Exception):
+    """Requisição recusada pelo controle de admissão."""
+
+    def __init__(self, motivo, retry_after):
+        super().__init__(f"Sobrecarga ({motivo}); tente novamente em {retry_after} s")
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class _EsperaThread:
+    __slots__ = ("evento",)
+
+    def __init__(self):
+        self.evento = threading.Event()
+
+    def liberar(self):
+        self.evento.set()
+
+
+class _EsperaAsync:
+    __slots__ = ("loop", "futuro")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.futuro = loop.create_future()
+
+    def liberar(self):
+        self.loop.call_soon_threadsafe(self._resolver)
+
+    def _resolver(self):
+        if not self.futuro.done():
+            self.futuro.set_result(None)
+
+
+class AdmissionController:
+    """Limite de concorrência com fila FIFO limitada e prazo de espera na fila."""
+
+    def __init__(self, limite=16, max_fila=32, espera_max=5.0):
+        self.limite = max(int(limite), 1)
+        self.max_fila = max(int(max_fila), 0)
+        self.espera_max = espera_max
+        self.em_andamento = 0
+        self._fila = deque()
+        self._lock = threading.Lock()
+        self._duracao_media = 1.0  # média móvel do tempo com a vaga (para o Retry-After)
+        self.admitidas = 0
+        self.recusadas = {FILA_CHEIA: 0, PRAZO: 0}
+        self.ao_esperar = None  # callback(segundos na fila), ex.: histograma
+
+    @property
+    def na_fila(self):
+        return len(self._fila)
+
+    def retry_after(self):
+        """Segundos estimados até a fila andar o bastante para uma nova requisição entrar."""
+        return max(1, math.ceil(self._duracao_media * (len(self._fila) + 1) / self.limite))
+
+    def _tentar_entrar(self, espera_factory):
+        """Sob o lock: None se entrou direto; senão a espera colocada na fila."""
+        if self.em_andamento < self.limite and not self._fila:
+            self.em_andamento += 1
+            self.admitidas += 1
+            return None
+        if len(self._fila) >= self.max_fila:
+            self.recusadas[FILA_CHEIA] += 1
+            raise Sobrecarga(FILA_CHEIA, self.retry_after())
+        espera = espera_factory()
+        self._fila.append(espera)
+        return espera
+
+    def _desistir(self, espera):
+        """Sob o lock, depois do prazo: True se saiu da fila; False se a vaga chegou junto."""
+        try:
+            self._fila.remove(espera)
+        except ValueError:
+            return False
+        self.recusadas[PRAZO] += 1
+        return True
+
+    def _liberar(self, duracao=None):
+        with self._lock:
+            if duracao is not None:
+                self._duracao_media += 0.2 * (duracao - self._duracao_media)
+            if self._fila:
+                # A vaga passa direto para o primeiro da fila (em_andamento não muda)
+                self.admitidas += 1
+                self._fila.popleft().liberar()
+            else:
+                self.em_andamento -= 1
+
+    def _admitido(self, inicio):
+        if self.ao_esperar:
+            self.ao_esperar(time.monotonic() - inicio)
+        return time.monotonic()
+
+    def entrar(self):
+        """
+        Ocupa uma vaga, esperando na fila se preciso; retorna o instante de entrada
+        (para sair()). Sobrecarga se a fila estiver cheia ou o prazo estourar.
+        """
+        inicio = time.monotonic()
+        with self._lock:
+            espera = self._tentar_entrar(_EsperaThread)
+        if espera is not None and not espera.evento.wait(self.espera_max):
+            with self._lock:
+                if self._desistir(espera):
+                    raise Sobrecarga(PRAZO, self.retry_after())
+        return self._admitido(inicio)
+
+    async def entrar_async(self):
+        """Como entrar(), esperando no loop asyncio em vez de bloquear a thread."""
+        inicio = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            espera = self._tentar_entrar(lambda: _EsperaAsync(loop))
+        if espera is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(espera.futuro), self.espera_max)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                with self._lock:
+                    desistiu = self._desistir(espera)
+                if not desistiu:
+                    self._liberar()  # a vaga chegou junto com o prazo/cancelamento: devolve-a
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise Sobrecarga(PRAZO, self.retry_after()) from None
+        return self._admitido(inicio)
+
+    def sair(self, entrada):
+        """Libera a vaga ocupada desde `entrada` (o retorno de entrar())."""
+        self._liberar(time.monotonic() - entrada)
+
+    @contextmanager
+    def vaga(self):
+        """Ocupa uma vaga durante o bloco."""
+        entrada = self.entrar()
+        try:
+            yield
+        finally:
+            self.sair(entrada)
+
+    @asynccontextmanager
+    async def vaga_async(self):
+        entrada = await self.entrar_async()
+        try:
+            yield
+        finally:
+            self.sair(entrada)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limite,
+                "in_flight": self.em_andamento,
+                "queued": len(self._fila),
+                "max_queue": self.max_fila,
+                "max_wait_seconds": self.espera_max,
+                "admitted": self.admitidas,
+                "rejected": dict(self.recusadas),
+                "avg_seconds": round(self._duracao_media, 3),
+            }
+
+
+def create_admission_controller():
+    """AdmissionController configurado por ADMISSION_LIMIT, ADMISSION_QUEUE e ADMISSION_MAX_WAIT_SECONDS."""
+    return AdmissionController(
+        limite=int(os.environ.get('ADMISSION_LIMIT', '16')),
+        max_fila=int(os.environ.get('ADMISSION_QUEUE', '32')),
+        espera_max=float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', '5')),
+    )
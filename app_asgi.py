@@ -0,0 +1,401 @@
+# app_asgi.py - Modo assíncrono (ASGI) do app_web_avancada
+#
+# As rotas de chat (/api/chat e /api/chat/stream) rodam de forma nativamente
+# assíncrona com o cliente `client.aio`, então um único processo mantém centenas
+# de chamadas à IA em andamento. As demais rotas (página, admin, status) são do
+# próprio Flask, servidas pelo adaptador WSGI -> ASGI do asgiref.
+#
+# Uso: uvicorn app_asgi:app --workers 2
+#  ou: gunicorn app_asgi:app -k uvicorn.workers.UvicornWorker
+
+import json
+import time
+import uuid
+import asyncio
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from google.genai import types
+
+import app_web_avancada as web
+from admissao import Sobrecarga
+from resiliencia import CircuitoAberto, com_timeout, retentavel
+
+if not web.history_store.fora_da_requisicao:
+    raise ValueError("HISTORY_STORE=cookie não é suportado no modo ASGI; use 'memory' ou 'sqlite'.")
+
+flask_asgi = WsgiToAsgi(web.app)
+session_serializer = web.app.session_interface.get_signing_serializer(web.app)
+SESSION_COOKIE = web.app.config["SESSION_COOKIE_NAME"]
+SESSION_MAX_AGE = int(web.app.permanent_session_lifetime.total_seconds())
+
+
+# --- Sessão e respostas HTTP ---
+
+def load_session(scope):
+    """Lê a sessão assinada do Flask a partir do cookie (dict vazio se inválida)."""
+    for nome, valor in scope.get("headers", []):
+        if nome == b"cookie":
+            cookie = SimpleCookie(valor.decode("latin-1")).get(SESSION_COOKIE)
+            if cookie:
+                try:
+                    return session_serializer.loads(cookie.value, max_age=SESSION_MAX_AGE)
+                except BadSignature:
+                    return {}
+    return {}
+
+def session_headers(sessao, sessao_nova):
+    """Cabeçalho Set-Cookie quando a sessão foi criada nesta requisição."""
+    if not sessao_nova:
+        return []
+    valor = session_serializer.dumps(sessao)
+    return [(b"set-cookie", f"{SESSION_COOKIE}={valor}; HttpOnly; Path=/; SameSite=Lax".encode("latin-1"))]
+
+async def read_json(receive):
+    corpo = b""
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get("body", b"")
+        if not mensagem.get("more_body"):
+            break
+    try:
+        return json.loads(corpo or b"{}")
+    except ValueError:
+        return {}
+
+def dumps_json(dados):
+    return json.dumps(dados, ensure_ascii=False).encode("utf-8")
+
+async def send_json(send, dados, headers=(), status=200):
+    corpo = web.timed("serializar_json", dumps_json, dados)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())] + list(headers),
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+# --- Chamadas assíncronas à IA ---
+
+async def timed_thread(etapa, func, *args):
+    """web.timed numa thread: I/O de disco e travas (SQLite, arquivos, flock) fora do loop."""
+    return await asyncio.to_thread(web.timed, etapa, func, *args)
+
+async def timed_async(etapa, awaitable):
+    """Aguarda `awaitable` e registra quanto tempo a etapa levou."""
+    inicio = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        web.record_stage(etapa, inicio)
+
+async def classify_intent_async(user_message):
+    try:
+        response = await web.classifier_caller.chamar_async(lambda timeout: web.client.aio.models.generate_content(
+            model=web.MODEL,
+            contents=[types.Content(role="user", parts=[types.Part(text=user_message)])],
+            config=com_timeout(web.CLASSIFIER_CONFIG, timeout),
+        ))
+        web.record_usage("classificador", response)
+        return response.text.strip().lower()
+    except Exception as e:
+        print(f"Erro ao classificar a intenção: {e}")
+        web.ERROS_GEMINI.inc(chamada="classificador")
+        return "chat"
+
+async def get_gemini_response_async(history, user_message, config=None):
+    """Versão assíncrona de get_gemini_response (mesmo contrato sobre `history`)."""
+    try:
+        history.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
+        config = config or web.get_generate_config()
+        inicio = time.perf_counter()
+        try:
+            response = await web.gemini_caller.chamar_async(lambda timeout: web.client.aio.models.generate_content(
+                model=web.MODEL, contents=history, config=com_timeout(config, timeout)))
+        except Exception as e:
+            if not config.cached_content or retentavel(e) or isinstance(e, CircuitoAberto):
+                raise
+            web.context_cache_failed(config, e)
+            config = web.inline_generate_config(user_message)
+            inicio = time.perf_counter()
+            response = await web.gemini_caller.chamar_async(lambda timeout: web.client.aio.models.generate_content(
+                model=web.MODEL, contents=history, config=com_timeout(config, timeout)))
+        web.GEMINI_SEGUNDOS.observe(time.perf_counter() - inicio, chamada="resposta", contexto=web.context_label(config))
+        web.record_usage("resposta", response, web.context_label(config))
+        history.append(types.Content(role="model", parts=[types.Part(text=response.text)]))
+        return response.text
+    except Exception as e:
+        print(f"Erro ao chamar a API Gemini: {e}")
+        web.ERROS_GEMINI.inc(chamada="resposta")
+        return web.fallback_response(user_message)
+
+async def encadear(primeiro, iterador):
+    """O primeiro trecho (já lido) seguido do resto do stream."""
+    if primeiro is None:
+        return
+    yield primeiro
+    async for chunk in iterador:
+        yield chunk
+
+async def stream_gemini_response_async(history, user_message, config=None):
+    """Versão assíncrona de stream_gemini_response."""
+    history.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
+    config = config or web.get_generate_config()
+
+    async def abrir_stream(timeout):
+        # As retentativas valem só até o primeiro trecho chegar
+        iterador = (await web.client.aio.models.generate_content_stream(
+            model=web.MODEL,
+            contents=history,
+            config=com_timeout(config, timeout),
+        )).__aiter__()
+        try:
+            return await iterador.__anext__(), iterador
+        except StopAsyncIteration:
+            return None, None
+
+    trechos = []
+    chunk = None
+    inicio = time.perf_counter()
+    try:
+        primeiro, iterador = await web.gemini_caller.chamar_async(abrir_stream, hedge=False)
+        async for chunk in encadear(primeiro, iterador):
+            if chunk.text:
+                trechos.append(chunk.text)
+                yield chunk.text
+        web.GEMINI_SEGUNDOS.observe(time.perf_counter() - inicio, chamada="resposta_stream", contexto=web.context_label(config))
+        web.record_usage("resposta", chunk, web.context_label(config))
+    except Exception as e:
+        if config.cached_content and not trechos and not retentavel(e) and not isinstance(e, CircuitoAberto):
+            web.context_cache_failed(config, e)
+            history.pop()
+            async for trecho in stream_gemini_response_async(history, user_message, web.inline_generate_config(user_message)):
+                yield trecho
+            return
+        print(f"Erro ao chamar a API Gemini (streaming): {e}")
+        web.ERROS_GEMINI.inc(chamada="resposta")
+        if not trechos:
+            yield web.fallback_response(user_message)
+            return
+    history.append(types.Content(role="model", parts=[types.Part(text="".join(trechos))]))
+
+
+# --- Rotas assíncronas ---
+
+async def single_chunk(texto):
+    """Stream de um único trecho (resposta vinda do cache)."""
+    yield texto
+
+def prepare_session(scope):
+    """Sessão do Flask com um id de conversa garantido."""
+    web.load_knowledge_base()
+    sessao = load_session(scope)
+    sessao_nova = "sid" not in sessao
+    if sessao_nova:
+        sessao["sid"] = uuid.uuid4().hex
+    return sessao, sessao_nova
+
+def client_ip(scope):
+    """IP do cliente, com o mesmo critério do ProxyFix do app Flask (TRUSTED_PROXIES)."""
+    if web.TRUSTED_PROXIES > 0:
+        encaminhado = ",".join(valor.decode("latin-1") for nome, valor in scope.get("headers", [])
+                               if nome == b"x-forwarded-for")
+        ips = [ip.strip() for ip in encaminhado.split(",") if ip.strip()]
+        if len(ips) >= web.TRUSTED_PROXIES:
+            return ips[-web.TRUSTED_PROXIES]
+    return (scope.get("client") or (None,))[0]
+
+async def send_rate_limited(scope, send, sid, headers, rota, inicio):
+    """429 com Retry-After se a sessão ou o IP passou do limite; False se pode seguir."""
+    if web.rate_limiter is None:
+        return False
+    ip = client_ip(scope)
+    permitido, retry_after = await asyncio.to_thread(web.rate_limiter.permitir, sid, ip)
+    if permitido:
+        return False
+    await send_json(send, {"type": "text", "resposta": web.MENSAGEM_LIMITE},
+                    headers + [(b"retry-after", str(retry_after).encode("latin-1"))], status=429)
+    web.finish_request(rota, "limitada", inicio)
+    return True
+
+async def send_overloaded(send, erro, headers, rota, inicio):
+    """503 com Retry-After quando o controle de admissão recusa a requisição."""
+    print(f"Requisição recusada pelo controle de admissão: {erro}")
+    await send_json(send, {"type": "text", "resposta": web.MENSAGEM_SOBRECARGA},
+                    headers + [(b"retry-after", str(erro.retry_after).encode("latin-1"))], status=503)
+    web.finish_request(rota, "sobrecarga", inicio)
+
+async def chat_api(scope, receive, send):
+    data = await read_json(receive)
+    user_message = data.get("mensagem")
+    if not user_message:
+        await send_json(send, {"resposta": "Por favor, envie uma mensagem."})
+        return
+
+    inicio = time.perf_counter()
+    sessao, sessao_nova = await asyncio.to_thread(prepare_session, scope)
+    headers = session_headers(sessao, sessao_nova)
+    sid = sessao["sid"]
+    if await send_rate_limited(scope, send, sid, headers, "chat_api_async", inicio):
+        return
+    intent = web.timed("local_intent", web.local_intent, user_message)
+    if intent in web.CONTACT_LINKS:
+        await send_json(send, web.contact_button_response(intent), headers)
+        web.finish_request("chat_api_async", "botao", inicio)
+        return
+
+    history = await timed_thread("carregar_historico", web.history_store.load, sid)
+    await timed_thread("compactar_historico", web.compact_history, sid, history)
+    turnos_anteriores = len(history)
+    versao = web.knowledge.index.geracao
+
+    origem = "faq"
+    ia_response_text = await timed_thread("faq_local", web.faq_response, history, user_message)
+    if ia_response_text is None:
+        origem = "cache"
+        ia_response_text = web.timed("cache_respostas", web.cached_response, history, user_message, versao)
+    if ia_response_text is not None:
+        await timed_thread("salvar_historico", web.history_store.append, sid, history[turnos_anteriores:])
+        await send_json(send, {"type": "text", "resposta": ia_response_text}, headers)
+        web.finish_request("chat_api_async", origem, inicio)
+        return
+
+    # Uma vaga por requisição cobre o classificador e a resposta da IA
+    try:
+        async with web.admission.vaga_async():
+            config = await timed_thread("get_generate_config", web.get_generate_config, user_message)
+            if intent is None and web.SPECULATIVE_CHAT:
+                # Especulativo: a resposta é cancelada de fato se a intenção for um botão
+                historico_especulativo = list(history)
+                tarefa_intent = asyncio.create_task(timed_async("classify_intent (especulativo)", classify_intent_async(user_message)))
+                tarefa_resposta = asyncio.create_task(timed_async(
+                    "get_gemini_response (especulativo)", get_gemini_response_async(historico_especulativo, user_message, config)
+                ))
+                intent = await tarefa_intent
+                if intent in web.CONTACT_LINKS:
+                    tarefa_resposta.cancel()
+                else:
+                    ia_response_text = await tarefa_resposta
+                    history[:] = historico_especulativo
+            elif intent is None:
+                intent = await timed_async("classify_intent", classify_intent_async(user_message))
+
+            if intent not in web.CONTACT_LINKS and ia_response_text is None:
+                ia_response_text = await timed_async("get_gemini_response", get_gemini_response_async(history, user_message, config))
+    except Sobrecarga as e:
+        await send_overloaded(send, e, headers, "chat_api_async", inicio)
+        return
+
+    if intent in web.CONTACT_LINKS:
+        await send_json(send, web.contact_button_response(intent), headers)
+        web.finish_request("chat_api_async", "botao", inicio)
+        return
+
+    web.remember_response(turnos_anteriores, user_message, versao, ia_response_text)
+    await timed_thread("salvar_historico", web.history_store.append, sid, history[turnos_anteriores:])
+    web.schedule_compaction(sid, history)
+
+    await send_json(send, {"type": "text", "resposta": ia_response_text}, headers)
+    web.finish_request("chat_api_async", "ia", inicio)
+
+async def chat_stream_api(scope, receive, send):
+    data = await read_json(receive)
+    user_message = data.get("mensagem")
+    if not user_message:
+        await send_json(send, {"resposta": "Por favor, envie uma mensagem."})
+        return
+
+    inicio = time.perf_counter()
+    sessao, sessao_nova = await asyncio.to_thread(prepare_session, scope)
+    headers = session_headers(sessao, sessao_nova)
+    sid = sessao["sid"]
+    if await send_rate_limited(scope, send, sid, headers, "chat_stream_api_async", inicio):
+        return
+    intent = web.timed("local_intent", web.local_intent, user_message)
+    if intent in web.CONTACT_LINKS:
+        # Botão de contato do roteador local: responde antes de ocupar uma vaga
+        await send_json(send, web.contact_button_response(intent), headers)
+        web.finish_request("chat_stream_api_async", "botao", inicio)
+        return
+    history = await timed_thread("carregar_historico", web.history_store.load, sid)
+    await timed_thread("compactar_historico", web.compact_history, sid, history)
+    turnos_anteriores = len(history)
+    versao = web.knowledge.index.geracao
+    origem = "faq"
+    resposta_cache = await timed_thread("faq_local", web.faq_response, history, user_message)
+    if resposta_cache is None:
+        origem = "cache"
+        resposta_cache = web.timed("cache_respostas", web.cached_response, history, user_message, versao)
+
+    entrada = None
+    if resposta_cache is None:
+        # A vaga vale até o fim do stream
+        try:
+            entrada = await web.admission.entrar_async()
+        except Sobrecarga as e:
+            await send_overloaded(send, e, headers, "chat_stream_api_async", inicio)
+            return
+    try:
+        if resposta_cache is None:
+            if intent is None:
+                intent = await timed_async("classify_intent", classify_intent_async(user_message))
+            if intent in web.CONTACT_LINKS:
+                await send_json(send, web.contact_button_response(intent), headers)
+                web.finish_request("chat_stream_api_async", "botao", inicio)
+                return
+            config = await timed_thread("get_generate_config", web.get_generate_config, user_message)
+            trechos = stream_gemini_response_async(history, user_message, config)
+        else:
+            trechos = single_chunk(resposta_cache)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ] + headers,
+        })
+        primeiro = True
+        inicio_ia = time.perf_counter()
+        async for trecho in trechos:
+            if primeiro:
+                web.record_stage("primeiro_trecho", inicio)
+                primeiro = False
+            await send({"type": "http.response.body", "body": web.sse_event("chunk", {"texto": trecho}).encode("utf-8"), "more_body": True})
+    finally:
+        if entrada is not None:
+            web.admission.sair(entrada)
+    if resposta_cache is None:
+        web.record_stage("get_gemini_response", inicio_ia)
+        if len(history) > turnos_anteriores + 1:
+            web.remember_response(turnos_anteriores, user_message, versao, history[-1].parts[0].text)
+    await timed_thread("salvar_historico", web.history_store.append, sid, history[turnos_anteriores:])
+    web.schedule_compaction(sid, history)
+    web.finish_request("chat_stream_api_async", "ia" if resposta_cache is None else origem, inicio)
+    await send({"type": "http.response.body", "body": web.sse_event("done", {}).encode("utf-8")})
+
+ROTAS_ASYNC = {
+    "/api/chat": chat_api,
+    "/api/chat/stream": chat_stream_api,
+}
+
+async def app(scope, receive, send):
+    """Aplicação ASGI: rotas de chat assíncronas, o resto delegado ao Flask."""
+    if scope["type"] == "lifespan":
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensagem["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    rota = ROTAS_ASYNC.get(scope.get("path"))
+    if scope["type"] == "http" and scope["method"] == "POST" and rota:
+        await rota(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -28,7 +28,8 @@ def chat():
     pergunta_usuario = dados.get('pergunta')
     
     # 2.3. Processamento: Envia a pergunta para a nossa assistente
-    resposta_assistente = assistente.obter_resposta(pergunta_usuario)
+    # O campo opcional 'usuario' (ou o IP) identifica quem pergunta no rodízio de versículos
+    resposta_assistente = assistente.obter_resposta(pergunta_usuario, usuario=dados.get('usuario') or request.remote_addr)
     
     # 2.4. Saída: Retorna a resposta em formato JSON
     return jsonify({
@@ -2,15 +2,47 @@
 
 import os
 import json
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-
-# Importação do Bcrypt para segurança
-import bcrypt # <<< ADICIONADO BCrypt
+import time
+import logging
+import uuid
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, stream_with_context, g
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Importação do Google GenAI
-from google import genai
 from google.genai import types
 
+# Cliente Gemini compartilhado por processo, com pool de conexões configurado
+from cliente_gemini import SharedClient
+from resiliencia import CircuitoAberto, com_timeout, create_classifier_caller, create_resilient_caller, retentavel
+
+# Roteador de intenções local (evita a chamada ao classificador da IA)
+from intencao_local import classificar_intencao_local
+
+# Histórico da conversa guardado no servidor (o cookie leva apenas o id da sessão)
+from historico_store import create_history_store
+from compactacao_historico import HistoryCompactor, resumo_extrativo, texto_do_turno
+
+# Versão do conhecimento compartilhada entre workers, com índice BM25 incremental
+from snapshot_conhecimento import KnowledgeSnapshot
+from cache_config import GenerateConfigCache
+from cache_respostas import ResponseCache
+from cache_contexto import ContextCache
+from faq_local import FaqEngine
+from admissao import Sobrecarga, create_admission_controller
+from limite_taxa import create_rate_limiter
+from login_admin import OK, LIMITADO, OCUPADO, ERRO_HASH, create_admin_login
+from dados_biblicos import carregar_indice_versiculos
+from rotacao_versiculos import VerseRotation
+
+# Latência por etapa e contagem de tokens, expostas em /metrics (formato Prometheus)
+from metricas import Registro
+
+# Conversas, acessos e tempos gravados por uma thread (fila + lotes + rotação)
+from log_conversas import LOGGER_TEMPOS, configurar_log_conversas
+
 # --- Configuração de Links de Contato ---
 CONTACT_LINKS = {
     "whatsapp": {
@@ -47,42 +79,173 @@ FALLBACK_HASH = b'$2b$12$YX534jsnUF5o7dREGvON4.dnNoIQgSVN6gPAX8jJn58qYuJwCHj8y'
 ADMIN_USER = os.environ.get('ADMIN_USER', 'admin_esperanca') 
 ADMIN_PASSWORD_HASH = os.environ.get('ADMIN_PASSWORD_HASH', FALLBACK_HASH.decode('utf-8')) 
 
-client = genai.Client()
+client = SharedClient()
 app = Flask(__name__)
+configurar_log_conversas()
+log_tempos = logging.getLogger(LOGGER_TEMPOS)
+
+# Quantos proxies reversos (roteador do Heroku/Render, nginx...) ficam na frente
+# do app. Com 0, X-Forwarded-For é ignorado; atrás de um proxy, sem esta
+# configuração, request.remote_addr seria o IP do proxy para todos os clientes.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', '0'))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
 # CRÍTICO: Garante que você tenha um FLASK_SECRET_KEY configurado para usar `flash` e `session`
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'sua_chave_secreta_padrao_muito_segura') 
 
+# bcrypt fora da thread da requisição, tentativas limitadas por IP e usuário e token assinado de curta duração
+admin_login_guard = create_admin_login(ADMIN_USER, ADMIN_PASSWORD_HASH, app.secret_key)
+
 KNOWLEDGE_FILE = 'conhecimento_esperancapontalsul.txt'
 
+# Confiança mínima para aceitar a intenção do roteador local sem consultar a IA.
+# Use um valor acima de 1 para desativar o roteador local.
+INTENT_CONFIDENCE_THRESHOLD = float(os.environ.get('INTENT_CONFIDENCE_THRESHOLD', '0.75'))
+
+# Modo especulativo: quando o classificador da IA é necessário, dispara a
+# classificação e a resposta ao mesmo tempo em vez de uma depois da outra.
+SPECULATIVE_CHAT = os.environ.get('SPECULATIVE_CHAT', '0') == '1'
+SPECULATIVE_WORKERS = int(os.environ.get('SPECULATIVE_WORKERS', '8'))
+speculative_pool = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix='especulativo')
+
+# HISTORY_STORE=cookie guarda os turnos num cookie assinado próprio (formato compacto)
+HISTORY_COOKIE = 'hope_historico'
+
+def read_history_cookie():
+    return g.history_cookie if 'history_cookie' in g else request.cookies.get(HISTORY_COOKIE)
+
+def write_history_cookie(valor):
+    g.history_cookie = valor
+
+history_store = create_history_store(cookie=(read_history_cookie, write_history_cookie, app.secret_key))
+
+@app.after_request
+def send_history_cookie(response):
+    if 'history_cookie' in g:
+        if g.history_cookie is None:
+            response.delete_cookie(HISTORY_COOKIE)
+        else:
+            response.set_cookie(HISTORY_COOKIE, g.history_cookie, max_age=history_store.ttl_seconds or None,
+                                httponly=True, samesite='Lax')
+    return response
+
+# Compactação do histórico: os últimos turnos vão literais e os anteriores viram um
+# resumo ('local' = extrativo, 'ia' = gerado pela IA em segundo plano, 'off' = desativada)
+HISTORY_SUMMARY = os.environ.get('HISTORY_SUMMARY', 'local').lower()
+HISTORY_KEEP_TURNS = int(os.environ.get('HISTORY_KEEP_TURNS', '4'))
+HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', '2000'))
+HISTORY_SUMMARY_TOKENS = int(os.environ.get('HISTORY_SUMMARY_TOKENS', '300'))
+
+# FAQ local: respostas prontas geradas do arquivo de conhecimento, sem chamar a IA
+FAQ_LOCAL = os.environ.get('FAQ_LOCAL', '1') == '1'
+faq_engine = FaqEngine()
+
+# Versículo do dia: a mesma semente e o mesmo fuso dão o mesmo versículo em todas as instâncias
+verse_rotation = VerseRotation(
+    carregar_indice_versiculos().versiculos,
+    semente=os.environ.get('VERSE_SEED', 'hope'),
+    baldes=int(os.environ.get('VERSE_USER_BUCKETS', '64')),
+    fuso=os.environ.get('VERSE_TIMEZONE', 'America/Sao_Paulo'),
+)
+
+# Limite de mensagens por sessão e por IP (janela deslizante de 1 minuto)
+RATE_LIMIT = os.environ.get('RATE_LIMIT', '1') == '1'
+rate_limiter = create_rate_limiter() if RATE_LIMIT else None
+
+# Controle de admissão: no máximo ADMISSION_LIMIT requisições falando com a IA ao mesmo
+# tempo; as demais esperam numa fila limitada ou recebem 503 com Retry-After
+admission = create_admission_controller()
+
+# Cache de respostas para perguntas repetidas (só na primeira mensagem da conversa)
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', '1') == '1'
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '500')),
+    ttl_seconds=int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '3600')),
+    similarity=float(os.environ.get('RESPONSE_CACHE_SIMILARITY', '0.8')),
+)
+
+# Streaming (SSE): a interface mostra a resposta à medida que a IA gera os trechos
+# (desligado com o histórico no cookie: o cookie sai antes do fim do stream)
+CHAT_STREAMING = os.environ.get('CHAT_STREAMING', '1') == '1' and history_store.fora_da_requisicao
+
+# Recuperação do conhecimento: o arquivo inteiro só vai no prompt se couber no orçamento
+KNOWLEDGE_RETRIEVAL = os.environ.get('KNOWLEDGE_RETRIEVAL', '1') == '1'
+KNOWLEDGE_TOP_K = int(os.environ.get('KNOWLEDGE_TOP_K', '4'))
+KNOWLEDGE_TOKEN_BUDGET = int(os.environ.get('KNOWLEDGE_TOKEN_BUDGET', '1500'))
+
+# Cache de contexto do Gemini: a instrução completa (persona + conhecimento) fica
+# guardada no servidor do Gemini e as chamadas só referenciam o cache
+CONTEXT_CACHE = os.environ.get('CONTEXT_CACHE', '0') == '1'
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get('CONTEXT_CACHE_TTL_SECONDS', '3600'))
+CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get('CONTEXT_CACHE_MIN_TOKENS', '1024'))
+
+knowledge = KnowledgeSnapshot(KNOWLEDGE_FILE)
+
+metricas = Registro()
+ETAPA_SEGUNDOS = metricas.histograma(
+    "hope_chat_etapa_seconds", "Duração de cada etapa do pipeline do chat.", ("etapa",))
+REQUISICAO_SEGUNDOS = metricas.histograma(
+    "hope_chat_requisicao_seconds", "Duração total das requisições de chat.", ("rota", "resultado"))
+TOKENS_GEMINI = metricas.contador(
+    "hope_gemini_tokens_total", "Tokens informados no usage_metadata das respostas da IA.", ("chamada", "tipo", "contexto"))
+GEMINI_SEGUNDOS = metricas.histograma(
+    "hope_gemini_chamada_seconds", "Duração das chamadas de resposta à API Gemini, com e sem cache de contexto.",
+    ("chamada", "contexto"))
+ERROS_GEMINI = metricas.contador(
+    "hope_gemini_erros_total", "Chamadas à API Gemini que falharam.", ("chamada",))
+CONSULTAS_FAQ = metricas.contador(
+    "hope_faq_consultas_total", "Mensagens conferidas no FAQ local (acerto responde sem IA).", ("resultado", "topico"))
+RESPOSTAS_ALTERNATIVAS = metricas.contador(
+    "hope_respostas_alternativas_total", "Respostas dadas sem a IA por falha ou circuito aberto.", ("origem",))
+
+# Prazo, retentativas, hedging e disjuntor das chamadas à IA (ver resiliencia.py)
+gemini_caller = create_resilient_caller()
+classifier_caller = create_classifier_caller(gemini_caller.breaker)
+LOGINS_ADMIN = metricas.contador(
+    "hope_admin_logins_total", "Tentativas de login no Painel Admin.", ("resultado",))
+
+ADMISSAO_ESPERA = metricas.histograma(
+    "hope_admissao_espera_seconds", "Tempo na fila do controle de admissão até conseguir a vaga.")
+admission.ao_esperar = ADMISSAO_ESPERA.observe
+metricas.coletado("hope_admissao_em_andamento", "Requisições com vaga para chamar a IA agora.",
+                  lambda: admission.em_andamento)
+metricas.coletado("hope_admissao_fila", "Requisições esperando vaga para chamar a IA.",
+                  lambda: admission.na_fila)
+metricas.coletado("hope_admissao_recusadas_total", "Requisições recusadas com 503 (fila cheia ou prazo na fila).",
+                  lambda: sum(admission.recusadas.values()), tipo="counter")
+metricas.coletado("hope_limite_taxa_recusadas_total", "Mensagens recusadas com 429 pelo limite por sessão/IP.",
+                  lambda: rate_limiter.recusadas if rate_limiter else 0, tipo="counter")
+metricas.coletado("hope_gemini_circuito_aberto", "1 enquanto o disjuntor da API Gemini está aberto.",
+                  lambda: int(gemini_caller.breaker.aberto))
+metricas.coletado("hope_gemini_retentativas_total", "Retentativas de chamadas à API Gemini.",
+                  lambda: gemini_caller.retentativas_feitas, tipo="counter")
+metricas.coletado("hope_gemini_hedges_total", "Chamadas duplicadas pelo hedging.",
+                  lambda: gemini_caller.hedges_disparados, tipo="counter")
+metricas.coletado("hope_gemini_rejeitadas_total", "Chamadas rejeitadas na hora pelo circuito aberto.",
+                  lambda: gemini_caller.breaker.rejeitadas, tipo="counter")
+
 def load_knowledge_base():
-    """Tenta carregar o conteúdo do arquivo de conhecimento."""
-    try:
-        with open(KNOWLEDGE_FILE, 'r', encoding='utf-8') as f:
-            content = f.read()
-            print("INFO: Arquivo de conhecimento carregado com sucesso.")
-            return content
-    except FileNotFoundError:
-        print(f"CRÍTICO: Arquivo de conhecimento '{KNOWLEDGE_FILE}' não encontrado.")
-        return ""
-    except Exception as e:
-        print(f"ERRO: Falha ao ler o arquivo de conhecimento: {e}")
-        return ""
+    """Recarrega o conhecimento se ele mudou (ex.: salvo pelo admin em outro worker)."""
+    global KNOWLEDGE_CONTENT
+    if knowledge.refresh():
+        KNOWLEDGE_CONTENT = knowledge.content
+        return True
+    return False
     
 def save_knowledge_base(content):
-    """Tenta salvar o conteúdo no arquivo de conhecimento."""
+    """Tenta salvar o conteúdo no arquivo de conhecimento (gravação atômica + nova versão)."""
     try:
-        with open(KNOWLEDGE_FILE, 'w', encoding='utf-8') as f:
-            f.write(content)
+        version = knowledge.save(content)
         # Recarrega o conteúdo global após a escrita
         global KNOWLEDGE_CONTENT
-        KNOWLEDGE_CONTENT = content
-        print("INFO: Arquivo de conhecimento salvo e base recarregada com sucesso.")
+        KNOWLEDGE_CONTENT = knowledge.content
+        print(f"INFO: Arquivo de conhecimento salvo (versão {version}) e base recarregada com sucesso.")
         return True
     except Exception as e:
         print(f"ERRO: Falha ao salvar o arquivo de conhecimento: {e}")
         return False
 
-KNOWLEDGE_CONTENT = load_knowledge_base()
+KNOWLEDGE_CONTENT = knowledge.content
 MODEL = 'gemini-2.5-flash'
 BASE_SYSTEM_INSTRUCTION = (
     "Você é HOPE, um assistente virtual amigável, prestativo e espiritual. Responda de forma concisa e útil, "
@@ -90,38 +253,118 @@ BASE_SYSTEM_INSTRUCTION = (
     "Use Markdown para formatar suas respostas, como negrito e listas. Mantenha as respostas curtas."
 )
 
-# Funções para IA (permanecem as mesmas)
-def update_system_instruction():
-    """Atualiza a instrução do sistema com o conteúdo da base de conhecimento."""
-    global FULL_SYSTEM_INSTRUCTION
-    if KNOWLEDGE_CONTENT:
-        FULL_SYSTEM_INSTRUCTION = (
-            BASE_SYSTEM_INSTRUCTION + 
-            "\n\n--- INFORMAÇÕES ADICIONAIS DE CONTEXTO ---\n" +
-            "USE ESTAS INFORMAÇÕES PRIMARIAMENTE para responder perguntas específicas da igreja (horários, eventos, nome do pastor, etc.):\n" + 
-            KNOWLEDGE_CONTENT
-        )
-    else:
-        FULL_SYSTEM_INSTRUCTION = BASE_SYSTEM_INSTRUCTION
+MENSAGEM_ERRO_IA = "Desculpe, estou com dificuldades técnicas no momento. Por favor, tente novamente mais tarde."
+MENSAGEM_INSTABILIDADE = "Estou com instabilidade para responder agora, mas encontrei isto na nossa base de informações:"
+MENSAGEM_SOBRECARGA = "Muitas pessoas estão conversando comigo agora 🙏 Por favor, tente de novo em alguns segundos."
+MENSAGEM_LIMITE = "Você enviou muitas mensagens em pouco tempo. Aguarde um instante e tente de novo, por favor 🙏"
+
+KNOWLEDGE_HEADER = (
+    "\n\n--- INFORMAÇÕES ADICIONAIS DE CONTEXTO ---\n" +
+    "USE ESTAS INFORMAÇÕES PRIMARIAMENTE para responder perguntas específicas da igreja (horários, eventos, nome do pastor, etc.):\n"
+)
 
-update_system_instruction() # Chama para inicializar
+CLASSIFIER_CONFIG = types.GenerateContentConfig(
+    system_instruction="Você é um classificador de intenções. Sua única tarefa é identificar se a mensagem do usuário pede por 'whatsapp', 'instagram', 'localizacao' (que inclui endereço e mapa), ou 'secretaria'. Se a intenção for clara, responda APENAS com a palavra-chave (ex: 'whatsapp'). Caso contrário, responda APENAS com a palavra-chave 'chat'. Sua resposta deve ser sempre uma única palavra minúscula."
+)
+
+SUMMARY_CONFIG = types.GenerateContentConfig(
+    system_instruction=f"Você resume conversas entre um usuário e HOPE, a assistente virtual de uma igreja. Combine o resumo anterior com os novos turnos em um único resumo objetivo, em português, com os fatos, pedidos e informações pessoais que o usuário compartilhou. Use no máximo {HISTORY_SUMMARY_TOKENS * 3} caracteres e responda apenas com o resumo."
+)
 
-def get_gemini_response(history, user_message, system_instruction=FULL_SYSTEM_INSTRUCTION):
+# GenerateContentConfig montado uma vez por versão do conhecimento (e conjunto de seções)
+config_cache = GenerateConfigCache()
+context_cache = ContextCache(
+    client, MODEL,
+    ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+    refresh_margin=min(300, CONTEXT_CACHE_TTL_SECONDS // 4),
+    min_tokens=CONTEXT_CACHE_MIN_TOKENS,
+)
+
+# Funções para IA
+def build_system_instruction(indice, secoes):
+    """Instrução do sistema com o arquivo inteiro (secoes=None) ou só com as seções indicadas."""
+    if secoes is None:
+        conhecimento = indice.conteudo
+    else:
+        conhecimento = "\n\n".join(indice.secoes[i].texto for i in secoes)
+    if not conhecimento:
+        return BASE_SYSTEM_INSTRUCTION
+    return BASE_SYSTEM_INSTRUCTION + KNOWLEDGE_HEADER + conhecimento
+
+def knowledge_sections(indice, user_message):
+    """Seções relevantes para a mensagem, ou None para enviar o arquivo inteiro."""
+    if user_message is None or not KNOWLEDGE_RETRIEVAL or indice.total_tokens <= KNOWLEDGE_TOKEN_BUDGET:
+        return None
+    return indice.selecionar(user_message, KNOWLEDGE_TOP_K, KNOWLEDGE_TOKEN_BUDGET)
+
+@functools.lru_cache(maxsize=8)
+def context_cache_config(nome):
+    """Config que referencia o cache de contexto em vez de enviar a instrução."""
+    return types.GenerateContentConfig(cached_content=nome)
+
+def inline_generate_config(user_message=None):
+    """Config com a instrução inline (arquivo inteiro ou seções relevantes)."""
+    indice = knowledge.index
+    secoes = knowledge_sections(indice, user_message)
+    return config_cache.get(indice.geracao, secoes, lambda: build_system_instruction(indice, secoes))
+
+def get_generate_config(user_message=None):
+    """
+    Config da versão atual do conhecimento, reaproveitado entre requisições.
+
+    Com CONTEXT_CACHE=1, referencia o cache de contexto da instrução completa
+    assim que ele estiver pronto; até lá (ou se falhar), usa a instrução inline.
+    """
+    if CONTEXT_CACHE:
+        indice = knowledge.index
+        nome = context_cache.nome(indice.geracao, lambda: build_system_instruction(indice, None))
+        if nome:
+            return context_cache_config(nome)
+    return inline_generate_config(user_message)
+
+def context_label(config):
+    return "cache" if config.cached_content else "inline"
+
+def context_cache_failed(config, erro):
+    """Descarta o cache de contexto que falhou; a chamada é repetida com a instrução inline."""
+    print(f"Erro com o cache de contexto {config.cached_content} ({erro}); repetindo com a instrução inline.")
+    ERROS_GEMINI.inc(chamada="cache_contexto")
+    context_cache.invalidar(config.cached_content)
+
+@app.before_request
+def refresh_knowledge():
+    """Verificação barata (os.stat) de uma nova versão do conhecimento a cada requisição."""
+    load_knowledge_base()
+
+def get_gemini_response(history, user_message, config=None):
     """
     Função principal para obter a resposta da IA.
+
+    Sem `config`, usa a instrução completa da versão atual do conhecimento.
     """
     try:
         history.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
 
-        config = types.GenerateContentConfig(
-            system_instruction=system_instruction
-        )
+        if config is None:
+            config = get_generate_config()
 
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=history,
-            config=config,
-        )
+        inicio = time.perf_counter()
+        try:
+            response = gemini_caller.chamar(lambda timeout: client.models.generate_content(
+                model=MODEL,
+                contents=history,
+                config=com_timeout(config, timeout),
+            ))
+        except Exception as e:
+            if not config.cached_content or retentavel(e) or isinstance(e, CircuitoAberto):
+                raise
+            context_cache_failed(config, e)
+            config = inline_generate_config(user_message)
+            inicio = time.perf_counter()
+            response = gemini_caller.chamar(lambda timeout: client.models.generate_content(
+                model=MODEL, contents=history, config=com_timeout(config, timeout)))
+        GEMINI_SEGUNDOS.observe(time.perf_counter() - inicio, chamada="resposta", contexto=context_label(config))
+        record_usage("resposta", response, context_label(config))
         
         history.append(types.Content(role="model", parts=[types.Part(text=response.text)]))
         
@@ -129,39 +372,200 @@ def get_gemini_response(history, user_message, system_instruction=FULL_SYSTEM_IN
     
     except Exception as e:
         print(f"Erro ao chamar a API Gemini: {e}")
-        return "Desculpe, estou com dificuldades técnicas no momento. Por favor, tente novamente mais tarde."
+        ERROS_GEMINI.inc(chamada="resposta")
+        return fallback_response(user_message)
+
+def stream_gemini_response(history, user_message, config=None):
+    """
+    Versão em streaming de get_gemini_response: gera os trechos de texto à medida
+    que chegam e, ao final, grava o turno completo do modelo em `history`.
+    """
+    history.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
+    if config is None:
+        config = get_generate_config()
+
+    def abrir_stream(timeout):
+        # O stream só conta como aberto quando o primeiro trecho chega (as retentativas param aí)
+        iterador = iter(client.models.generate_content_stream(
+            model=MODEL,
+            contents=history,
+            config=com_timeout(config, timeout),
+        ))
+        return next(iterador, None), iterador
+
+    trechos = []
+    chunk = None
+    inicio = time.perf_counter()
+    try:
+        primeiro, iterador = gemini_caller.chamar(abrir_stream, hedge=False)
+        for chunk in itertools.chain([primeiro] if primeiro is not None else [], iterador):
+            if chunk.text:
+                trechos.append(chunk.text)
+                yield chunk.text
+        GEMINI_SEGUNDOS.observe(time.perf_counter() - inicio, chamada="resposta_stream", contexto=context_label(config))
+        record_usage("resposta", chunk, context_label(config))  # o uso completo vem no último trecho
+    except Exception as e:
+        if config.cached_content and not trechos and not retentavel(e) and not isinstance(e, CircuitoAberto):
+            context_cache_failed(config, e)
+            history.pop()
+            yield from stream_gemini_response(history, user_message, inline_generate_config(user_message))
+            return
+        print(f"Erro ao chamar a API Gemini (streaming): {e}")
+        ERROS_GEMINI.inc(chamada="resposta")
+        if not trechos:
+            yield fallback_response(user_message)
+            return
+
+    history.append(types.Content(role="model", parts=[types.Part(text="".join(trechos))]))
 
 def classify_intent(user_message):
     history = [
         types.Content(role="user", parts=[types.Part(text=user_message)])
     ]
     
-    config = types.GenerateContentConfig(
-        system_instruction="Você é um classificador de intenções. Sua única tarefa é identificar se a mensagem do usuário pede por 'whatsapp', 'instagram', 'localizacao' (que inclui endereço e mapa), ou 'secretaria'. Se a intenção for clara, responda APENAS com a palavra-chave (ex: 'whatsapp'). Caso contrário, responda APENAS com a palavra-chave 'chat'. Sua resposta deve ser sempre uma única palavra minúscula."
-    )
-    
     try:
-        response = client.models.generate_content(
+        # Prazo curto e sem retentativas: na dúvida a mensagem segue como "chat"
+        response = classifier_caller.chamar(lambda timeout: client.models.generate_content(
             model='gemini-2.5-flash',
             contents=history,
-            config=config,
-        )
+            config=com_timeout(CLASSIFIER_CONFIG, timeout),
+        ))
+        record_usage("classificador", response)
         return response.text.strip().lower()
         
     except Exception as e:
         print(f"Erro ao classificar a intenção: {e}")
+        ERROS_GEMINI.inc(chamada="classificador")
         return "chat"
 
+def fallback_response(user_message):
+    """
+    Resposta quando a IA falhou ou o circuito está aberto: a resposta em cache
+    para a mesma pergunta, ou o trecho mais relevante da base de conhecimento.
+    """
+    if RESPONSE_CACHE and knowledge.index:
+        resposta = response_cache.get(user_message, knowledge.index.geracao)
+        if resposta:
+            RESPOSTAS_ALTERNATIVAS.inc(origem="cache")
+            return resposta
+    trecho = knowledge.index.melhor_trecho(user_message) if knowledge.index else None
+    if trecho:
+        RESPOSTAS_ALTERNATIVAS.inc(origem="conhecimento")
+        return f"{MENSAGEM_INSTABILIDADE}\n\n{trecho}"
+    RESPOSTAS_ALTERNATIVAS.inc(origem="erro")
+    return MENSAGEM_ERRO_IA
+
+def record_usage(chamada, response, contexto="inline"):
+    """Soma os tokens do usage_metadata da resposta nas métricas."""
+    uso = getattr(response, "usage_metadata", None)
+    if uso is None:
+        return
+    for tipo, valor in (("prompt", uso.prompt_token_count), ("prompt_em_cache", uso.cached_content_token_count),
+                        ("resposta", uso.candidates_token_count), ("total", uso.total_token_count)):
+        if valor:
+            TOKENS_GEMINI.inc(valor, chamada=chamada, tipo=tipo, contexto=contexto)
+
+def record_stage(etapa, inicio):
+    """Registra a duração da etapa (iniciada em `inicio`) no log e no histograma."""
+    duracao = time.perf_counter() - inicio
+    ETAPA_SEGUNDOS.observe(duracao, etapa=etapa)
+    log_tempos.info("%s = %.1f ms", etapa, duracao * 1000)
+
+def summarize_history(resumo_anterior, turnos):
+    """Resumo da conversa feito pela IA (em segundo plano); usa o resumo local se a chamada falhar."""
+    conversa = "\n".join(f"{'Usuário' if c.role == 'user' else 'Hope'}: {texto_do_turno(c)}" for c in turnos)
+    try:
+        # Em segundo plano: prazo e disjuntor valem, hedging não
+        response = gemini_caller.chamar(lambda timeout: client.models.generate_content(
+            model=MODEL,
+            contents=f"Resumo anterior:\n{resumo_anterior or '(nenhum)'}\n\nNovos turnos:\n{conversa}",
+            config=com_timeout(SUMMARY_CONFIG, timeout),
+        ), hedge=False)
+        record_usage("resumo", response)
+        return response.text.strip()
+    except Exception as e:
+        print(f"Erro ao resumir o histórico com a IA: {e}")
+        ERROS_GEMINI.inc(chamada="resumo")
+        return resumo_extrativo(resumo_anterior, turnos, HISTORY_SUMMARY_TOKENS)
+
+history_compactor = HistoryCompactor(
+    history_store,
+    manter_turnos=HISTORY_KEEP_TURNS,
+    orcamento_tokens=HISTORY_TOKEN_BUDGET,
+    max_tokens_resumo=HISTORY_SUMMARY_TOKENS,
+    resumir=summarize_history if HISTORY_SUMMARY == 'ia' else None,
+)
+
+def compact_history(sid, history):
+    """Antes de chamar a IA: compacta na hora se o histórico passou do orçamento de tokens."""
+    if HISTORY_SUMMARY != 'off':
+        try:
+            history_compactor.garantir_orcamento(sid, history)
+        except Exception as e:
+            print(f"Erro ao compactar o histórico da sessão: {e}")
+    return history
+
+def schedule_compaction(sid, history):
+    """Depois da resposta: dobra os turnos antigos no resumo, em segundo plano."""
+    if HISTORY_SUMMARY != 'off' and history_store.fora_da_requisicao:
+        history_compactor.agendar(sid, history)
+
+def timed(etapa, func, *args):
+    """Executa `func` e registra quanto tempo a etapa levou."""
+    inicio = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        record_stage(etapa, inicio)
+
+def finish_request(rota, resultado, inicio):
+    """Registra a duração total da requisição de chat por rota e resultado."""
+    duracao = time.perf_counter() - inicio
+    REQUISICAO_SEGUNDOS.observe(duracao, rota=rota, resultado=resultado)
+    log_tempos.info("%s total (%s) = %.1f ms", rota, resultado, duracao * 1000)
+
+def local_intent(user_message):
+    """Retorna a intenção do roteador local, ou None se a confiança for baixa."""
+    intent, confianca = classificar_intencao_local(user_message)
+    if confianca >= INTENT_CONFIDENCE_THRESHOLD:
+        return intent
+    return None
+
+def speculative_response(history, user_message, config):
+    """
+    Dispara classify_intent e get_gemini_response em paralelo.
+
+    Returns:
+        tuple: (intenção, texto da resposta). Se a intenção for um botão de contato,
+        a resposta é cancelada (ou descartada, se já estiver em andamento) e o
+        texto retornado é None; `history` só é alterado quando a resposta é usada.
+    """
+    historico_especulativo = list(history)
+    futuro_intent = speculative_pool.submit(timed, "classify_intent (especulativo)", classify_intent, user_message)
+    futuro_resposta = speculative_pool.submit(
+        timed, "get_gemini_response (especulativo)", get_gemini_response,
+        historico_especulativo, user_message, config
+    )
+
+    intent = futuro_intent.result()
+    if intent in CONTACT_LINKS:
+        if not futuro_resposta.cancel():
+            log_tempos.info("resposta especulativa descartada (intenção de contato)")
+        return intent, None
+
+    resposta = futuro_resposta.result()
+    history[:] = historico_especulativo
+    return intent, resposta
+
 
 @app.route("/")
 def home():
-    if 'chat_history' not in session or not isinstance(session['chat_history'], list):
-        session['chat_history'] = []
+    session_id()
     
     # V60.47: Mudei para *HOPE* pois o JS agora suporta (mas **HOPE** também funcionaria)
     saudacao = "Olá! Eu sou *HOPE*, sua parceira de fé. Como posso te ajudar hoje?"
 
-    return render_template("chat_interface.html", saudacao=saudacao)
+    return render_template("chat_interface.html", saudacao=saudacao, streaming=CHAT_STREAMING)
 
 @app.route("/knowledge_status")
 def knowledge_status():
@@ -170,7 +574,20 @@ def knowledge_status():
             "status": "OK",
             "message": "Base de conhecimento carregada com sucesso. Verifique se o conteúdo abaixo está correto. Se sim, o modelo deve conseguir responder.",
             "content_snippet": KNOWLEDGE_CONTENT[:500] + ("..." if len(KNOWLEDGE_CONTENT) > 500 else ""),
-            "content_length": len(KNOWLEDGE_CONTENT)
+            "content_length": len(KNOWLEDGE_CONTENT),
+            "knowledge_version": knowledge.version,
+            "response_cache": response_cache.stats(),
+            "faq": faq_engine.stats() if FAQ_LOCAL else None,
+            "verse_rotation": verse_rotation.stats(),
+            "admin_login": admin_login_guard.stats(),
+            "admission": admission.stats(),
+            "rate_limit": rate_limiter.stats() if rate_limiter else None,
+            "gemini_resilience": gemini_caller.stats(),
+            "context_cache": context_cache.stats() if CONTEXT_CACHE else None,
+            "history_compaction": {
+                "budget": history_compactor.compactacoes_orcamento,
+                "background": history_compactor.compactacoes_segundo_plano,
+            }
         })
     else:
         return jsonify({
@@ -179,38 +596,59 @@ def knowledge_status():
             "content_length": 0
         })
 
+@app.route("/metrics")
+def metrics():
+    """Latência por etapa, duração das requisições e tokens no formato do Prometheus."""
+    return Response(metricas.exportar(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/versiculo-do-dia")
+def versiculo_do_dia():
+    """Versículo do dia em JSON, cacheável por CDNs e navegadores até a meia-noite."""
+    corpo, etag, segundos = verse_rotation.pagina_do_dia()
+    resposta = Response(corpo, content_type="application/json; charset=utf-8")
+    resposta.set_etag(etag)
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = segundos
+    resposta.cache_control.s_maxage = segundos
+    # If-None-Match com o mesmo ETag vira 304 sem corpo
+    return resposta.make_conditional(request)
+
 # Rota para Login (AGORA COM BCrypt para segurança)
 @app.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     if request.method == "POST":
         username = request.form.get("username")
         password = request.form.get("password")
-        
-        # 1. Obter o Hash do ambiente/fallback
-        hash_armazenado = ADMIN_PASSWORD_HASH.encode('utf-8')
-        
-        # 2. Obter a senha enviada e Codificá-la
-        senha_enviada = password.encode('utf-8')
 
-        # 3. VERIFICAÇÃO SEGURA: Compara usuário e verifica a senha usando bcrypt
-        # Utilizamos try/except caso o hash_armazenado esteja mal formatado (evita crash)
-        try:
-            if username == ADMIN_USER and bcrypt.checkpw(senha_enviada, hash_armazenado):
-                session['logged_in'] = True
-                flash("Login realizado com sucesso!", "message")
-                return redirect(url_for('admin_conhecimento'))
+        # Limite de tentativas por IP e usuário; o bcrypt roda no pool de processos.
+        # Atrás de um proxy, remote_addr só é o IP do cliente com TRUSTED_PROXIES configurado
+        resultado, espera = admin_login_guard.verificar(request.remote_addr, username, password)
+        LOGINS_ADMIN.inc(resultado=resultado)
+        if resultado == OK:
+            session['admin_token'] = admin_login_guard.emitir_token(username)
+            flash("Login realizado com sucesso!", "message")
+            return redirect(url_for('admin_conhecimento'))
+        if resultado in (LIMITADO, OCUPADO):
+            segundos = max(int(espera + 0.999), 1)
+            if resultado == LIMITADO:
+                flash(f"Muitas tentativas de login. Tente novamente em {segundos} segundo(s).", "error")
             else:
-                flash("Credenciais inválidas. Tente novamente.", "error")
-        except ValueError:
+                flash("O login está ocupado no momento. Tente novamente em instantes.", "error")
+            status = 429 if resultado == LIMITADO else 503
+            return render_template("admin_login.html"), status, {"Retry-After": str(segundos)}
+        if resultado == ERRO_HASH:
             flash("Erro de formato de senha. Verifique o HASH no ambiente.", "error")
-        
+        else:
+            flash("Credenciais inválidas. Tente novamente.", "error")
+
     return render_template("admin_login.html")
 
 
 # Rota de Admin RESTAURADA (agora protegida)
 @app.route("/admin/conhecimento", methods=["GET", "POST"])
 def admin_conhecimento():
-    if not session.get('logged_in'):
+    # O token assinado expira sozinho (ADMIN_TOKEN_TTL_SECONDS): não há nova verificação de senha
+    if not admin_login_guard.token_valido(session.get('admin_token')):
         flash("Você precisa fazer login para acessar esta página.", "error")
         return redirect(url_for('admin_login'))
 
@@ -218,23 +656,124 @@ def admin_conhecimento():
         novo_conhecimento = request.form.get("conhecimento")
         if novo_conhecimento is not None:
             if save_knowledge_base(novo_conhecimento):
-                update_system_instruction()
+                response_cache.clear()
                 flash("Conhecimento salvo e IA recarregada com sucesso!", "message")
+                if FAQ_LOCAL:
+                    topicos = faq_engine.gerar(knowledge.index.conteudo, knowledge.index.geracao)
+                    flash(f"FAQ local regerado: {len(topicos)} tópico(s) ({', '.join(sorted(topicos)) or 'nenhum'}).", "message")
             else:
                 flash("ERRO ao salvar o arquivo no servidor. Tente novamente.", "error")
         return redirect(url_for('admin_conhecimento'))
 
     # GET request
-    return render_template("admin_conhecimento.html", conhecimento=KNOWLEDGE_CONTENT)
+    return render_template("admin_conhecimento.html", conhecimento=KNOWLEDGE_CONTENT,
+                           faq=current_faq().respostas if FAQ_LOCAL else {})
 
 # Rota de Logout (Opcional, mas recomendado)
 @app.route("/admin/logout")
 def admin_logout():
-    session.pop('logged_in', None)
+    session.pop('admin_token', None)
     flash("Você saiu da área administrativa.", "message")
     return redirect(url_for('home'))
 
 
+def session_id():
+    """Retorna o id da sessão do navegador, criando um novo se necessário."""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def load_session_history():
+    """Carrega o histórico da conversa do armazenamento no servidor."""
+    try:
+        return history_store.load(session_id())
+    except Exception as e:
+        print(f"Erro ao carregar histórico da sessão: {e}. Reiniciando histórico.")
+        history_store.clear(session_id())
+        return []
+
+def save_session_history(history, turnos_anteriores):
+    """Grava apenas os turnos adicionados depois de `turnos_anteriores`."""
+    try:
+        history_store.append(session_id(), history[turnos_anteriores:])
+        schedule_compaction(session_id(), history)
+    except Exception as e:
+        print(f"Erro ao salvar histórico da sessão: {e}")
+
+def current_faq():
+    """O FAQ local da versão atual do conhecimento (regerado se outro worker salvou)."""
+    indice = knowledge.index
+    if faq_engine.versao != indice.geracao:
+        faq_engine.gerar(indice.conteudo, indice.geracao)
+    return faq_engine
+
+def faq_response(history, user_message):
+    """
+    Resposta pronta do FAQ local (horários, endereço, Pix, pastores), sem IA.
+    Em caso de acerto, os dois turnos são acrescentados a `history`.
+    """
+    if not FAQ_LOCAL:
+        return None
+    topico, resposta = current_faq().responder(user_message)
+    if resposta is None:
+        CONSULTAS_FAQ.inc(resultado="sem_resposta")
+        return None
+    CONSULTAS_FAQ.inc(resultado="acerto", topico=topico)
+    history.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
+    history.append(types.Content(role="model", parts=[types.Part(text=resposta)]))
+    return resposta
+
+def cached_response(history, user_message, versao):
+    """
+    Resposta em cache para a primeira mensagem da conversa. Em caso de acerto,
+    os dois turnos são acrescentados a `history` como numa chamada à IA.
+    """
+    if not RESPONSE_CACHE or history:
+        return None
+    resposta = response_cache.get(user_message, versao)
+    if resposta is not None:
+        history.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
+        history.append(types.Content(role="model", parts=[types.Part(text=resposta)]))
+    return resposta
+
+def remember_response(turnos_anteriores, user_message, versao, resposta):
+    """Guarda a resposta da IA no cache se for a primeira mensagem e não for um erro."""
+    if (RESPONSE_CACHE and turnos_anteriores == 0 and resposta and resposta != MENSAGEM_ERRO_IA
+            and not resposta.startswith(MENSAGEM_INSTABILIDADE)):
+        response_cache.put(user_message, versao, resposta)
+
+def contact_button_response(intent):
+    """Dados do botão de contato para a intenção."""
+    link_info = CONTACT_LINKS[intent]
+    return {
+        "type": "button",
+        "pre_text": f"Claro! Aqui está o acesso para o setor de {intent.capitalize()}:",
+        "button_text": link_info["text"],
+        "button_url": link_info["url"],
+        "button_icon": link_info["icon"]
+    }
+
+def sse_event(evento, dados):
+    """Formata um evento Server-Sent Events com dados em JSON."""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+def rate_limited_response(rota, inicio):
+    """429 com Retry-After se a sessão ou o IP passou do limite de mensagens; None se pode seguir."""
+    if rate_limiter is None:
+        return None
+    permitido, retry_after = rate_limiter.permitir(session_id(), request.remote_addr)
+    if permitido:
+        return None
+    finish_request(rota, "limitada", inicio)
+    return (jsonify({"type": "text", "resposta": MENSAGEM_LIMITE}), 429, {"Retry-After": str(retry_after)})
+
+def overloaded_response(rota, erro, inicio):
+    """503 rápido com Retry-After quando o controle de admissão recusa a requisição."""
+    print(f"Requisição recusada pelo controle de admissão: {erro}")
+    finish_request(rota, "sobrecarga", inicio)
+    return (jsonify({"type": "text", "resposta": MENSAGEM_SOBRECARGA}), 503,
+            {"Retry-After": str(erro.retry_after)})
+
 @app.route("/api/chat", methods=["POST"])
 def chat_api():
     data = request.json
@@ -243,36 +782,135 @@ def chat_api():
     if not user_message:
         return jsonify({"resposta": "Por favor, envie uma mensagem."})
 
-    intent = classify_intent(user_message)
+    inicio = time.perf_counter()
+    limitada = rate_limited_response("chat_api", inicio)
+    if limitada:
+        return limitada
+    intent = timed("local_intent", local_intent, user_message)
+    if intent in CONTACT_LINKS:
+        resposta = timed("serializar_json", jsonify, contact_button_response(intent))
+        finish_request("chat_api", "botao", inicio)
+        return resposta
+
+    history = timed("carregar_historico", load_session_history)
+    timed("compactar_historico", compact_history, session_id(), history)
+    turnos_anteriores = len(history)
+    versao = knowledge.index.geracao
+
+    origem = "faq"
+    ia_response_text = timed("faq_local", faq_response, history, user_message)
+    if ia_response_text is None:
+        origem = "cache"
+        ia_response_text = timed("cache_respostas", cached_response, history, user_message, versao)
+    if ia_response_text is not None:
+        timed("salvar_historico", save_session_history, history, turnos_anteriores)
+        resposta = timed("serializar_json", jsonify, {"type": "text", "resposta": ia_response_text})
+        finish_request("chat_api", origem, inicio)
+        return resposta
+
+    # Uma vaga por requisição cobre o classificador e a resposta da IA
+    try:
+        with admission.vaga():
+            config = timed("get_generate_config", get_generate_config, user_message)
+            if intent is None and SPECULATIVE_CHAT:
+                intent, ia_response_text = speculative_response(history, user_message, config)
+            elif intent is None:
+                intent = timed("classify_intent", classify_intent, user_message)
+
+            if intent not in CONTACT_LINKS and ia_response_text is None:
+                ia_response_text = timed("get_gemini_response", get_gemini_response, history, user_message, config)
+    except Sobrecarga as e:
+        return overloaded_response("chat_api", e, inicio)
+
+    if intent in CONTACT_LINKS:
+        resposta = timed("serializar_json", jsonify, contact_button_response(intent))
+        finish_request("chat_api", "botao", inicio)
+        return resposta
+
+    remember_response(turnos_anteriores, user_message, versao, ia_response_text)
+    timed("salvar_historico", save_session_history, history, turnos_anteriores)
+
+    resposta = timed("serializar_json", jsonify, {"type": "text", "resposta": ia_response_text})
+    finish_request("chat_api", "ia", inicio)
+    return resposta
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream_api():
+    """
+    Igual ao /api/chat, mas a resposta de texto chega como Server-Sent Events:
+    eventos `chunk` com cada trecho e um `done` ao final. Botões de contato
+    continuam sendo respondidos em JSON.
+    """
+    data = request.json
+    user_message = data.get("mensagem")
     
+    if not user_message:
+        return jsonify({"resposta": "Por favor, envie uma mensagem."})
+
+    inicio = time.perf_counter()
+    limitada = rate_limited_response("chat_stream_api", inicio)
+    if limitada:
+        return limitada
+    intent = timed("local_intent", local_intent, user_message)
     if intent in CONTACT_LINKS:
-        link_info = CONTACT_LINKS[intent]
-        
-        response_data = {
-            "type": "button",
-            "pre_text": f"Claro! Aqui está o acesso para o setor de {intent.capitalize()}:",
-            "button_text": link_info["text"],
-            "button_url": link_info["url"],
-            "button_icon": link_info["icon"]
-        }
-        return jsonify(response_data)
-        
-    else:
-        history_dicts = session.get('chat_history', [])
-        
-        history = []
+        finish_request("chat_stream_api", "botao", inicio)
+        return jsonify(contact_button_response(intent))
+
+    # O id da sessão precisa existir antes de enviar os cabeçalhos da resposta
+    session_id()
+    history = timed("carregar_historico", load_session_history)
+    timed("compactar_historico", compact_history, session_id(), history)
+    turnos_anteriores = len(history)
+    versao = knowledge.index.geracao
+    origem = "faq"
+    resposta_cache = timed("faq_local", faq_response, history, user_message)
+    if resposta_cache is None:
+        origem = "cache"
+        resposta_cache = timed("cache_respostas", cached_response, history, user_message, versao)
+
+    entrada = None
+    if resposta_cache is None:
+        # A vaga vale até o fim do stream (liberada quando a resposta é fechada)
         try:
-            history = [types.Content(**h) for h in history_dicts]
-        except Exception as e:
-            print(f"Erro ao carregar histórico da sessão: {e}. Reiniciando histórico.")
-            session['chat_history'] = []
-            history = []
-
-        ia_response_text = get_gemini_response(history, user_message)
-        
-        session['chat_history'] = [h.model_dump() for h in history]
-        
-        return jsonify({"type": "text", "resposta": ia_response_text})
+            entrada = admission.entrar()
+        except Sobrecarga as e:
+            return overloaded_response("chat_stream_api", e, inicio)
+        if intent is None:
+            intent = timed("classify_intent", classify_intent, user_message)
+        if intent in CONTACT_LINKS:
+            admission.sair(entrada)
+            finish_request("chat_stream_api", "botao", inicio)
+            return jsonify(contact_button_response(intent))
+        config = timed("get_generate_config", get_generate_config, user_message)
+        trechos = stream_gemini_response(history, user_message, config)
+    else:
+        trechos = iter([resposta_cache])
+
+    def eventos():
+        primeiro = True
+        inicio_ia = time.perf_counter()
+        for trecho in trechos:
+            if primeiro:
+                record_stage("primeiro_trecho", inicio)
+                primeiro = False
+            yield sse_event("chunk", {"texto": trecho})
+        if resposta_cache is None:
+            record_stage("get_gemini_response", inicio_ia)
+            if len(history) > turnos_anteriores + 1:
+                remember_response(turnos_anteriores, user_message, versao, history[-1].parts[0].text)
+        timed("salvar_historico", save_session_history, history, turnos_anteriores)
+        finish_request("chat_stream_api", "ia" if resposta_cache is None else origem, inicio)
+        yield sse_event("done", {})
+
+    resposta = Response(
+        stream_with_context(eventos()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if entrada is not None:
+        # Roda mesmo se o cliente desconectar antes do primeiro trecho
+        resposta.call_on_close(lambda: admission.sair(entrada))
+    return resposta
 
 if __name__ == "__main__":
     if 'FLASK_SECRET_KEY' not in os.environ:
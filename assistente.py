@@ -1,6 +1,23 @@
 # assistente.py
 
-from dados_biblicos import carregar_versiculos, versiculo_aleatorio, RESPOSTAS_COMUNS
+from dados_biblicos import carregar_versiculos, carregar_indice_versiculos, RESPOSTAS_COMUNS, PALAVRAS_CHAVE, PALAVRAS_VERSICULO
+from palavras_chave import KeywordMatcher
+from rotacao_versiculos import VerseRotation
+
+# Resposta especial (não está em RESPOSTAS_COMUNS): sorteia um versículo
+VERSICULO = "versiculo"
+
+
+def montar_buscador():
+    """Autômato com os sinônimos de todas as respostas comuns e dos pedidos de versículo."""
+    palavras = [
+        (palavra, chave, prioridade)
+        for chave, (prioridade, sinonimos) in PALAVRAS_CHAVE.items()
+        for palavra in sinonimos
+    ]
+    palavras += [(palavra, VERSICULO, 0) for palavra in PALAVRAS_VERSICULO]
+    return KeywordMatcher(palavras)
+
 
 class ParceiroDeFe:
     """
@@ -10,34 +27,45 @@ class ParceiroDeFe:
         """Inicializa a assistente carregando os versículos bíblicos."""
         # Carrega a lista de versículos uma vez que a assistente é criada
         self.versiculos = carregar_versiculos()
+        # Índice por referência e por tema: "Salmos 23", "versículo sobre esperança"
+        self.indice = carregar_indice_versiculos()
+        # Rodízio por usuário: o mesmo usuário não recebe o mesmo versículo duas vezes seguidas
+        self.rotacao = VerseRotation(self.versiculos)
+        # Todas as palavras-chave compiladas uma vez: a pergunta é lida uma única vez
+        self.buscador = montar_buscador()
         print("Assistente Parceiro de Fé inicializada e versículos carregados.")
 
-    def obter_resposta(self, pergunta):
+    def obter_resposta(self, pergunta, usuario=None):
         """
         Processa a pergunta do usuário e retorna a resposta mais adequada.
         
         Args:
             pergunta (str): A pergunta do usuário.
+            usuario (str, opcional): Quem perguntou, para o rodízio de versículos.
 
         Returns:
             str: A resposta da assistente.
         """
-        # Limpa a pergunta e a transforma em minúsculas para facilitar a busca
-        pergunta_limpa = pergunta.lower().strip()
-        
-        # --- Lógica de Busca de Resposta Comum (Busca por Palavra-Chave) ---
+        # --- Busca de Resposta Comum (Palavras-Chave e Sinônimos) ---
         
-        # Iteramos sobre as chaves (palavras-chave como "horario", "endereco")
-        for palavra_chave, resposta in RESPOSTAS_COMUNS.items():
-            if palavra_chave in pergunta_limpa:
-                return resposta
+        # Uma passada pela pergunta normalizada (sem acentos): "horário" casa com "horario"
+        chave = self.buscador.buscar(pergunta)
+        if chave in RESPOSTAS_COMUNS:
+            return RESPOSTAS_COMUNS[chave]
 
         # --- Lógica de Versículo Bíblico ---
         
-        # Se o usuário pedir um versículo
-        if "versiculo" in pergunta_limpa or "bíblia" in pergunta_limpa:
-            vers = versiculo_aleatorio(self.versiculos)
-            return f"Claro! Aqui está uma Palavra para o seu coração:\n\n{vers}"
+        # Referência citada ("João 3:16", "Salmos 23"), mesmo sem a palavra "versículo"
+        encontrados = self.indice.citacao(pergunta)
+        # Se o usuário pedir um versículo: primeiro um do tema pedido, senão o próximo do rodízio
+        if not encontrados and chave == VERSICULO:
+            encontrados = self.indice.buscar(pergunta, limite=1)
+            if not encontrados:
+                vers = self.rotacao.proximo(usuario) or "Desculpe, a lista de versículos está vazia."
+                return f"Claro! Aqui está uma Palavra para o seu coração:\n\n{vers}"
+        if encontrados:
+            texto = "\n\n".join(str(v) for v in encontrados)
+            return f"Claro! Aqui está uma Palavra para o seu coração:\n\n{texto}"
         
         # --- Resposta Padrão ---
         
@@ -1,16 +1,26 @@
 # assistente_avancada.py - V60.9 (Correção de Importação Circular)
 
 import os
+import time
 import logging
 from dotenv import load_dotenv
-from google import genai
 from google.genai.errors import APIError
 
+from cache_conversas import ConversationCache
+from historico_store import create_history_store
+from snapshot_conhecimento import KnowledgeSnapshot
+from cache_config import GenerateConfigCache
+from cliente_gemini import SharedClient, get_client
+from resiliencia import CircuitoAberto, com_timeout, create_resilient_caller, retentavel
+from log_conversas import configurar_log_conversas
+
 # Tenta carregar variáveis de ambiente do arquivo .env (apenas para teste local)
 load_dotenv() 
 
 # Configuração do Logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+# Conversas em JSON lines num arquivo próprio, gravadas por uma thread (fila + lotes + rotação)
+log_conversas = configurar_log_conversas()
 
 # --- CONFIGURAÇÃO CRÍTICA DA CHAVE ---
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
@@ -19,8 +29,23 @@ GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 # Definição do modelo
 MODEL_NAME = "gemini-2.5-flash"
 
+# Limites do cache de conversas ativas (objetos de chat mantidos em memória)
+MAX_CONVERSAS = int(os.environ.get('HOPE_MAX_CONVERSAS', '500'))
+CONVERSA_TTL_SECONDS = int(os.environ.get('HOPE_CONVERSA_TTL_SECONDS', '1800'))
+MAX_TOKENS_CONVERSAS = int(os.environ.get('HOPE_MAX_TOKENS_CONVERSAS', '0')) or None
+
+# Recuperação do conhecimento (mesmas variáveis do app web)
+ARQUIVO_CONHECIMENTO = "conhecimento_esperancapontalsul.txt"
+KNOWLEDGE_RETRIEVAL = os.environ.get('KNOWLEDGE_RETRIEVAL', '1') == '1'
+KNOWLEDGE_TOP_K = int(os.environ.get('KNOWLEDGE_TOP_K', '4'))
+KNOWLEDGE_TOKEN_BUDGET = int(os.environ.get('KNOWLEDGE_TOKEN_BUDGET', '1500'))
+
 # Função para carregar conhecimento adicional (movida para fora da classe para ser reutilizada)
-def carregar_conhecimento_local(filepath="conhecimento_esperancapontalsul.txt"):
+def envolver_conhecimento(conhecimento):
+    """Delimita o texto de conhecimento dentro da instrução do sistema."""
+    return "\n\n--- CONHECIMENTO ADICIONAL SOBRE A IGREJA DA PAZ PONTAL SUL ---\n" + conhecimento + "\n--- FIM DO CONHECIMENTO ADICIONAL ---\n"
+
+def carregar_conhecimento_local(filepath=ARQUIVO_CONHECIMENTO):
     """Lê o conteúdo do arquivo de conhecimento para inclusão na instrução do sistema."""
     if not os.path.exists(filepath):
         logging.warning(f"Arquivo de conhecimento não encontrado: {filepath}. A IA não terá contexto local.")
@@ -28,7 +53,7 @@ def carregar_conhecimento_local(filepath="conhecimento_esperancapontalsul.txt"):
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             conhecimento = f.read()
-        return "\n\n--- CONHECIMENTO ADICIONAL SOBRE A IGREJA DA PAZ PONTAL SUL ---\n" + conhecimento + "\n--- FIM DO CONHECIMENTO ADICIONAL ---\n"
+        return envolver_conhecimento(conhecimento)
     except Exception as e:
         logging.error(f"Erro ao ler arquivo de conhecimento: {e}")
         return ""
@@ -52,20 +77,33 @@ SYSTEM_INSTRUCTION_FINAL = BASE_SYSTEM_INSTRUCTION + carregar_conhecimento_local
 
 
 class Hope:
-    def __init__(self, nome_assistente="Esperança"):
+    def __init__(self, nome_assistente="Esperança", historico_store=None):
         self.nome_assistente = nome_assistente
         self.client = None
-        self.conversas = {}
         self.inicializado = False
+
+        # Conversas descartadas do cache são persistidas aqui e reconstruídas sob demanda
+        self.historico_store = historico_store or create_history_store()
+        self.conversas = ConversationCache(
+            max_entries=MAX_CONVERSAS,
+            ttl_seconds=CONVERSA_TTL_SECONDS,
+            max_tokens=MAX_TOKENS_CONVERSAS,
+            on_evict=self._persistir_conversa,
+        )
         
         # CRÍTICO: Atributos da classe para serem usados na rota Admin
         self.BASE_SYSTEM_INSTRUCTION = BASE_SYSTEM_INSTRUCTION
         self.carregar_conhecimento_local = carregar_conhecimento_local 
         self.system_instruction = SYSTEM_INSTRUCTION_FINAL 
+        self.conhecimento = KnowledgeSnapshot(ARQUIVO_CONHECIMENTO)
+        self.configs = GenerateConfigCache()
+        # Prazo, retentativas e disjuntor das chamadas (sem hedging: o chat guarda o histórico)
+        self.chamadas = create_resilient_caller()
         
         if GEMINI_API_KEY:
             try:
-                self.client = genai.Client(api_key=GEMINI_API_KEY)
+                get_client()  # valida a configuração já na inicialização
+                self.client = SharedClient()
                 self.inicializado = True
                 logging.info(f"Assistente '{self.nome_assistente}' inicializado com sucesso.")
             except Exception as e:
@@ -80,12 +118,48 @@ class Hope:
             logging.error(f"Não é possível iniciar conversa para {user_id}. IA não inicializada.")
             return None
         
-        if user_id not in self.conversas:
-             self.conversas[user_id] = self.client.chats.create(
-                 model=MODEL_NAME,
-                 config={"system_instruction": self.system_instruction} 
-             )
-        return self.conversas[user_id]
+        conversa = self.conversas.get(user_id)
+        if conversa is None:
+            if historico is None:
+                historico = self.historico_store.load(user_id)
+            conversa = self.client.chats.create(
+                model=MODEL_NAME,
+                config={"system_instruction": self.system_instruction},
+                history=historico or None,
+            )
+            self.conversas.put(user_id, conversa)
+        return conversa
+
+    def _persistir_conversa(self, user_id, conversa):
+        """Salva o histórico de uma conversa descartada do cache para reconstruí-la depois."""
+        try:
+            self.historico_store.replace(user_id, conversa.get_history())
+        except Exception as e:
+            logging.error(f"Erro ao persistir a conversa de {user_id}: {e}")
+
+    def estatisticas_conversas(self):
+        """Contadores do cache de conversas (hits, misses, descartes, tokens)."""
+        return self.conversas.stats()
+
+    def _config_da_mensagem(self, mensagem):
+        """
+        Config desta mensagem, sempre com a versão mais recente do conhecimento (salva
+        pelo admin em qualquer worker) e, se o arquivo não couber no orçamento, só com
+        os trechos relevantes. O config é reaproveitado por versão do conhecimento.
+        """
+        if self.conhecimento.refresh():
+            self.system_instruction = self.BASE_SYSTEM_INSTRUCTION + envolver_conhecimento(self.conhecimento.content)
+        indice = self.conhecimento.index
+        if not KNOWLEDGE_RETRIEVAL or indice.total_tokens <= KNOWLEDGE_TOKEN_BUDGET:
+            instrucao = self.system_instruction
+            return self.configs.get(indice.geracao, None, lambda: instrucao)
+        secoes = indice.selecionar(mensagem, KNOWLEDGE_TOP_K, KNOWLEDGE_TOKEN_BUDGET)
+        return self.configs.get(indice.geracao, secoes, lambda: self._instrucao_com_secoes(indice, secoes))
+
+    def _instrucao_com_secoes(self, indice, secoes):
+        if not secoes:
+            return self.BASE_SYSTEM_INSTRUCTION
+        return self.BASE_SYSTEM_INSTRUCTION + envolver_conhecimento("\n\n".join(indice.secoes[i].texto for i in secoes))
 
     def _extrair_links_e_formatar(self, texto):
         # A implementação desta função foi simplificada, mas pode ser expandida depois.
@@ -105,27 +179,62 @@ class Hope:
                 "links": {}
             }
 
+        inicio = time.perf_counter()
         try:
-            response = conversa.send_message(mensagem)
+            config = self._config_da_mensagem(mensagem)
+            response = self.chamadas.chamar(
+                lambda timeout: conversa.send_message(mensagem, config=com_timeout(config, timeout)), hedge=False)
             resposta_texto = response.text 
+
+            uso = getattr(response, "usage_metadata", None)
+            if uso and uso.total_token_count:
+                self.conversas.update_tokens(user_id, uso.total_token_count)
             links_encontrados = self._extrair_links_e_formatar(resposta_texto)
             
-            logging.info(f"USUÁRIO: {user_id} | IA: {resposta_texto}")
+            # Só entra na fila: o JSON e a escrita ficam com a thread do log
+            log_conversas.info("resposta", extra={"dados": {
+                "usuario": user_id,
+                "mensagem": mensagem,
+                "resposta": resposta_texto,
+                "origem": "ia",
+                "tokens": uso.total_token_count if uso else None,
+                "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            }})
 
             return {
                 "resposta": resposta_texto,
                 "links": links_encontrados
             }
 
-        except APIError as e:
-            logging.error(f"APIError ao chamar Gemini: {e}")
+        except Exception as e:
+            if not (isinstance(e, CircuitoAberto) or retentavel(e)):
+                return self._resposta_de_erro(e)
+            logging.error(f"IA indisponível ({e}); respondendo com a base de conhecimento.")
+            trecho = self.conhecimento.index.melhor_trecho(mensagem) if self.conhecimento.index else None
+            if not trecho:
+                return self._resposta_de_erro(e)
+            resposta_texto = "Estou com instabilidade para responder agora, mas encontrei isto na nossa base de informações:\n\n" + trecho
+            log_conversas.info("resposta", extra={"dados": {
+                "usuario": user_id,
+                "mensagem": mensagem,
+                "resposta": resposta_texto,
+                "origem": "conhecimento",
+                "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            }})
             return {
-                "resposta": f"Desculpe, a comunicação com a IA falhou. Erro da API: {e}",
+                "resposta": resposta_texto,
                 "links": {}
             }
-        except Exception as e:
-            logging.error(f"Erro inesperado no chat: {e}")
+
+    def _resposta_de_erro(self, e):
+        if isinstance(e, APIError):
+            logging.error(f"APIError ao chamar Gemini: {e}")
             return {
-                "resposta": "Ocorreu um erro inesperado durante o processamento da sua mensagem.",
+                "resposta": f"Desculpe, a comunicação com a IA falhou. Erro da API: {e}",
                 "links": {}
-            }
\ No newline at end of file
+            }
+        logging.error(f"Erro inesperado no chat: {e}")
+        return {
+            "resposta": "Ocorreu um erro inesperado durante o processamento da sua mensagem.",
+            "links": {}
+        }
\ No newline at end of file
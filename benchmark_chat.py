@@ -0,0 +1,94 @@
+# benchmark_chat.py - Latência p50/p99 do /api/chat (roteador local e modo especulativo)
+#
+# Uso: python benchmark_chat.py [latencia_ms_da_ia] [repeticoes]
+# A API Gemini é substituída por um cliente falso com latência fixa, então o
+# resultado mede apenas o custo das idas e voltas, sem gastar cota.
+
+import io
+import os
+import sys
+import contextlib
+import time
+import statistics
+from types import SimpleNamespace
+
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+# Todas as mensagens saem da mesma sessão: sem o limite por cliente, senão parte vira 429
+os.environ.setdefault('RATE_LIMIT', '0')
+
+import app_web_avancada
+
+MENSAGENS = [
+    "Qual o WhatsApp da igreja?",
+    "Me passa o endereço, por favor",
+    "Vocês têm Instagram?",
+    "Como acesso a secretaria?",
+    "Estou passando por um momento difícil, pode orar por mim?",
+    "Qual o horário do culto de domingo?",
+    "Quem é o pastor da igreja?",
+    "Me manda um versículo sobre esperança",
+    "Onde fica a igreja?",
+    "Preciso de uma palavra de conforto hoje",
+]
+
+
+class ModelosFalsos:
+    """Imita client.models.generate_content com uma latência fixa."""
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latencia)
+        instrucao = getattr(config, 'system_instruction', '') or ''
+        if instrucao.startswith("Você é um classificador"):
+            return SimpleNamespace(text="chat")
+        return SimpleNamespace(text="Resposta de teste da Hope.")
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def medir(repeticoes):
+    tempos = []
+    with app_web_avancada.app.test_client() as http, contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeticoes):
+            for mensagem in MENSAGENS:
+                inicio = time.perf_counter()
+                http.post("/api/chat", json={"mensagem": mensagem})
+                tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def main():
+    latencia_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 50.0
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    app_web_avancada.client = SimpleNamespace(models=ModelosFalsos(latencia_ms / 1000))
+    limiar_configurado = app_web_avancada.INTENT_CONFIDENCE_THRESHOLD
+
+    cenarios = [
+        ("antes (sempre IA)", 1.01, False),
+        ("especulativo (sempre IA)", 1.01, True),
+        (f"depois (local, limiar {limiar_configurado})", limiar_configurado, False),
+    ]
+    print(f"Latência simulada da IA: {latencia_ms:.0f} ms | {repeticoes * len(MENSAGENS)} requisições por cenário")
+    for nome, limiar, especulativo in cenarios:
+        app_web_avancada.INTENT_CONFIDENCE_THRESHOLD = limiar
+        app_web_avancada.SPECULATIVE_CHAT = especulativo
+        tempos = medir(repeticoes)
+        print(f"{nome:<32} p50={statistics.median(tempos):8.2f} ms  p99={percentil(tempos, 99):8.2f} ms")
+
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        for mensagem in MENSAGENS:
+            app_web_avancada.classificar_intencao_local(mensagem)
+    custo_us = (time.perf_counter() - inicio) / (1000 * len(MENSAGENS)) * 1e6
+    print(f"Custo médio do roteador local: {custo_us:.1f} µs por mensagem")
+
+
+if __name__ == "__main__":
+    main()
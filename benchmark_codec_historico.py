@@ -0,0 +1,105 @@
+# benchmark_codec_historico.py - Histórico no cookie: JSON do model_dump x codec compacto
+#
+# Uso: python benchmark_codec_historico.py [repeticoes]
+# Mede o tamanho dos cookies assinados (o que vai em cada requisição): o de
+# sessão do Flask com o JSON do model_dump x o cookie próprio do codec. Mostra
+# também quantos turnos cabem em 4 KB e o custo de carregar o histórico a cada
+# requisição, com e sem a montagem dos types.Content.
+#
+# Resultado de referência (respostas com palavras embaralhadas, o que subestima
+# a compressão): 962 x 1207 bytes, 24 x 19 pares em 4 KB (~1,26x, longe dos
+# ~3x esperados). Decodificar e montar os turnos custa o mesmo que
+# types.Content(**h); o ganho de tempo só existe quando os turnos nem são
+# montados (cache e botões).
+
+import re
+import sys
+import time
+import random
+
+from flask import Flask
+from google.genai import types
+
+from codec_historico import ZLIB, SEM_COMPRESSAO, codificar, codificar_turnos, decodificar, par_do_turno
+from historico_store import CookieHistoryStore
+from benchmark_historico import PERGUNTAS, RESPOSTA, turno
+
+LIMITE_COOKIE = 4096
+MAX_PARES = 200
+
+# Frases das respostas de exemplo e da base de conhecimento. Cada resposta sorteia
+# frases e embaralha as palavras, para a compressão não se aproveitar de respostas
+# idênticas (o que numa conversa real não acontece).
+with open("conhecimento_esperancapontalsul.txt", encoding="utf-8") as f:
+    FRASES = [fr for fr in re.split(r"(?<=[.!?])\s+|\n+", RESPOSTA + "\n" + f.read()) if len(fr.split()) > 3]
+
+app = Flask(__name__)
+app.secret_key = "benchmark"
+serializador = app.session_interface.get_signing_serializer(app)
+
+
+def resposta(i):
+    rng = random.Random(i)
+    frases = []
+    for frase in rng.sample(FRASES, 4):
+        palavras = frase.split()
+        rng.shuffle(palavras)
+        frases.append(" ".join(palavras))
+    return " ".join(frases)
+
+
+def conversa(turnos):
+    history = []
+    for i in range(turnos):
+        history.append(turno("user", PERGUNTAS[i % len(PERGUNTAS)]))
+        history.append(turno("model", resposta(i)))
+    return history
+
+
+def cookie_json(history):
+    return serializador.dumps({"sid": "0" * 32, "chat_history": [h.model_dump() for h in history]})
+
+
+def cookie_codec(history, compressao):
+    # O cookie próprio do HISTORY_STORE=cookie; o de sessão fica só com o id
+    store = CookieHistoryStore(lambda: None, lambda valor: None, app.secret_key, compressao=compressao)
+    return serializador.dumps({"sid": "0" * 32}) + store._valor(codificar_turnos(par_do_turno(c) for c in history))
+
+
+def turnos_que_cabem(gerar_cookie):
+    turnos = 0
+    while turnos < MAX_PARES and len(gerar_cookie(conversa(turnos + 1))) <= LIMITE_COOKIE:
+        turnos += 1
+    return turnos
+
+
+def cronometrar(func, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    formatos = [
+        ("JSON (model_dump)", cookie_json),
+        ("codec sem compressão", lambda h: cookie_codec(h, SEM_COMPRESSAO)),
+        ("codec + zlib", lambda h: cookie_codec(h, ZLIB)),
+    ]
+
+    history = conversa(3)
+    print("Tamanho dos cookies (3 pares de turnos) e pares que cabem em 4 KB:")
+    for nome, gerar in formatos:
+        print(f"  {nome:<22} {len(gerar(history)):>6} bytes  {turnos_que_cabem(gerar):>3} pares")
+
+    dados_json = [h.model_dump() for h in history]
+    dados_codec = codificar(history, ZLIB)
+    print(f"\nCarregar o histórico por requisição ({repeticoes} repetições, 3 pares):")
+    print(f"  {'types.Content(**h)':<34} {cronometrar(lambda: [types.Content(**h) for h in dados_json], repeticoes):>8.1f} µs")
+    print(f"  {'decodificar (sem montar turnos)':<34} {cronometrar(lambda: len(decodificar(dados_codec)), repeticoes):>8.1f} µs")
+    print(f"  {'decodificar + montar turnos':<34} {cronometrar(lambda: list(decodificar(dados_codec)), repeticoes):>8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# benchmark_concorrencia.py - Capacidade de usuários simultâneos: modo sync (gunicorn) vs. async (ASGI)
+#
+# Uso: python benchmark_concorrencia.py [latencia_ms_da_ia] [workers_sync] [segundos_por_nivel]
+# Sobe cada servidor em um subprocesso com a IA simulada (latência fixa, sem
+# gastar cota) e dispara níveis crescentes de usuários simultâneos contra /api/chat.
+
+import os
+import sys
+import json
+import time
+import socket
+import statistics
+import subprocess
+import http.client
+import threading
+from types import SimpleNamespace
+
+NIVEIS_USUARIOS = [10, 50, 200]
+MENSAGEM = "Estou passando por um momento difícil, pode orar por mim?"
+
+
+# --- Servidores (rodam no subprocesso) ---
+
+def cliente_falso(latencia):
+    """Cliente com os mesmos métodos usados pelo app, em versões sync e async."""
+    import asyncio
+
+    resposta = SimpleNamespace(text="Resposta de teste da Hope.")
+
+    class ModelosSync:
+        def generate_content(self, model, contents, config=None):
+            time.sleep(latencia)
+            return resposta
+
+    class ModelosAsync:
+        async def generate_content(self, model, contents, config=None):
+            await asyncio.sleep(latencia)
+            return resposta
+
+    return SimpleNamespace(models=ModelosSync(), aio=SimpleNamespace(models=ModelosAsync()))
+
+
+def servir(modo, porta, latencia_ms, workers):
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    # Todos os usuários virtuais saem de 127.0.0.1: sem o limite por IP
+    os.environ.setdefault('RATE_LIMIT', '0')
+    import contextlib
+    import app_web_avancada as web
+    web.client = cliente_falso(latencia_ms / 1000)
+    sys.stdout = open(os.devnull, 'w')  # silencia os prints do app durante a carga
+
+    if modo == "async":
+        import uvicorn
+        import app_asgi
+        uvicorn.run(app_asgi.app, host="127.0.0.1", port=porta, log_level="warning", backlog=4096)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    class Gunicorn(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"127.0.0.1:{porta}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("loglevel", "warning")
+            self.cfg.set("backlog", 4096)
+
+        def load(self):
+            return web.app
+
+    with contextlib.suppress(KeyboardInterrupt):
+        Gunicorn().run()
+
+
+# --- Gerador de carga ---
+
+def esperar_porta(porta, limite=20):
+    fim = time.time() + limite
+    while time.time() < fim:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", porta)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Servidor não respondeu na porta {porta}")
+
+
+def usuario(porta, fim, tempos, erros, lock):
+    corpo = json.dumps({"mensagem": MENSAGEM})
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=60)
+    while time.time() < fim:
+        inicio = time.perf_counter()
+        try:
+            conexao.request("POST", "/api/chat", corpo, {"Content-Type": "application/json"})
+            resposta = conexao.getresponse()
+            resposta.read()
+            ok = resposta.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conexao.close()
+            conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=60)
+        if time.time() > fim:
+            break  # só conta as requisições concluídas dentro da janela
+        with lock:
+            if ok:
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            else:
+                erros.append(1)
+    conexao.close()
+
+
+def carga(porta, usuarios, segundos):
+    tempos, erros, lock = [], [], threading.Lock()
+    fim = time.time() + segundos
+    threads = [threading.Thread(target=usuario, args=(porta, fim, tempos, erros, lock)) for _ in range(usuarios)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return tempos, len(erros)
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main():
+    latencia_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 500.0
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    segundos = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+
+    print(f"IA simulada: {latencia_ms:.0f} ms por chamada | sync: gunicorn com {workers} workers | async: 1 processo uvicorn")
+    for porta, modo in ((8765, "sync"), (8766, "async")):
+        processo = subprocess.Popen([sys.executable, __file__, "servir", modo, str(porta), str(latencia_ms), str(workers)])
+        try:
+            esperar_porta(porta)
+            for usuarios in NIVEIS_USUARIOS:
+                tempos, erros = carga(porta, usuarios, segundos)
+                print(
+                    f"{modo:<5} {usuarios:>4} usuários  {len(tempos) / segundos:8.1f} req/s  "
+                    f"p50={statistics.median(tempos) if tempos else float('nan'):8.1f} ms  "
+                    f"p99={percentil(tempos, 99):8.1f} ms  erros={erros}"
+                )
+        finally:
+            processo.terminate()
+            processo.wait()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "servir":
+        servir(sys.argv[2], int(sys.argv[3]), float(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
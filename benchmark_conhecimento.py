@@ -0,0 +1,79 @@
+# benchmark_conhecimento.py - Tamanho do prompt e latência: arquivo inteiro vs. trechos BM25
+#
+# Uso: python benchmark_conhecimento.py [secoes_extras] [ms_por_mil_tokens]
+# Compara a base atual (pequena) com uma base ampliada artificialmente. A latência
+# da IA é simulada como proporcional aos tokens de entrada, sem chamar a API.
+
+import sys
+import time
+import statistics
+
+from indice_conhecimento import KnowledgeIndex, estimar_tokens
+
+ARQUIVO = "conhecimento_esperancapontalsul.txt"
+LATENCIA_BASE_MS = 300.0
+TOP_K = 4
+ORCAMENTO = 1500
+
+PERGUNTAS = [
+    "Qual o horário do culto de domingo?",
+    "Qual é a chave Pix para o dízimo?",
+    "Quem é o pastor da igreja?",
+    "Tem culto na quinta-feira?",
+    "Quando é o encontro de jovens?",
+    "Como participo do ministério de louvor?",
+]
+
+MINISTERIOS = ["Jovens", "Louvor", "Crianças", "Casais", "Mulheres", "Homens", "Intercessão", "Missões"]
+
+
+def base_ampliada(conteudo, secoes_extras):
+    """Acrescenta seções fictícias de eventos e ministérios ao conhecimento real."""
+    blocos = [conteudo]
+    for i in range(secoes_extras):
+        ministerio = MINISTERIOS[i % len(MINISTERIOS)]
+        blocos.append(
+            f"Evento {i} - Ministério de {ministerio}:\n"
+            f"- Encontro número {i} do ministério de {ministerio.lower()} às {18 + i % 4}h.\n"
+            f"- Inscrições pelo portal da secretaria. Responsável: líder {i}.\n"
+            f"- Local: salão {i % 5 + 1} da sede, traga sua Bíblia e um amigo."
+        )
+    return "\n\n".join(blocos)
+
+
+def medir(nome, conteudo, ms_por_mil_tokens):
+    indice = KnowledgeIndex(conteudo)
+    for modo in ("inteiro", "bm25"):
+        tokens = []
+        construcao = []
+        for pergunta in PERGUNTAS:
+            inicio = time.perf_counter()
+            if modo == "inteiro":
+                contexto = conteudo
+            else:
+                contexto = indice.montar_contexto(pergunta, TOP_K, ORCAMENTO)
+            construcao.append((time.perf_counter() - inicio) * 1000)
+            tokens.append(estimar_tokens(contexto))
+        media_tokens = statistics.mean(tokens)
+        latencia = LATENCIA_BASE_MS + media_tokens / 1000 * ms_por_mil_tokens + statistics.mean(construcao)
+        print(
+            f"{nome:<22} {modo:<8} tokens de conhecimento={media_tokens:8.0f}  "
+            f"montagem={statistics.mean(construcao):7.3f} ms  latência estimada={latencia:8.1f} ms"
+        )
+
+
+def main():
+    secoes_extras = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    ms_por_mil_tokens = float(sys.argv[2]) if len(sys.argv) > 2 else 40.0
+
+    with open(ARQUIVO, 'r', encoding='utf-8') as f:
+        conteudo = f.read()
+
+    print(f"Orçamento: {ORCAMENTO} tokens | top-k: {TOP_K} | latência simulada: "
+          f"{LATENCIA_BASE_MS:.0f} ms + {ms_por_mil_tokens:.0f} ms por mil tokens de entrada")
+    medir("base atual", conteudo, ms_por_mil_tokens)
+    medir(f"base +{secoes_extras} seções", base_ampliada(conteudo, secoes_extras), ms_por_mil_tokens)
+
+
+if __name__ == "__main__":
+    main()
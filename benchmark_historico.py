@@ -0,0 +1,91 @@
+# benchmark_historico.py - Tokens de entrada por turno numa conversa de 50 turnos
+#
+# Uso: python benchmark_historico.py [turnos] [manter_turnos] [orcamento_tokens]
+# Compara o histórico completo (como antes) com a compactação por resumo
+# acumulado: em segundo plano a cada turno e apenas pelo orçamento de tokens.
+# Os tokens são estimados (~4 caracteres por token), sem chamar a IA.
+
+import sys
+import time
+
+from google.genai import types
+
+from historico_store import MemoryHistoryStore
+from compactacao_historico import HistoryCompactor, tokens_do_historico
+from indice_conhecimento import estimar_tokens
+
+PERGUNTAS = [
+    "Estou passando por um momento difícil no trabalho, pode orar por mim?",
+    "Meu nome é Carla e tenho dois filhos pequenos, o Pedro e a Ana.",
+    "Qual o horário do culto de domingo?",
+    "Tem culto infantil para as crianças durante o culto?",
+    "Como faço para participar de um grupo de oração durante a semana?",
+    "Me manda um versículo sobre ansiedade.",
+    "Meu marido está desempregado há três meses, estamos preocupados com as contas.",
+    "A igreja tem algum projeto de ajuda para famílias?",
+    "Quem é o pastor responsável pelo ministério de casais?",
+    "Obrigada, isso me ajudou muito. Vocês fazem aconselhamento?",
+]
+
+RESPOSTA = (
+    "Que alegria poder conversar com você! Entendo o que você está vivendo e quero dizer que **Deus está no controle**. "
+    "Nossa igreja tem cultos no domingo às 19h30 e na quinta às 20h00, e os grupos de oração se reúnem durante a semana. "
+    "Se quiser, posso te passar o contato da secretaria para falar com a equipe pastoral. "
+    "Lembre-se: \"Lançando sobre ele toda a vossa ansiedade, porque ele tem cuidado de vós\" (1 Pedro 5:7). "
+    "Estou orando por você e pela sua família. 🙏"
+)
+
+
+def turno(role, texto):
+    return types.Content(role=role, parts=[types.Part(text=texto)])
+
+
+def simular(turnos, manter=None, orcamento=0, segundo_plano=False):
+    """Tokens de entrada (histórico + mensagem) de cada turno e o tempo gasto compactando."""
+    store = MemoryHistoryStore()
+    compactor = HistoryCompactor(store, manter, orcamento) if manter else None
+    sid = "benchmark"
+    tokens, tempo_compactacao = [], 0.0
+    for i in range(turnos):
+        pergunta = f"{PERGUNTAS[i % len(PERGUNTAS)]} (mensagem {i + 1})"
+        history = store.load(sid)
+        inicio = time.perf_counter()
+        if compactor:
+            compactor.garantir_orcamento(sid, history)
+        tempo_compactacao += time.perf_counter() - inicio
+        tokens.append(tokens_do_historico(history) + estimar_tokens(pergunta))
+        store.append(sid, [turno("user", pergunta), turno("model", RESPOSTA)])
+        if compactor and segundo_plano:
+            # O que o agendamento faz fora da requisição, aqui de forma síncrona
+            history = store.load(sid)
+            if compactor.precisa_compactar(history):
+                inicio = time.perf_counter()
+                store.replace(sid, compactor.compactar(history))
+                tempo_compactacao += time.perf_counter() - inicio
+    return tokens, tempo_compactacao
+
+
+def main():
+    turnos = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    manter = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    orcamento = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    cenarios = [
+        ("histórico completo", simular(turnos)),
+        ("resumo em 2º plano", simular(turnos, manter, orcamento, segundo_plano=True)),
+        ("só orçamento", simular(turnos, manter, orcamento)),
+    ]
+
+    print(f"{turnos} turnos | {manter} pares literais | orçamento de {orcamento} tokens")
+    print(f"{'turno':>6}" + "".join(f"{nome:>22}" for nome, _ in cenarios))
+    for i in sorted({0, 9, 19, 29, 39, turnos - 1}):
+        if i < turnos:
+            print(f"{i + 1:>6}" + "".join(f"{tokens[i]:>22}" for _, (tokens, _) in cenarios))
+    print(f"{'total':>6}" + "".join(f"{sum(tokens):>22}" for _, (tokens, _) in cenarios))
+    for nome, (tokens, tempo) in cenarios[1:]:
+        economia = 1 - sum(tokens) / sum(cenarios[0][1][0])
+        print(f"{nome}: {economia:.0%} menos tokens de entrada, {tempo * 1000:.1f} ms compactando no total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmark_limite_taxa.py - Limite por cliente: lista de horários x contador de janela deslizante
+#
+# Uso: python benchmark_limite_taxa.py [clientes] [mensagens]
+# Simula `mensagens` pedidos espalhados entre `clientes` sessões (um cliente
+# "inundando" o chat recebe metade deles) e compara o custo por pedido e a
+# memória da abordagem ingênua (lista com o horário de cada mensagem, filtrada
+# a cada pedido) com os backends de limite_taxa.py.
+
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+
+from limite_taxa import MemoryRateBackend, SQLiteRateBackend
+
+LIMITE = 120
+JANELA = 60.0
+
+
+class ListaDeHorarios:
+    """A abordagem ingênua: guarda o horário de cada mensagem aceita da chave."""
+
+    def __init__(self):
+        self._horarios = {}
+
+    def consumir(self, itens, agora):
+        for chave, limite, janela in itens:
+            recentes = [t for t in self._horarios.get(chave, ()) if t > agora - janela]
+            self._horarios[chave] = recentes
+            if len(recentes) >= limite:
+                return False, recentes[0] + janela - agora
+        for chave, _, _ in itens:
+            self._horarios[chave].append(agora)
+        return True, 0.0
+
+
+def pedidos(clientes, mensagens, semente=0):
+    rng = random.Random(semente)
+    agora = 1_000_000.0
+    for _ in range(mensagens):
+        agora += rng.expovariate(200.0)  # ~200 pedidos/s no total
+        cliente = "inundador" if rng.random() < 0.5 else f"c{rng.randrange(clientes)}"
+        yield [(f"sessao:{cliente}", LIMITE, JANELA)], agora
+
+
+def medir(fabrica, lista):
+    """(µs por pedido, KiB retidos ao final, pedidos aceitos). A memória é medida numa segunda passada."""
+    backend = fabrica()
+    inicio = time.perf_counter()
+    aceitos = 0
+    for itens, agora in lista:
+        aceitos += backend.consumir(itens, agora)[0]
+    segundos = time.perf_counter() - inicio
+    # tracemalloc deixa cada alocação mais lenta: fica fora da medida de tempo
+    tracemalloc.start()
+    backend = fabrica()
+    for itens, agora in lista:
+        backend.consumir(itens, agora)
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return segundos / len(lista) * 1e6, memoria / 1024, aceitos
+
+
+def main():
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    mensagens = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    lista = list(pedidos(clientes, mensagens))
+    print(f"{mensagens} pedidos, {clientes} clientes + 1 inundando; limite {LIMITE} por {JANELA:.0f}s")
+    print(f"  {'abordagem':<28} {'µs/pedido':>10} {'memória (KiB)':>14} {'aceitos':>8}")
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos = iter(os.path.join(pasta, f"limites{i}.db") for i in range(10))
+        for nome, fabrica in (
+            ("lista de horários", ListaDeHorarios),
+            ("janela deslizante (memória)", MemoryRateBackend),
+            ("janela deslizante (sqlite)", lambda: SQLiteRateBackend(next(caminhos))),
+        ):
+            micro, kib, aceitos = medir(fabrica, lista)
+            memoria = "(disco)" if "sqlite" in nome else f"{kib:.0f}"
+            print(f"  {nome:<28} {micro:>10.2f} {memoria:>14} {aceitos:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmark_palavras_chave.py - Busca de palavras-chave do ParceiroDeFe: laço x Aho–Corasick
+#
+# Uso: python benchmark_palavras_chave.py [repeticoes]
+# Compara o laço original (um teste de substring por palavra-chave) com o
+# autômato de palavras_chave.py, com as palavras reais de dados_biblicos e
+# com tabelas sintéticas de algumas centenas de palavras-chave. O tempo do
+# autômato inclui a normalização NFKD da pergunta.
+
+import sys
+import time
+import random
+
+from assistente import montar_buscador
+from dados_biblicos import RESPOSTAS_COMUNS, PALAVRAS_CHAVE
+from palavras_chave import KeywordMatcher
+
+PERGUNTAS = [
+    "Olá, bom dia! Gostaria de saber qual é o horário do culto de domingo à noite, por favor.",
+    "Estou passando por um momento muito difícil e queria uma palavra de conforto.",
+    "Como faço para doar?",
+    "Onde fica a igreja?",
+]
+
+SILABAS = ("ba be bi bo bu ca ce ci co cu da de di do du fa fe fi fo fu ga ge gi go gu la le li lo lu "
+           "ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu").split()
+
+
+def palavras_sinteticas(quantidade, semente=0):
+    rng = random.Random(semente)
+    palavras = set()
+    while len(palavras) < quantidade:
+        palavras.add("".join(rng.choice(SILABAS) for _ in range(rng.randint(3, 4))))
+    return sorted(palavras)
+
+
+def laco_original(respostas, pergunta):
+    """A busca antiga de ParceiroDeFe.obter_resposta."""
+    pergunta_limpa = pergunta.lower().strip()
+    for palavra_chave, resposta in respostas.items():
+        if palavra_chave in pergunta_limpa:
+            return resposta
+    return None
+
+
+def cronometrar(func, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for pergunta in PERGUNTAS:
+            func(pergunta)
+    return (time.perf_counter() - inicio) / (repeticoes * len(PERGUNTAS)) * 1e6
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print("Acertos com acento (laço original x autômato):")
+    buscador = montar_buscador()
+    for pergunta in ("Qual o horário do culto?", "Quero fazer uma doação", "Qual o endereço?"):
+        antigo = laco_original(RESPOSTAS_COMUNS, pergunta)
+        print(f"  {pergunta!r:<30} {'acertou' if antigo else 'errou':>8} {buscador.buscar(pergunta) or 'errou':>10}")
+
+    sinonimos = sum(len(lista) for _, lista in PALAVRAS_CHAVE.values())
+    print(f"\nTempo por pergunta ({repeticoes} x {len(PERGUNTAS)} perguntas):")
+    print(f"  {'palavras-chave':>14} {'laço (µs)':>11} {'autômato (µs)':>14}")
+    print(f"  {len(RESPOSTAS_COMUNS):>14} {cronometrar(lambda p: laco_original(RESPOSTAS_COMUNS, p), repeticoes):>11.1f} "
+          f"{cronometrar(buscador.buscar, repeticoes):>14.1f}   (dados_biblicos; o autômato tem {sinonimos} sinônimos)")
+    for quantidade in (100, 300, 600, 1000):
+        palavras = palavras_sinteticas(quantidade)
+        respostas = {palavra: palavra for palavra in palavras}
+        automato = KeywordMatcher((palavra, palavra, 0) for palavra in palavras)
+        print(f"  {quantidade:>14} {cronometrar(lambda p: laco_original(respostas, p), repeticoes):>11.1f} "
+              f"{cronometrar(automato.buscar, repeticoes):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# cache_config.py - Reaproveita o GenerateContentConfig por versão do conhecimento
+
+import threading
+
+from google.genai import types
+
+
+class GenerateConfigCache:
+    """
+    Guarda um `types.GenerateContentConfig` por (versão do conhecimento, seções).
+
+    Quando a versão muda, as entradas antigas são descartadas de uma vez, então
+    uma atualização do conhecimento sempre chega ao próximo request.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._versao = None
+        self._configs = {}
+        self._lock = threading.Lock()
+
+    def get(self, versao, secoes, montar_instrucao):
+        """
+        Retorna o config em cache ou cria um novo com `montar_instrucao()`.
+
+        Args:
+            versao: versão do conhecimento usada para montar a instrução.
+            secoes: chave das seções injetadas (None = arquivo inteiro).
+            montar_instrucao: função sem argumentos que devolve a instrução do sistema.
+        """
+        chave = (versao, secoes)
+        config = self._configs.get(chave)
+        if config is not None:
+            return config
+        config = types.GenerateContentConfig(system_instruction=montar_instrucao())
+        with self._lock:
+            if versao != self._versao:
+                if self._versao is not None and versao < self._versao:
+                    return config  # requisição atrasada com uma versão já substituída
+                self._versao = versao
+                self._configs = {}
+            if len(self._configs) >= self.max_entries:
+                self._configs = {}
+            self._configs[chave] = config
+        return config
@@ -0,0 +1,179 @@
+# cache_contexto.py - Cache de contexto do Gemini para a instrução do sistema
+#
+# A persona + base de conhecimento é a parte grande e fixa de cada chamada. Com
+# o cache de contexto ela fica guardada no servidor do Gemini e as chamadas só
+# referenciam o nome do cache (tokens em cache são cobrados com desconto).
+# A criação e a renovação rodam em segundo plano; enquanto o cache não existe,
+# ou se a criação falhar, as chamadas continuam com a instrução inline.
+# Quando uma versão nova fica ativa, os caches das versões anteriores são
+# apagados em vez de esperar o TTL (cada um é cobrado enquanto existir).
+
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import types
+
+from indice_conhecimento import estimar_tokens
+
+PREFIXO_EXIBICAO = "hope-conhecimento-"
+
+
+class _CacheAtivo:
+    __slots__ = ("versao", "nome", "expira")
+
+    def __init__(self, versao, nome, expira):
+        self.versao = versao
+        self.nome = nome
+        self.expira = expira
+
+
+def _expiracao(cached_content, ttl_seconds):
+    expira = getattr(cached_content, "expire_time", None)
+    return expira.timestamp() if expira else time.time() + ttl_seconds
+
+
+class ContextCache:
+    """
+    Um cache de contexto por versão do conhecimento, renovado antes de expirar.
+
+    O nome de exibição leva o hash da instrução, então os workers do gunicorn
+    reaproveitam o mesmo cache em vez de criar um cada.
+    """
+
+    def __init__(self, client, model, ttl_seconds=3600, refresh_margin=300, min_tokens=1024, retry_seconds=60):
+        self.client = client
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.min_tokens = min_tokens
+        self.retry_seconds = retry_seconds
+        self._ativo = None
+        self._ocupado = False  # criação ou renovação em andamento
+        self._falha = None  # (versão, momento da falha)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-contexto')
+        self.criados = 0
+        self.reaproveitados = 0
+        self.renovados = 0
+        self.apagados = 0
+        self.falhas = 0
+
+    def nome(self, versao, montar_instrucao):
+        """
+        Nome do cache da versão, ou None para usar a instrução inline (o cache
+        ainda está sendo criado, falhou recentemente ou a instrução é pequena).
+        """
+        agora = time.time()
+        with self._lock:
+            ativo = self._ativo
+            if ativo and ativo.versao == versao and ativo.expira - agora > 5:
+                if ativo.expira - agora < self.refresh_margin and not self._ocupado:
+                    self._ocupado = True
+                    self._pool.submit(self._renovar, ativo)
+                return ativo.nome
+            if self._ocupado or (self._falha and self._falha[0] == versao and agora - self._falha[1] < self.retry_seconds):
+                return None
+            self._ocupado = True
+        self._pool.submit(self._criar, versao, montar_instrucao)
+        return None
+
+    def _criar(self, versao, montar_instrucao):
+        try:
+            instrucao = montar_instrucao()
+            if estimar_tokens(instrucao) < self.min_tokens:
+                # Abaixo do mínimo do Gemini para cache explícito: fica inline para sempre
+                with self._lock:
+                    self._falha = (versao, float("inf"))
+                return
+            exibicao = f"{PREFIXO_EXIBICAO}{hashlib.sha1(instrucao.encode('utf-8')).hexdigest()[:16]}"
+            minimo = time.time() + self.refresh_margin
+            existente = next((
+                c for c in self.client.caches.list()
+                if c.display_name == exibicao and _expiracao(c, 0) > minimo
+            ), None)
+            if existente is None:
+                existente = self.client.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(
+                        display_name=exibicao,
+                        system_instruction=instrucao,
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+                self.criados += 1
+            else:
+                self.reaproveitados += 1
+            with self._lock:
+                ativou = self._ativo is None or versao >= self._ativo.versao
+                if ativou:
+                    self._ativo = _CacheAtivo(versao, existente.name, _expiracao(existente, self.ttl_seconds))
+                self._falha = None
+            print(f"INFO: Cache de contexto {existente.name} ativo para a versão {versao} do conhecimento.")
+            if ativou:
+                self._apagar_anteriores(existente)
+        except Exception as e:
+            print(f"Erro ao criar o cache de contexto: {e}. Usando a instrução inline.")
+            self.falhas += 1
+            with self._lock:
+                self._falha = (versao, time.time())
+        finally:
+            with self._lock:
+                self._ocupado = False
+
+    def _apagar_anteriores(self, atual):
+        """
+        Apaga os caches do Hope criados antes de `atual` (versões substituídas).
+        Os mais novos ficam: podem ser de uma versão que outro worker já ativou.
+        Um worker que ainda usava um cache apagado cai na instrução inline.
+        """
+        criado = getattr(atual, "create_time", None)
+        if criado is None:
+            return
+        try:
+            for cache in self.client.caches.list():
+                if (cache.name != atual.name and (cache.display_name or "").startswith(PREFIXO_EXIBICAO)
+                        and cache.create_time is not None and cache.create_time < criado):
+                    self.client.caches.delete(name=cache.name)
+                    self.apagados += 1
+                    print(f"INFO: Cache de contexto {cache.name} apagado (versão substituída).")
+        except Exception as e:
+            print(f"Erro ao apagar caches de contexto antigos: {e}")
+
+    def _renovar(self, ativo):
+        try:
+            atualizado = self.client.caches.update(
+                name=ativo.nome,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"),
+            )
+            with self._lock:
+                if self._ativo is ativo:
+                    ativo.expira = _expiracao(atualizado, self.ttl_seconds)
+            self.renovados += 1
+        except Exception as e:
+            print(f"Erro ao renovar o cache de contexto {ativo.nome}: {e}")
+            self.invalidar(ativo.nome)
+        finally:
+            with self._lock:
+                self._ocupado = False
+
+    def invalidar(self, nome):
+        """Esquece o cache (ex.: a chamada falhou porque ele expirou ou foi apagado)."""
+        with self._lock:
+            if self._ativo is not None and self._ativo.nome == nome:
+                self._ativo = None
+
+    def stats(self):
+        with self._lock:
+            ativo = self._ativo
+        return {
+            "active": ativo.nome if ativo else None,
+            "version": ativo.versao if ativo else None,
+            "expires_in": round(ativo.expira - time.time()) if ativo else None,
+            "created": self.criados,
+            "reused": self.reaproveitados,
+            "refreshed": self.renovados,
+            "deleted": self.apagados,
+            "failures": self.falhas,
+        }
@@ -0,0 +1,112 @@
+# cache_conversas.py - Cache limitado (LRU + TTL + orçamento de tokens) para objetos de chat
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class ConversationCache:
+    """
+    Guarda os objetos de chat por usuário com limite de entradas, expiração por
+    inatividade e, opcionalmente, um orçamento total de tokens.
+
+    Ao descartar uma entrada, chama `on_evict(chave, valor)` fora do lock, para
+    que o histórico possa ser persistido e o chat reconstruído depois.
+    """
+
+    def __init__(self, max_entries=500, ttl_seconds=1800, max_tokens=None, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_tokens = max_tokens
+        self.on_evict = on_evict
+        self._entradas = OrderedDict()  # chave -> [valor, último acesso, tokens]
+        self._total_tokens = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, chave):
+        return chave in self._entradas
+
+    def _remover(self, chave, descartados):
+        valor, _, tokens = self._entradas.pop(chave)
+        self._total_tokens -= tokens
+        self.evictions += 1
+        descartados.append((chave, valor))
+
+    def _expirar(self, agora, descartados):
+        # A ordem LRU é a ordem de acesso, então as expiradas estão no início
+        while self._entradas and self.ttl_seconds:
+            chave, (_, ultimo_acesso, _) = next(iter(self._entradas.items()))
+            if agora - ultimo_acesso <= self.ttl_seconds:
+                break
+            self._remover(chave, descartados)
+
+    def _aplicar_limites(self, descartados):
+        while len(self._entradas) > self.max_entries:
+            self._remover(next(iter(self._entradas)), descartados)
+        while self.max_tokens and self._total_tokens > self.max_tokens and len(self._entradas) > 1:
+            self._remover(next(iter(self._entradas)), descartados)
+
+    def _notificar(self, descartados):
+        if self.on_evict:
+            for chave, valor in descartados:
+                self.on_evict(chave, valor)
+
+    def get(self, chave):
+        """Retorna o valor da chave (ou None) e atualiza a posição LRU."""
+        descartados = []
+        with self._lock:
+            self._expirar(time.monotonic(), descartados)
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.misses += 1
+                valor = None
+            else:
+                self.hits += 1
+                entrada[1] = time.monotonic()
+                self._entradas.move_to_end(chave)
+                valor = entrada[0]
+        self._notificar(descartados)
+        return valor
+
+    def put(self, chave, valor, tokens=0):
+        """Insere ou substitui uma entrada, descartando as mais antigas se preciso."""
+        descartados = []
+        with self._lock:
+            if chave in self._entradas:
+                self._total_tokens -= self._entradas.pop(chave)[2]
+            self._entradas[chave] = [valor, time.monotonic(), tokens]
+            self._total_tokens += tokens
+            self._expirar(time.monotonic(), descartados)
+            self._aplicar_limites(descartados)
+        self._notificar(descartados)
+
+    def update_tokens(self, chave, tokens):
+        """Atualiza o tamanho (em tokens) de uma conversa e aplica o orçamento total."""
+        descartados = []
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return
+            self._total_tokens += tokens - entrada[2]
+            entrada[2] = tokens
+            self._aplicar_limites(descartados)
+        self._notificar(descartados)
+
+    def stats(self):
+        """Contadores para dimensionar o cache com o tráfego real."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entradas),
+                "tokens": self._total_tokens,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
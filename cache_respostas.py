@@ -0,0 +1,150 @@
+# cache_respostas.py - Cache de respostas para as perguntas repetidas da igreja
+#
+# A chave é o texto normalizado da pergunta junto com a versão do conhecimento;
+# perguntas quase iguais (mesmo conjunto de palavras) também podem ser atendidas
+# pela similaridade de Jaccard entre os conjuntos de tokens. Nessa comparação
+# as palavras interrogativas não são descartadas e precisam coincidir: "Quando
+# é o culto?" e "Onde é o culto?" são perguntas diferentes.
+
+import time
+import threading
+from collections import OrderedDict
+
+from intencao_local import normalizar_texto
+from indice_conhecimento import STOPWORDS
+
+INTERROGATIVAS = frozenset("quem como onde quando qual quais quanto quanta quantos quantas porque".split())
+_DESCARTADAS = STOPWORDS - INTERROGATIVAS
+
+
+def tokens_similaridade(pergunta):
+    """Tokens da pergunta para a comparação por similaridade (sem stopwords, com as interrogativas)."""
+    return frozenset(t for t in normalizar_texto(pergunta).split() if t not in _DESCARTADAS)
+
+
+class ResponseCache:
+    """
+    Cache LRU com TTL de respostas da IA.
+
+    Quando a versão do conhecimento muda, todas as respostas são descartadas.
+    """
+
+    def __init__(self, max_entries=500, ttl_seconds=3600, similarity=0.8):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._versao = None
+        self._entradas = OrderedDict()  # texto normalizado -> (resposta, criado, tokens)
+        self._por_token = {}  # token -> textos normalizados que o contêm
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _similaridade_ativa(self):
+        return 0 < self.similarity <= 1
+
+    def _remover(self, chave):
+        _, _, tokens = self._entradas.pop(chave)
+        for token in tokens:
+            chaves = self._por_token.get(token)
+            if chaves:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._por_token[token]
+
+    def _sincronizar_versao(self, versao):
+        """Descarta tudo se a versão avançou; retorna False para uma versão já substituída."""
+        if self._versao is not None and versao < self._versao:
+            return False
+        if versao != self._versao:
+            self._versao = versao
+            self._entradas.clear()
+            self._por_token.clear()
+        return True
+
+    def _valida(self, chave, agora):
+        resposta, criado, _ = self._entradas[chave]
+        if self.ttl_seconds and agora - criado > self.ttl_seconds:
+            self._remover(chave)
+            self.evictions += 1
+            return None
+        self._entradas.move_to_end(chave)
+        return resposta
+
+    def _mais_parecida(self, tokens):
+        candidatas = set()
+        for token in tokens:
+            candidatas |= self._por_token.get(token, set())
+        interrogativas = tokens & INTERROGATIVAS
+        melhor, melhor_nota = None, 0.0
+        for chave in candidatas:
+            outros = self._entradas[chave][2]
+            if outros & INTERROGATIVAS != interrogativas:
+                continue
+            nota = len(tokens & outros) / len(tokens | outros)
+            if nota > melhor_nota:
+                melhor, melhor_nota = chave, nota
+        return melhor if melhor_nota >= self.similarity else None
+
+    def get(self, pergunta, versao):
+        """Resposta em cache para a pergunta (ou None)."""
+        chave = normalizar_texto(pergunta)
+        agora = time.monotonic()
+        with self._lock:
+            if not self._sincronizar_versao(versao):
+                self.misses += 1
+                return None
+            if chave in self._entradas:
+                resposta = self._valida(chave, agora)
+                if resposta is not None:
+                    self.hits += 1
+                    return resposta
+            if self._similaridade_ativa():
+                tokens = tokens_similaridade(pergunta)
+                parecida = self._mais_parecida(tokens) if tokens else None
+                if parecida is not None:
+                    resposta = self._valida(parecida, agora)
+                    if resposta is not None:
+                        self.hits += 1
+                        self.similar_hits += 1
+                        return resposta
+            self.misses += 1
+            return None
+
+    def put(self, pergunta, versao, resposta):
+        """Guarda a resposta da IA para a pergunta na versão de conhecimento indicada."""
+        chave = normalizar_texto(pergunta)
+        if not chave:
+            return
+        tokens = tokens_similaridade(pergunta)
+        with self._lock:
+            if not self._sincronizar_versao(versao):
+                return  # resposta gerada com um conhecimento já substituído
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (resposta, time.monotonic(), tokens)
+            for token in tokens:
+                self._por_token.setdefault(token, set()).add(chave)
+            while len(self._entradas) > self.max_entries:
+                self._remover(next(iter(self._entradas)))
+                self.evictions += 1
+
+    def clear(self):
+        """Descarta todas as respostas (ex.: o admin salvou um novo conhecimento)."""
+        with self._lock:
+            self._entradas.clear()
+            self._por_token.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entradas),
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,271 @@
+# carga_chat.py - Teste de carga de ponta a ponta do /api/chat contra o Gemini falso
+#
+# Uso: python carga_chat.py [--usuarios 50] [--duracao 30] [--servidor sync|async]
+#                           [--latencia lognormal:800:0.4] [--taxa-erro 0.02] [--stream]
+#      python carga_chat.py --alvo http://127.0.0.1:5000   (app já em execução)
+#
+# Sobe o gemini_falso.py e o app (gunicorn ou uvicorn) em subprocessos, com o
+# cliente genai apontado para o falso via GOOGLE_GEMINI_BASE_URL, e simula
+# usuários com conversas de vários turnos (cookie de sessão por usuário).
+# Relata req/s, p50/p95/p99 e taxas de erro; --json grava o resultado para
+# comparar execuções (testes de regressão de desempenho).
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import subprocess
+import http.client
+import threading
+from urllib.parse import urlsplit
+
+# Conversas típicas do chat da igreja; cada usuário virtual sorteia uma por sessão
+CONVERSAS = [
+    ["Qual o horário dos cultos?", "E no domingo tem culto infantil?", "Obrigado!"],
+    ["Estou passando por um momento difícil, pode orar por mim?", "Minha família está doente.",
+     "Tem algum versículo sobre esperança?", "Amém, obrigada."],
+    ["Quero falar com a secretaria"],
+    ["Onde fica a igreja?", "Tem estacionamento?"],
+    ["Como faço para ser batizado?", "Precisa fazer algum curso antes?", "Quando é a próxima turma?"],
+    ["Qual o instagram de vocês?"],
+    ["O que é a Igreja Mais de Cristo?", "Quem é o pastor?", "Como posso participar de um grupo?",
+     "Vocês têm célula perto do centro?", "Legal, obrigado pela ajuda!"],
+]
+
+# Mesmo texto de app_web_avancada.MENSAGEM_ERRO_IA (o app responde 200 quando a IA falha)
+MENSAGEM_ERRO_IA = "Desculpe, estou com dificuldades técnicas no momento. Por favor, tente novamente mais tarde."
+# Início das respostas alternativas (base de conhecimento) quando a IA falha ou o circuito abre
+MENSAGEM_INSTABILIDADE = "Estou com instabilidade para responder agora"
+
+
+# --- Servidores ---
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_porta(porta, limite=30):
+    fim = time.time() + limite
+    while time.time() < fim:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", porta)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Servidor não respondeu na porta {porta}")
+
+
+def subir_servidores(args):
+    """Sobe o Gemini falso e o app; retorna (processos, porta do app)."""
+    porta_gemini, porta_app = porta_livre(), porta_livre()
+    silencio = subprocess.DEVNULL
+    gemini = subprocess.Popen([
+        sys.executable, "gemini_falso.py", "--porta", str(porta_gemini), "--latencia", args.latencia,
+        "--tokens-por-segundo", str(args.tokens_por_segundo), "--taxa-erro", str(args.taxa_erro),
+        "--codigo-erro", str(args.codigo_erro),
+    ], stdout=silencio)
+    env = dict(os.environ, GOOGLE_GEMINI_BASE_URL=f"http://127.0.0.1:{porta_gemini}",
+               GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "carga"))
+    # Com vários workers, o histórico em memória se perde entre eles: as conversas
+    # de vários turnos só são representativas com um histórico compartilhado
+    env.setdefault("HISTORY_STORE", "sqlite")
+    # Todos os usuários virtuais saem de 127.0.0.1: o limite por IP recusaria quase tudo
+    env.setdefault("RATE_LIMIT", "0")
+    if args.servidor == "async":
+        comando = [sys.executable, "-m", "uvicorn", "app_asgi:app", "--port", str(porta_app),
+                   "--workers", str(args.workers), "--log-level", "warning", "--backlog", "4096"]
+    else:
+        comando = [sys.executable, "-m", "gunicorn", "app_web_avancada:app", "--bind", f"127.0.0.1:{porta_app}",
+                   "--workers", str(args.workers), "--threads", str(args.threads), "--log-level", "warning",
+                   "--backlog", "4096"]
+    app = subprocess.Popen(comando, env=env, stdout=silencio)
+    processos = [gemini, app]
+    try:
+        esperar_porta(porta_gemini)
+        esperar_porta(porta_app)
+    except RuntimeError:
+        parar(processos)
+        raise
+    return processos, porta_app
+
+
+def parar(processos):
+    for processo in processos:
+        processo.terminate()
+    for processo in processos:
+        processo.wait()
+
+
+# --- Usuários virtuais ---
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = []
+        self.primeiro_trecho = []
+        self.erros_http = 0
+        self.recusadas = 0  # 503 do controle de admissão
+        self.erros_ia = 0
+        self.alternativas = 0
+        self.sessoes = 0
+
+    def registrar(self, latencia, primeiro_trecho, status, resposta):
+        with self.lock:
+            if status == 503:
+                self.recusadas += 1
+                return
+            if status != 200:
+                self.erros_http += 1
+                return
+            self.latencias.append(latencia)
+            if primeiro_trecho is not None:
+                self.primeiro_trecho.append(primeiro_trecho)
+            if MENSAGEM_ERRO_IA in resposta:
+                self.erros_ia += 1
+            elif MENSAGEM_INSTABILIDADE in resposta:
+                self.alternativas += 1
+
+
+def enviar(conexao, rota, mensagem, cookie, stream):
+    """Envia um turno; retorna (status, texto da resposta, ms até o 1º trecho, cookie)."""
+    headers = {"Content-Type": "application/json"}
+    if cookie:
+        headers["Cookie"] = cookie
+    inicio = time.perf_counter()
+    conexao.request("POST", rota, json.dumps({"mensagem": mensagem}), headers)
+    resposta = conexao.getresponse()
+    set_cookie = resposta.getheader("Set-Cookie")
+    if set_cookie:
+        cookie = set_cookie.split(";", 1)[0]
+    primeiro_trecho = None
+    if stream and resposta.getheader("Content-Type", "").startswith("text/event-stream"):
+        partes = []
+        while True:
+            linha = resposta.readline()
+            if not linha:
+                break
+            if linha.startswith(b"data: "):
+                dados = json.loads(linha[6:])
+                if "texto" in dados:
+                    if primeiro_trecho is None:
+                        primeiro_trecho = (time.perf_counter() - inicio) * 1000
+                    partes.append(dados["texto"])
+        texto = "".join(partes)
+    else:
+        corpo = resposta.read()
+        texto = json.loads(corpo or b"{}").get("resposta", "") if resposta.status == 200 else ""
+    return resposta.status, texto, primeiro_trecho, cookie
+
+
+def usuario(host, porta, fim, args, resultados):
+    rota = "/api/chat/stream" if args.stream else "/api/chat"
+    conexao = http.client.HTTPConnection(host, porta, timeout=120)
+    while time.time() < fim:
+        cookie = None  # cada conversa é uma sessão nova
+        with resultados.lock:
+            resultados.sessoes += 1
+        for mensagem in random.choice(CONVERSAS):
+            inicio = time.perf_counter()
+            try:
+                status, texto, primeiro_trecho, cookie = enviar(conexao, rota, mensagem, cookie, args.stream)
+            except (OSError, http.client.HTTPException, ValueError):
+                status, texto, primeiro_trecho = 0, "", None
+                conexao.close()
+                conexao = http.client.HTTPConnection(host, porta, timeout=120)
+            if time.time() > fim:
+                break  # só conta os turnos concluídos dentro da janela
+            resultados.registrar((time.perf_counter() - inicio) * 1000, primeiro_trecho, status, texto)
+            if args.pensar:
+                time.sleep(random.uniform(0.5, 1.5) * args.pensar / 1000)
+    conexao.close()
+
+
+# --- Relatório ---
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def relatorio(resultados, segundos):
+    concluidos = len(resultados.latencias)
+    total = concluidos + resultados.erros_http + resultados.recusadas
+    resumo = {
+        "turnos": total,
+        "sessoes": resultados.sessoes,
+        "rps": round(concluidos / segundos, 2),
+        "p50_ms": round(percentil(resultados.latencias, 50), 1),
+        "p95_ms": round(percentil(resultados.latencias, 95), 1),
+        "p99_ms": round(percentil(resultados.latencias, 99), 1),
+        "taxa_erro_http": round(resultados.erros_http / total, 4) if total else 0.0,
+        "taxa_recusadas": round(resultados.recusadas / total, 4) if total else 0.0,
+        "taxa_erro_ia": round(resultados.erros_ia / concluidos, 4) if concluidos else 0.0,
+        "taxa_alternativas": round(resultados.alternativas / concluidos, 4) if concluidos else 0.0,
+    }
+    if resultados.primeiro_trecho:
+        resumo["primeiro_trecho_p50_ms"] = round(percentil(resultados.primeiro_trecho, 50), 1)
+        resumo["primeiro_trecho_p95_ms"] = round(percentil(resultados.primeiro_trecho, 95), 1)
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /api/chat com o Gemini falso.")
+    parser.add_argument("--alvo", help="URL de um app já em execução (não sobe servidores)")
+    parser.add_argument("--servidor", choices=("sync", "async"), default="sync")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=1, help="threads por worker do gunicorn (modo sync)")
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--duracao", type=float, default=30.0, help="segundos de carga")
+    parser.add_argument("--pensar", type=float, default=500.0, help="tempo médio entre turnos, em ms")
+    parser.add_argument("--stream", action="store_true", help="usa /api/chat/stream")
+    parser.add_argument("--latencia", default="lognormal:800:0.4")
+    parser.add_argument("--tokens-por-segundo", type=float, default=80.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--codigo-erro", type=int, default=503)
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    args = parser.parse_args()
+
+    processos = []
+    if args.alvo:
+        url = urlsplit(args.alvo)
+        host, porta = url.hostname, url.port or 80
+    else:
+        processos, porta = subir_servidores(args)
+        host = "127.0.0.1"
+        print(f"App {args.servidor} ({args.workers} workers) na porta {porta} | Gemini falso: "
+              f"latência {args.latencia}, erros {args.taxa_erro:.0%}")
+
+    resultados = Resultados()
+    try:
+        fim = time.time() + args.duracao
+        threads = [threading.Thread(target=usuario, args=(host, porta, fim, args, resultados))
+                   for _ in range(args.usuarios)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        parar(processos)
+
+    resumo = relatorio(resultados, args.duracao)
+    print(f"{args.usuarios} usuários por {args.duracao:.0f}s: {resumo['turnos']} turnos em {resumo['sessoes']} sessões")
+    print(f"  {resumo['rps']:.1f} req/s  p50={resumo['p50_ms']:.1f} ms  p95={resumo['p95_ms']:.1f} ms  "
+          f"p99={resumo['p99_ms']:.1f} ms")
+    if "primeiro_trecho_p50_ms" in resumo:
+        print(f"  primeiro trecho: p50={resumo['primeiro_trecho_p50_ms']:.1f} ms  "
+              f"p95={resumo['primeiro_trecho_p95_ms']:.1f} ms")
+    print(f"  erros HTTP: {resumo['taxa_erro_http']:.2%}  recusadas (503): {resumo['taxa_recusadas']:.2%}  respostas de erro da IA: {resumo['taxa_erro_ia']:.2%}  "
+          f"respostas alternativas: {resumo['taxa_alternativas']:.2%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(dict(resumo, config=vars(args)), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
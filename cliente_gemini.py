@@ -0,0 +1,95 @@
+# cliente_gemini.py - Cliente Gemini compartilhado, com pool de conexões explícito
+#
+# Um único genai.Client por processo, sobre clientes httpx configurados (limites
+# do pool, keep-alive, timeouts e HTTP/2 opcional). As conexões TLS abertas são
+# reaproveitadas entre requisições e threads. Depois de um fork (gunicorn com
+# --preload), o processo filho monta um cliente novo em vez de herdar os
+# sockets do pai.
+
+import os
+import threading
+
+import httpx
+from google import genai
+from google.genai import types
+
+try:
+    import h2  # noqa: F401  (HTTP/2 do httpx)
+except ImportError:
+    h2 = None
+
+GEMINI_POOL_MAX_CONNECTIONS = int(os.environ.get('GEMINI_POOL_MAX_CONNECTIONS', '100'))
+GEMINI_POOL_MAX_KEEPALIVE = int(os.environ.get('GEMINI_POOL_MAX_KEEPALIVE', '20'))
+GEMINI_KEEPALIVE_SECONDS = float(os.environ.get('GEMINI_KEEPALIVE_SECONDS', '120'))
+GEMINI_CONNECT_TIMEOUT = float(os.environ.get('GEMINI_CONNECT_TIMEOUT', '5'))
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', '60'))
+GEMINI_HTTP2 = os.environ.get('GEMINI_HTTP2', '0') == '1'
+
+_lock = threading.Lock()
+_cliente = None
+_pid = None
+
+
+def _opcoes_httpx():
+    http2 = GEMINI_HTTP2 and h2 is not None
+    if GEMINI_HTTP2 and h2 is None:
+        print("AVISO: GEMINI_HTTP2=1, mas o pacote 'h2' não está instalado (pip install httpx[http2]). Usando HTTP/1.1.")
+    return {
+        "limits": httpx.Limits(
+            max_connections=GEMINI_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=GEMINI_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=GEMINI_KEEPALIVE_SECONDS,
+        ),
+        "timeout": httpx.Timeout(GEMINI_TIMEOUT_SECONDS, connect=GEMINI_CONNECT_TIMEOUT),
+        "http2": http2,
+    }
+
+
+def create_client(api_key=None):
+    """Cria um genai.Client novo com os clientes httpx (sync e async) configurados."""
+    opcoes = _opcoes_httpx()
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(
+            timeout=int(GEMINI_TIMEOUT_SECONDS * 1000),
+            httpx_client=httpx.Client(**opcoes),
+            httpx_async_client=httpx.AsyncClient(**opcoes),
+        ),
+    )
+
+
+def get_client():
+    """O cliente compartilhado deste processo (criado sob demanda, refeito após um fork)."""
+    global _cliente, _pid
+    cliente = _cliente
+    if cliente is not None and _pid == os.getpid():
+        return cliente
+    with _lock:
+        if _cliente is None or _pid != os.getpid():
+            _cliente = create_client()
+            _pid = os.getpid()
+        return _cliente
+
+
+def _descartar_apos_fork():
+    # Só esquece o cliente do pai: fechar aqui encerraria as conexões TLS que ainda são dele
+    global _cliente, _pid, _lock
+    _cliente = None
+    _pid = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_descartar_apos_fork)
+
+
+class SharedClient:
+    """
+    Acesso ao cliente compartilhado com a mesma interface do genai.Client
+    (`client.models`, `client.chats`, `client.aio`, `client.caches`), sempre
+    resolvido no processo atual.
+    """
+
+    def __getattr__(self, nome):
+        return getattr(get_client(), nome)
+
@@ -0,0 +1,190 @@
+# codec_historico.py - Codificação binária compacta do histórico da conversa
+#
+# Para quando o histórico precisa ficar no cliente (cookie assinado). Em vez do
+# JSON do model_dump (dezenas de campos nulos por turno), cada turno vira
+# [papel: 1 byte][tamanho: varint][texto UTF-8], com um cabeçalho de 2 bytes
+# (versão e compressão). Decodificar só lê os pares (papel, texto); os objetos
+# types.Content são montados depois, no primeiro acesso aos turnos.
+
+import zlib
+
+from google.genai import types
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+VERSAO = 1
+
+SEM_COMPRESSAO = 0
+ZLIB = 1
+ZSTD = 2
+
+PAPEIS = ("user", "model")
+_CODIGO_PAPEL = {papel: i for i, papel in enumerate(PAPEIS)}
+
+# Abaixo disso a compressão costuma aumentar o tamanho
+MIN_BYTES_COMPRESSAO = 64
+
+
+class CodecError(ValueError):
+    """Dados de histórico inválidos ou de uma versão desconhecida."""
+
+
+def _varint(n):
+    saida = bytearray()
+    while n >= 0x80:
+        saida.append((n & 0x7F) | 0x80)
+        n >>= 7
+    saida.append(n)
+    return bytes(saida)
+
+
+def codificar_turnos(turnos):
+    """Corpo sem cabeçalho para pares (papel, texto); corpos podem ser concatenados."""
+    partes = []
+    for papel, texto in turnos:
+        dados = texto.encode("utf-8")
+        partes.append(bytes((_CODIGO_PAPEL[papel],)) + _varint(len(dados)) + dados)
+    return b"".join(partes)
+
+
+def decodificar_turnos(corpo):
+    """Lista de pares (papel, texto) de um corpo sem cabeçalho."""
+    turnos = []
+    i, fim = 0, len(corpo)
+    try:
+        while i < fim:
+            papel = PAPEIS[corpo[i]]
+            i += 1
+            tamanho = deslocamento = 0
+            while True:
+                byte = corpo[i]
+                i += 1
+                tamanho |= (byte & 0x7F) << deslocamento
+                if byte < 0x80:
+                    break
+                deslocamento += 7
+            if i + tamanho > fim:
+                raise CodecError("Turno truncado.")
+            turnos.append((papel, corpo[i:i + tamanho].decode("utf-8")))
+            i += tamanho
+    except (IndexError, UnicodeDecodeError) as e:
+        raise CodecError(f"Histórico corrompido: {e}") from e
+    return turnos
+
+
+def _comprimir(corpo, compressao):
+    if compressao == ZSTD and zstandard is not None:
+        return ZSTD, zstandard.ZstdCompressor(level=3).compress(corpo)
+    if compressao in (ZLIB, ZSTD):  # sem zstandard instalado, zlib
+        return ZLIB, zlib.compress(corpo, 6)
+    return SEM_COMPRESSAO, corpo
+
+
+def empacotar(corpo, compressao=ZLIB):
+    """Cabeçalho + corpo, comprimido se valer a pena."""
+    usada, dados = SEM_COMPRESSAO, corpo
+    if compressao != SEM_COMPRESSAO and len(corpo) >= MIN_BYTES_COMPRESSAO:
+        usada, dados = _comprimir(corpo, compressao)
+        if len(dados) >= len(corpo):
+            usada, dados = SEM_COMPRESSAO, corpo
+    return bytes((VERSAO, usada)) + dados
+
+
+def desempacotar(dados):
+    """Corpo (descomprimido) de um histórico empacotado."""
+    if len(dados) < 2:
+        raise CodecError("Histórico sem cabeçalho.")
+    versao, compressao = dados[0], dados[1]
+    if versao != VERSAO:
+        raise CodecError(f"Versão de histórico desconhecida: {versao}")
+    corpo = dados[2:]
+    try:
+        if compressao == ZLIB:
+            return zlib.decompress(corpo)
+        if compressao == ZSTD:
+            if zstandard is None:
+                raise CodecError("Histórico comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+            return zstandard.ZstdDecompressor().decompress(corpo)
+    except zlib.error as e:
+        raise CodecError(f"Histórico corrompido: {e}") from e
+    if compressao != SEM_COMPRESSAO:
+        raise CodecError(f"Compressão desconhecida: {compressao}")
+    return corpo
+
+
+def par_do_turno(content):
+    """(papel, texto) de um types.Content; só o texto das partes é mantido."""
+    return content.role or "user", "".join(part.text or "" for part in content.parts or [])
+
+
+def codificar(history, compressao=ZLIB):
+    """Bytes compactos de uma lista de types.Content."""
+    return empacotar(codificar_turnos(par_do_turno(c) for c in history), compressao)
+
+
+def decodificar(dados):
+    """Histórico preguiçoso (LazyHistory) a partir dos bytes de `codificar`."""
+    return LazyHistory(decodificar_turnos(desempacotar(dados)))
+
+
+def _content(papel, texto):
+    # model_validate de um dict mínimo é mais rápido que o construtor (e que model_construct)
+    return types.Content.model_validate({"role": papel, "parts": [{"text": texto}]})
+
+
+class LazyHistory(list):
+    """
+    Lista de types.Content que guarda só os pares (papel, texto) até o primeiro
+    acesso aos turnos. `len()` e `bool()` não materializam nada, então rotas
+    que respondem sem chamar a IA (cache, botões) nunca montam os objetos.
+    """
+
+    def __init__(self, turnos=()):
+        super().__init__()
+        self._pendentes = list(turnos)
+
+    @property
+    def materializado(self):
+        return self._pendentes is None
+
+    def pares(self):
+        """Os pares (papel, texto), sem materializar os turnos."""
+        if self._pendentes is not None:
+            return list(self._pendentes)
+        return [par_do_turno(c) for c in list.__iter__(self)]
+
+    def _materializar(self):
+        if self._pendentes is not None:
+            pendentes, self._pendentes = self._pendentes, None
+            list.extend(self, (_content(papel, texto) for papel, texto in pendentes))
+
+    def __len__(self):
+        return len(self._pendentes) if self._pendentes is not None else list.__len__(self)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __repr__(self):
+        self._materializar()
+        return list.__repr__(self)
+
+
+def _materializa_antes(nome):
+    metodo = getattr(list, nome)
+
+    def chamar(self, *args, **kwargs):
+        self._materializar()
+        return metodo(self, *args, **kwargs)
+
+    chamar.__name__ = nome
+    return chamar
+
+
+for _nome in ("__getitem__", "__setitem__", "__delitem__", "__iter__", "__reversed__", "__contains__",
+              "__eq__", "__ne__", "__add__", "__iadd__", "__mul__", "__imul__", "append", "extend",
+              "insert", "pop", "remove", "clear", "index", "count", "copy", "sort", "reverse"):
+    setattr(LazyHistory, _nome, _materializa_antes(_nome))
+del _nome
@@ -0,0 +1,175 @@
+# compactacao_historico.py - Compactação do histórico com resumo acumulado
+#
+# Os últimos N turnos vão literais para a IA; os anteriores são dobrados em um
+# resumo que ocupa o início do histórico. A compactação normal roda em segundo
+# plano, depois da resposta; se o histórico passar do orçamento de tokens, ela
+# é feita na hora com o resumidor extrativo local (barato, sem chamar a IA).
+
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import types
+
+from indice_conhecimento import estimar_tokens, tokenizar
+
+MARCADOR_RESUMO = "[Resumo da conversa até aqui]"
+CONFIRMACAO_RESUMO = "Entendido, vou continuar a conversa levando esse resumo em conta."
+
+# O que o usuário contou (nome, família, pedidos) pesa mais que as respostas da Hope
+PESO_USUARIO = 2.0
+
+_FIM_DE_FRASE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def texto_do_turno(content):
+    return "".join(part.text or "" for part in content.parts or [])
+
+
+def tokens_do_historico(history):
+    """Estimativa de tokens de entrada do histórico."""
+    pares = getattr(history, "pares", None)  # LazyHistory: conta sem montar os turnos
+    if pares is not None:
+        return sum(estimar_tokens(texto) for _, texto in pares())
+    return sum(estimar_tokens(texto_do_turno(c)) for c in history)
+
+
+def eh_resumo(history):
+    """True se o histórico começa com o par de turnos do resumo."""
+    return bool(history) and history[0].role == "user" and texto_do_turno(history[0]).startswith(MARCADOR_RESUMO)
+
+
+def turnos_de_resumo(resumo):
+    """Par de turnos (usuário/modelo) que carrega o resumo no início do histórico."""
+    return [
+        types.Content(role="user", parts=[types.Part(text=f"{MARCADOR_RESUMO}\n{resumo}")]),
+        types.Content(role="model", parts=[types.Part(text=CONFIRMACAO_RESUMO)]),
+    ]
+
+
+def resumo_extrativo(resumo_anterior, turnos, max_tokens=300):
+    """
+    Resumo local: escolhe as frases com os termos mais frequentes da conversa
+    (normalizadas pelo tamanho) até o limite de tokens, na ordem original.
+    As frases do resumo anterior concorrem com as dos turnos novos; frases
+    repetidas entram uma vez só e as do usuário têm peso maior.
+    """
+    frases, vistas = [], set()
+    candidatas = _FIM_DE_FRASE.split(resumo_anterior or "")
+    for content in turnos:
+        prefixo = "Usuário: " if content.role == "user" else "Hope: "
+        candidatas.extend(prefixo + f.strip() for f in _FIM_DE_FRASE.split(texto_do_turno(content)) if f.strip())
+    for frase in candidatas:
+        chave = frase.split(": ", 1)[-1].strip()
+        if chave and chave not in vistas:
+            vistas.add(chave)
+            frases.append(frase.strip())
+    if not frases:
+        return ""
+
+    termos_por_frase = [tokenizar(f) for f in frases]
+    frequencia = Counter(t for termos in termos_por_frase for t in set(termos))
+
+    def nota(i):
+        termos = set(termos_por_frase[i])
+        if not termos:
+            return 0.0
+        peso = PESO_USUARIO if frases[i].startswith("Usuário: ") else 1.0
+        return peso * sum(frequencia[t] for t in termos) / (len(termos) ** 0.5)
+
+    escolhidas, usados = [], 0
+    for i in sorted(range(len(frases)), key=nota, reverse=True):
+        custo = estimar_tokens(frases[i])
+        if usados + custo > max_tokens:
+            continue
+        escolhidas.append(i)
+        usados += custo
+    return "\n".join(frases[i] for i in sorted(escolhidas))
+
+
+class HistoryCompactor:
+    """
+    Mantém os últimos `manter_turnos` pares de mensagens literais e resume o resto.
+
+    `resumir(resumo_anterior, turnos)` gera o novo resumo em segundo plano
+    (ex.: com a IA); sem ele, usa o resumidor extrativo local.
+    """
+
+    def __init__(self, store, manter_turnos=4, orcamento_tokens=2000, max_tokens_resumo=300,
+                 resumir=None, max_workers=2):
+        self.store = store
+        self.manter_turnos = manter_turnos
+        self.orcamento_tokens = orcamento_tokens
+        self.max_tokens_resumo = max_tokens_resumo
+        self.resumir = resumir
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compactacao')
+        self._pendentes = set()
+        self._lock = threading.Lock()
+        self.compactacoes_orcamento = 0
+        self.compactacoes_segundo_plano = 0
+
+    def _dividir(self, history):
+        """(resumo anterior, turnos a resumir, turnos mantidos literais)."""
+        inicio = 2 if eh_resumo(history) else 0
+        resumo_anterior = texto_do_turno(history[0])[len(MARCADOR_RESUMO):].strip() if inicio else ""
+        corte = max(inicio, len(history) - 2 * self.manter_turnos)
+        return resumo_anterior, history[inicio:corte], history[corte:]
+
+    def _resumo_local(self, resumo_anterior, turnos):
+        return resumo_extrativo(resumo_anterior, turnos, self.max_tokens_resumo)
+
+    def compactar(self, history, resumir=None):
+        """Histórico compactado (nova lista); o original não é alterado."""
+        resumo_anterior, antigos, recentes = self._dividir(history)
+        if not antigos:
+            return list(history)
+        resumo = (resumir or self._resumo_local)(resumo_anterior, antigos)
+        return turnos_de_resumo(resumo) + list(recentes)
+
+    def precisa_compactar(self, history):
+        """Há pelo menos `manter_turnos` pares além dos mantidos literais."""
+        _, antigos, _ = self._dividir(history)
+        return len(antigos) >= 2 * self.manter_turnos
+
+    def garantir_orcamento(self, session_id, history):
+        """
+        Compacta na hora (resumo local) se o histórico passou do orçamento de
+        tokens. Altera `history` e o armazenamento; retorna True se compactou.
+        """
+        if not self.orcamento_tokens or tokens_do_historico(history) <= self.orcamento_tokens:
+            return False
+        compactado = self.compactar(history)
+        if len(compactado) >= len(history):
+            return False  # só restam os turnos recentes; nada a dobrar
+        # Troca atômica: se outra requisição acrescentou turnos depois da leitura,
+        # eles são mantidos; se o histórico foi reescrito, segue sem compactar
+        if not self.store.replace_prefix(session_id, list(history), compactado):
+            return False
+        history[:] = compactado
+        self.compactacoes_orcamento += 1
+        return True
+
+    def agendar(self, session_id, history):
+        """Agenda a compactação em segundo plano se o histórico já acumulou turnos antigos."""
+        if not self.precisa_compactar(history):
+            return
+        with self._lock:
+            if session_id in self._pendentes:
+                return
+            self._pendentes.add(session_id)
+        self._pool.submit(self._compactar_em_segundo_plano, session_id, list(history))
+
+    def _compactar_em_segundo_plano(self, session_id, foto):
+        try:
+            compactado = self.compactar(foto, self.resumir)
+            # Só troca se ninguém reescreveu o histórico enquanto o resumo era gerado
+            # (conferência e troca atômicas no store); turnos acrescentados nesse meio
+            # tempo são preservados. Se mudou, o resumo é descartado.
+            if self.store.replace_prefix(session_id, foto, compactado):
+                self.compactacoes_segundo_plano += 1
+        except Exception as e:
+            print(f"Erro ao compactar o histórico da sessão: {e}")
+        finally:
+            with self._lock:
+                self._pendentes.discard(session_id)
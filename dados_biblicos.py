@@ -2,6 +2,8 @@
 
 import random
 
+from indice_versiculos import VerseStore
+
 def carregar_versiculos(nome_arquivo="versiculos.txt"):
     """
     Função para carregar os versículos de um arquivo de texto.
@@ -22,6 +24,18 @@ def carregar_versiculos(nome_arquivo="versiculos.txt"):
         print(f"ERRO: Arquivo de versículos '{nome_arquivo}' não encontrado.")
         return []
 
+def carregar_indice_versiculos(nome_arquivo="versiculos.txt"):
+    """
+    Carrega os versículos indexados por referência, capítulo e palavra.
+
+    Usa o índice pré-compilado (nome_arquivo + ".idx") quando ele está em dia
+    e o refaz a partir do arquivo de texto quando não está.
+
+    Returns:
+        VerseStore: Os versículos indexados (vazio se o arquivo não existir).
+    """
+    return VerseStore.load(nome_arquivo)
+
 def versiculo_aleatorio(lista_versiculos):
     """
     Seleciona e retorna um versículo aleatório da lista.
@@ -45,4 +59,18 @@ RESPOSTAS_COMUNS = {
     "doacao": "Você pode fazer uma doação via PIX (chave: igreja@fe.org) ou diretamente na secretaria da igreja.",
     "batismo": "Para agendar o seu batismo, por favor, envie um email para batismo@fe.org ou procure um dos pastores após o culto.",
     "pastor": "O nosso pastor principal é o Pastor João da Graça. Ele está disponível para aconselhamento às terças e quintas-feiras."
-}
\ No newline at end of file
+}
+
+# Sinônimos de cada resposta comum e a prioridade quando a pergunta cita mais de
+# um assunto ("horário do batismo" -> batismo). A grafia com ou sem acento tanto
+# faz: as palavras e a pergunta são normalizadas antes da busca.
+PALAVRAS_CHAVE = {
+    "batismo": (5, ["batismo", "batizar", "batizado", "batismal"]),
+    "doacao": (4, ["doacao", "doar", "pix", "dizimo", "oferta", "ofertar", "contribuir", "contribuicao"]),
+    "pastor": (3, ["pastor", "pastora", "pastores", "aconselhamento", "lideranca"]),
+    "endereco": (2, ["endereco", "onde fica", "localizacao", "como chegar", "mapa"]),
+    "horario": (1, ["horario", "que horas", "hora do culto", "dias de culto", "programacao", "cultos"]),
+}
+
+# Pedidos de versículo: prioridade abaixo das respostas comuns, como na busca original
+PALAVRAS_VERSICULO = ["versiculo", "biblia", "palavra de deus", "salmo"]
@@ -0,0 +1,167 @@
+# faq_local.py - Respostas prontas para as perguntas mais frequentes (sem IA)
+#
+# As respostas são geradas a partir do arquivo de conhecimento (horários dos
+# cultos, Pix e nomes dos pastores) e a mensagem é casada localmente,
+# como no roteador de intenções. Um acerto responde na hora e sem tokens; na
+# dúvida (mensagem longa, tópico fraco ou mais de um tópico) a IA responde.
+# Endereço e localização não entram aqui: o roteador de intenções já responde
+# essas perguntas com o botão do mapa.
+
+import re
+import threading
+from collections import Counter
+
+from intencao_local import normalizar_texto, compilar_padroes
+
+# Padrões por tópico (normalizados). Padrões com peso abaixo do limiar só
+# decidem junto de uma palavra de pergunta ("quem", "qual", "nome"...).
+PADROES_FAQ = {
+    "horarios": [
+        ("horario", 1.0), ("horarios", 1.0), ("que horas", 1.0), ("hora do culto", 1.0),
+        ("dias de culto", 1.0), ("dia de culto", 1.0), ("quando e o culto", 1.0), ("quando tem culto", 1.0),
+        ("quais os cultos", 1.0), ("programacao", 0.7),
+    ],
+    "pix": [
+        ("pix", 1.0), ("chave pix", 1.0), ("dizimo", 1.0), ("dizimos", 1.0), ("dizimar", 1.0),
+        ("ofertar", 1.0), ("oferta", 0.9), ("ofertas", 0.9), ("doacao", 0.7), ("doar", 0.6), ("contribuir", 0.6),
+    ],
+    "pastores": [
+        ("quem e o pastor", 1.0), ("quem e a pastora", 1.0), ("quem sao os pastores", 1.0),
+        ("nome do pastor", 1.0), ("nome da pastora", 1.0), ("pastores", 0.8), ("pastor", 0.6),
+        ("pastora", 0.6), ("lideranca", 0.6),
+    ],
+}
+
+# Tópicos que só valem quando a mensagem fala do assunto: "que horas é a escola
+# dominical?" e "horário da secretaria" não são perguntas sobre os cultos
+ASSUNTO_OBRIGATORIO = {
+    "horarios": ("culto", "cultos", "reuniao", "reunioes", "celebracao", "celebracoes"),
+}
+
+PALAVRAS_PERGUNTA = ("quem", "qual", "quais", "quando", "onde", "como", "nome", "informa", "saber", "me passa")
+
+# Respostas prontas são para perguntas diretas; mensagens longas vão para a IA
+PALAVRAS_MENSAGEM_CURTA = 12
+LIMIAR = 1.0
+BONUS_PERGUNTA = 0.4
+
+MODELOS = {
+    "horarios": "Nossos cultos acontecem:\n{itens}\n\nSerá uma alegria receber você! 🙏",
+    "pix": "{valor}\n\nObrigada pela sua generosidade! \"Deus ama quem dá com alegria\" (2 Coríntios 9:7).",
+    "pastores": "Nossa liderança pastoral:\n{itens}\n\nSe quiser conversar com eles, fale com a nossa equipe pelo WhatsApp.",
+}
+
+_REGEX_TOPICO = {topico: compilar_padroes(padroes) for topico, padroes in PADROES_FAQ.items()}
+_REGEX_ASSUNTO = {topico: re.compile("|".join(rf"\b{re.escape(p)}\b" for p in termos))
+                  for topico, termos in ASSUNTO_OBRIGATORIO.items()}
+_REGEX_PERGUNTA = re.compile("|".join(rf"\b{re.escape(p)}\b" for p in PALAVRAS_PERGUNTA))
+
+
+def _rotulo_e_valor(linha):
+    rotulo, _, valor = linha.partition(":")
+    return rotulo.strip(" -*"), valor.strip()
+
+
+def _itens_apos(linhas, i):
+    """Itens de lista ("- ...") logo abaixo da linha `i`."""
+    itens = []
+    for linha in linhas[i + 1:]:
+        if not linha.strip():
+            if itens:
+                break
+            continue
+        if not linha.lstrip().startswith("-"):
+            break
+        itens.append(linha.strip().lstrip("- ").strip())
+    return itens
+
+
+def gerar_faq(conteudo):
+    """
+    Respostas prontas por tópico extraídas do texto do conhecimento. Tópicos
+    que não aparecem no arquivo ficam de fora (e continuam indo para a IA).
+    """
+    linhas = (conteudo or "").splitlines()
+    faq, pastores = {}, []
+    for i, linha in enumerate(linhas):
+        normalizada = normalizar_texto(linha)
+        if ":" not in linha:
+            continue
+        rotulo, valor = _rotulo_e_valor(linha)
+        rotulo_normalizado = normalizar_texto(rotulo)
+        if "horarios" not in faq and "horario" in rotulo_normalizado:
+            itens = _itens_apos(linhas, i)
+            if itens:
+                faq["horarios"] = MODELOS["horarios"].format(itens="\n".join(f"- {item}" for item in itens))
+        elif "pix" not in faq and "pix" in normalizada:
+            faq["pix"] = MODELOS["pix"].format(valor=linha.strip(" -*"))
+        elif rotulo_normalizado.startswith(("nome do pastor", "nome da pastor")) and valor:
+            nome = " ".join(valor.replace("[", " ").replace("]", " ").split())
+            cargo = re.sub(r"^nome d[oa]\s+", "", rotulo, flags=re.IGNORECASE).strip()
+            # "Pastor"/"Pastora" já aparece no nome; outros cargos vão entre parênteses
+            pastores.append(f"- {nome}" if normalizar_texto(cargo) in ("pastor", "pastora") else f"- {nome} ({cargo})")
+    if pastores:
+        faq["pastores"] = MODELOS["pastores"].format(itens="\n".join(pastores))
+    return faq
+
+
+def classificar_faq(user_message):
+    """Tópico do FAQ para a mensagem, ou None se nenhum for claro o bastante."""
+    texto = normalizar_texto(user_message)
+    if not texto or len(texto.split()) > PALAVRAS_MENSAGEM_CURTA:
+        return None
+    bonus = BONUS_PERGUNTA if _REGEX_PERGUNTA.search(texto) else 0.0
+    pontuacao = {}
+    for topico, (regex, pesos) in _REGEX_TOPICO.items():
+        if topico in _REGEX_ASSUNTO and not _REGEX_ASSUNTO[topico].search(texto):
+            continue
+        melhor = max((pesos[m.lastgroup] for m in regex.finditer(texto)), default=0.0)
+        if melhor:
+            pontuacao[topico] = melhor + bonus
+    fortes = [topico for topico, nota in pontuacao.items() if nota >= LIMIAR]
+    # Mais de um tópico ("horário e endereço?") fica para a IA responder junto
+    return fortes[0] if len(fortes) == 1 else None
+
+
+class FaqEngine:
+    """Respostas prontas da versão atual do conhecimento, com contagem de acertos."""
+
+    def __init__(self):
+        self.respostas = {}
+        self.versao = None
+        self.acertos = 0
+        self.erros = 0
+        self.por_topico = Counter()
+        self._lock = threading.Lock()
+
+    def gerar(self, conteudo, versao=None):
+        """Regera as respostas a partir do conhecimento; retorna o dicionário por tópico."""
+        respostas = gerar_faq(conteudo)
+        with self._lock:
+            self.respostas = respostas
+            self.versao = versao
+        return respostas
+
+    def responder(self, user_message):
+        """(tópico, resposta pronta) para a mensagem, ou (None, None) para seguir para a IA."""
+        topico = classificar_faq(user_message)
+        resposta = self.respostas.get(topico) if topico else None
+        with self._lock:
+            if resposta is None:
+                self.erros += 1
+                return None, None
+            self.acertos += 1
+            self.por_topico[topico] += 1
+        return topico, resposta
+
+    def stats(self):
+        with self._lock:
+            total = self.acertos + self.erros
+            return {
+                "topics": sorted(self.respostas),
+                "version": self.versao,
+                "hits": self.acertos,
+                "misses": self.erros,
+                "hit_rate": round(self.acertos / total, 3) if total else 0.0,
+                "hits_by_topic": dict(self.por_topico),
+            }
@@ -0,0 +1,302 @@
+# gemini_falso.py - Servidor local que imita a API Gemini para testes de carga offline
+#
+# Uso: python gemini_falso.py [--porta 8089] [--latencia lognormal:800:0.4]
+#                             [--tokens-por-segundo 80] [--taxa-erro 0.02] [--codigo-erro 503]
+#
+# Aponte o app para ele com GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8089 (o cliente
+# google-genai lê essa variável) e qualquer GEMINI_API_KEY. Implementa
+# `models/{modelo}:generateContent`, `models/{modelo}:streamGenerateContent?alt=sse`
+# e o cache de contexto (`cachedContents`: criar, listar, renovar e apagar).
+
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPOSTA_PADRAO = (
+    "Que alegria falar com você! **Deus está no controle** de todas as coisas. "
+    "Nossos cultos acontecem no domingo às 19h30, na terça e na quinta às 20h00. "
+    "Se precisar de algo mais, estou aqui para ajudar. \"Tudo posso naquele que me fortalece\" (Filipenses 4:13)."
+)
+
+
+class DistribuicaoLatencia:
+    """
+    Latência em milissegundos descrita como 'tipo:parametros':
+    fixa:800 | uniforme:300:1200 | normal:800:150 | lognormal:800:0.4 (mediana e sigma).
+    """
+
+    def __init__(self, especificacao):
+        partes = especificacao.split(":")
+        self.tipo = partes[0]
+        self.parametros = [float(p) for p in partes[1:]]
+        if self.tipo not in ("fixa", "uniforme", "normal", "lognormal"):
+            raise ValueError(f"Distribuição de latência desconhecida: {self.tipo}")
+
+    def amostrar(self):
+        """Uma amostra em segundos."""
+        p = self.parametros
+        if self.tipo == "fixa":
+            ms = p[0]
+        elif self.tipo == "uniforme":
+            ms = random.uniform(p[0], p[1])
+        elif self.tipo == "normal":
+            ms = random.gauss(p[0], p[1])
+        else:
+            ms = random.lognormvariate(0, p[1]) * p[0]
+        return max(ms, 0.0) / 1000
+
+
+class Estatisticas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chamadas = 0
+        self.erros = 0
+
+    def registrar(self, erro):
+        with self.lock:
+            self.chamadas += 1
+            self.erros += int(erro)
+
+
+def instrucao_do(corpo):
+    return " ".join(p.get("text", "") for p in (corpo.get("systemInstruction") or {}).get("parts", []))
+
+
+def contar_tokens(corpo, instrucao):
+    total = len(instrucao)
+    for content in corpo.get("contents", []):
+        total += sum(len(p.get("text", "")) for p in content.get("parts", []))
+    return total // 4 + 1
+
+
+def resposta_json(texto, tokens_entrada, tokens_em_cache=0, finalizada=True):
+    tokens_saida = len(texto) // 4 + 1
+    candidato = {"content": {"role": "model", "parts": [{"text": texto}]}, "index": 0}
+    if finalizada:
+        candidato["finishReason"] = "STOP"
+    uso = {
+        "promptTokenCount": tokens_entrada,
+        "candidatesTokenCount": tokens_saida,
+        "totalTokenCount": tokens_entrada + tokens_saida,
+    }
+    if tokens_em_cache:
+        uso["cachedContentTokenCount"] = tokens_em_cache
+    return {"candidates": [candidato], "usageMetadata": uso, "modelVersion": "gemini-falso"}
+
+
+def data_rfc3339(momento):
+    return datetime.fromtimestamp(momento, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def segundos_do_ttl(ttl):
+    return float(str(ttl or "3600s").rstrip("s"))
+
+
+class CachesDeContexto:
+    """Caches de contexto criados pelos clientes, com expiração pelo TTL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.caches = {}  # nome -> (recurso JSON, instrução, expira)
+
+    def criar(self, corpo):
+        nome = f"cachedContents/{uuid.uuid4().hex[:16]}"
+        instrucao = instrucao_do(corpo)
+        expira = time.time() + segundos_do_ttl(corpo.get("ttl"))
+        recurso = {
+            "name": nome,
+            "displayName": corpo.get("displayName", ""),
+            "model": corpo.get("model", ""),
+            "createTime": data_rfc3339(time.time()),
+            "usageMetadata": {"totalTokenCount": len(instrucao) // 4 + 1},
+        }
+        with self.lock:
+            self.caches[nome] = (recurso, instrucao, expira)
+        return self._com_expiracao(recurso, expira)
+
+    def _com_expiracao(self, recurso, expira):
+        return dict(recurso, expireTime=data_rfc3339(expira))
+
+    def _validos(self):
+        agora = time.time()
+        for nome in [n for n, (_, _, expira) in self.caches.items() if expira <= agora]:
+            del self.caches[nome]
+        return self.caches
+
+    def listar(self):
+        with self.lock:
+            return [self._com_expiracao(r, e) for r, _, e in self._validos().values()]
+
+    def instrucao(self, nome):
+        with self.lock:
+            item = self._validos().get(nome)
+            return item[1] if item else None
+
+    def renovar(self, nome, corpo):
+        with self.lock:
+            item = self._validos().get(nome)
+            if item is None:
+                return None
+            expira = time.time() + segundos_do_ttl(corpo.get("ttl"))
+            self.caches[nome] = (item[0], item[1], expira)
+            return self._com_expiracao(item[0], expira)
+
+    def apagar(self, nome):
+        with self.lock:
+            return self.caches.pop(nome, None) is not None
+
+
+def criar_handler(config, estatisticas, caches):
+    class GeminiFalso(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, formato, *args):
+            pass  # silencioso: o gerador de carga faz o relatório
+
+        def _enviar_json(self, status, dados):
+            corpo = json.dumps(dados).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def _ler_corpo(self):
+            return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        def _nao_encontrado(self, mensagem):
+            self._enviar_json(404, {"error": {"code": 404, "message": mensagem, "status": "NOT_FOUND"}})
+
+        def _nome_do_cache(self, caminho):
+            return "cachedContents/" + caminho.rsplit("/", 1)[-1] if "/cachedContents/" in caminho else None
+
+        def do_GET(self):
+            caminho = self.path.split("?")[0]
+            nome = self._nome_do_cache(caminho)
+            if caminho.endswith("/cachedContents"):
+                self._enviar_json(200, {"cachedContents": caches.listar()})
+            elif nome and caches.instrucao(nome) is not None:
+                self._enviar_json(200, next(c for c in caches.listar() if c["name"] == nome))
+            else:
+                self._nao_encontrado(f"Rota ou cache não encontrado: {caminho}")
+
+        def do_PATCH(self):
+            corpo = self._ler_corpo()
+            nome = self._nome_do_cache(self.path.split("?")[0])
+            recurso = caches.renovar(nome, corpo) if nome else None
+            if recurso is None:
+                self._nao_encontrado(f"Cache não encontrado: {nome}")
+            else:
+                self._enviar_json(200, recurso)
+
+        def do_DELETE(self):
+            nome = self._nome_do_cache(self.path.split("?")[0])
+            if nome and caches.apagar(nome):
+                self._enviar_json(200, {})
+            else:
+                self._nao_encontrado(f"Cache não encontrado: {nome}")
+
+        def do_POST(self):
+            corpo = self._ler_corpo()
+            caminho = self.path.split("?")[0]
+            if caminho.endswith("/cachedContents"):
+                self._enviar_json(200, caches.criar(corpo))
+                return
+            streaming = caminho.endswith(":streamGenerateContent")
+            if not (streaming or caminho.endswith(":generateContent")):
+                self._nao_encontrado(f"Rota não suportada: {caminho}")
+                return
+
+            tokens_em_cache = 0
+            if corpo.get("cachedContent"):
+                instrucao = caches.instrucao(corpo["cachedContent"])
+                if instrucao is None:
+                    self._nao_encontrado(f"Cache de contexto não encontrado: {corpo['cachedContent']}")
+                    return
+                tokens_em_cache = len(instrucao) // 4 + 1
+            else:
+                instrucao = instrucao_do(corpo)
+
+            erro = random.random() < config.taxa_erro
+            estatisticas.registrar(erro)
+            time.sleep(config.latencia.amostrar())
+            if erro:
+                self._enviar_json(config.codigo_erro, {
+                    "error": {"code": config.codigo_erro, "message": "Erro injetado pelo Gemini falso.", "status": "UNAVAILABLE"}
+                })
+                return
+
+            texto = "chat" if instrucao.startswith("Você é um classificador") else config.resposta
+            tokens_entrada = contar_tokens(corpo, instrucao)
+            if streaming:
+                self._enviar_stream(texto, tokens_entrada, tokens_em_cache)
+            else:
+                self._enviar_json(200, resposta_json(texto, tokens_entrada, tokens_em_cache))
+
+        def _enviar_stream(self, texto, tokens_entrada, tokens_em_cache):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            palavras = texto.split(" ")
+            pausa = (1 / config.tokens_por_segundo) if config.tokens_por_segundo else 0
+            for i in range(0, len(palavras), config.palavras_por_trecho):
+                trecho = " ".join(palavras[i:i + config.palavras_por_trecho])
+                if i + config.palavras_por_trecho < len(palavras):
+                    trecho += " "
+                final = i + config.palavras_por_trecho >= len(palavras)
+                dados = json.dumps(resposta_json(trecho, tokens_entrada, tokens_em_cache, finalizada=final))
+                self.wfile.write(f"data: {dados}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+                if not final:
+                    time.sleep(pausa * config.palavras_por_trecho)
+            self.close_connection = True
+
+    return GeminiFalso
+
+
+def criar_servidor(porta=8089, latencia="lognormal:800:0.4", tokens_por_segundo=80.0,
+                   taxa_erro=0.0, codigo_erro=503, palavras_por_trecho=4, resposta=RESPOSTA_PADRAO):
+    """Cria o servidor (ainda não iniciado); use `serve_forever()` ou rode em uma thread."""
+    config = argparse.Namespace(
+        latencia=DistribuicaoLatencia(latencia), tokens_por_segundo=tokens_por_segundo,
+        taxa_erro=taxa_erro, codigo_erro=codigo_erro, palavras_por_trecho=palavras_por_trecho, resposta=resposta,
+    )
+    estatisticas = Estatisticas()
+    ThreadingHTTPServer.request_queue_size = 1024
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), criar_handler(config, estatisticas, CachesDeContexto()))
+    servidor.daemon_threads = True
+    servidor.estatisticas = estatisticas
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API Gemini.")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--latencia", default="lognormal:800:0.4",
+                        help="fixa:MS | uniforme:MIN:MAX | normal:MEDIA:DESVIO | lognormal:MEDIANA:SIGMA")
+    parser.add_argument("--tokens-por-segundo", type=float, default=80.0, help="velocidade do streaming (0 = sem pausa)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de chamadas que falham (0 a 1)")
+    parser.add_argument("--codigo-erro", type=int, default=503, help="status HTTP das falhas injetadas")
+    args = parser.parse_args()
+
+    servidor = criar_servidor(args.porta, args.latencia, args.tokens_por_segundo, args.taxa_erro, args.codigo_erro)
+    print(f"Gemini falso em http://127.0.0.1:{args.porta} (latência {args.latencia}, erros {args.taxa_erro:.0%})")
+    sys.stdout.flush()
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        e = servidor.estatisticas
+        print(f"Chamadas atendidas: {e.chamadas} | erros injetados: {e.erros}")
+
+
+if __name__ == "__main__":
+    main()
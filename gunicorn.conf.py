@@ -0,0 +1,24 @@
+# gunicorn.conf.py - Lido automaticamente pelo gunicorn (Procfile)
+#
+# Liga o log de acessos do gunicorn sem handler próprio: os registros de
+# "gunicorn.access" só entram na fila de log_conversas.py, cuja thread grava em
+# ACCESS_LOG_FILE, separado das conversas e fora da thread da requisição.
+# O log raiz fica como sem o gunicorn (avisos e erros no stderr).
+# O pipeline e as vagas de arquivo são de cada worker: o master (que importa o
+# app quando há --preload) não pega nenhuma.
+
+from log_conversas import adiar_para_os_filhos, configurar_log_conversas
+
+adiar_para_os_filhos()
+
+logconfig_dict = {
+    "root": {"level": "WARNING", "handlers": ["error_console"]},
+    "loggers": {
+        "gunicorn.access": {"level": "INFO", "handlers": [], "propagate": False},
+    },
+}
+
+
+def post_fork(server, worker):
+    # Já no processo do worker, antes de ele carregar o app
+    configurar_log_conversas()
@@ -0,0 +1,336 @@
+# historico_store.py - Armazenamento do histórico de conversa no servidor
+#
+# O cookie de sessão guarda apenas um identificador; os turnos ficam aqui.
+# Novos backends (ex.: Redis) só precisam implementar HistoryStore. A exceção
+# é o backend 'cookie', para quando nada pode ficar no servidor: os turnos vão
+# num cookie assinado, no formato compacto de codec_historico.
+
+import os
+import json
+import base64
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from google.genai import types
+from itsdangerous import BadSignature, TimestampSigner
+
+from codec_historico import (
+    LazyHistory, ZLIB, ZSTD, SEM_COMPRESSAO, CodecError,
+    codificar_turnos, decodificar_turnos, desempacotar, empacotar, par_do_turno,
+)
+from compactacao_historico import MARCADOR_RESUMO
+
+COMPRESSOES = {'zlib': ZLIB, 'zstd': ZSTD, 'off': SEM_COMPRESSAO}
+
+
+class HistoryStore:
+    """Interface dos backends de histórico, indexados pelo id da sessão."""
+
+    # False quando o histórico só existe durante a requisição (ex.: no cookie),
+    # o que impede a compactação em segundo plano
+    fora_da_requisicao = True
+
+    def load(self, session_id):
+        """Retorna a lista de `types.Content` da sessão (vazia se não existir ou expirou)."""
+        raise NotImplementedError
+
+    def append(self, session_id, contents):
+        """Acrescenta apenas os turnos novos ao final do histórico da sessão."""
+        raise NotImplementedError
+
+    def clear(self, session_id):
+        """Remove todo o histórico da sessão."""
+        raise NotImplementedError
+
+    def replace(self, session_id, contents):
+        """Substitui o histórico inteiro da sessão."""
+        self.clear(session_id)
+        if contents:
+            self.append(session_id, contents)
+
+    def replace_prefix(self, session_id, anterior, contents):
+        """
+        Troca o início do histórico por `contents` só se ele ainda começar com
+        `anterior` (os turnos acrescentados depois são mantidos); retorna se
+        trocou. Os backends compartilhados fazem a conferência e a troca de uma vez.
+        """
+        atual = self.load(session_id)
+        if atual[:len(anterior)] != list(anterior):
+            return False
+        self.replace(session_id, list(contents) + atual[len(anterior):])
+        return True
+
+
+class MemoryHistoryStore(HistoryStore):
+    """Histórico em memória com descarte LRU e expiração por inatividade (TTL)."""
+
+    def __init__(self, max_sessions=1000, ttl_seconds=3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessoes = OrderedDict()  # session_id -> (último acesso, lista de Content)
+        self._lock = threading.Lock()
+
+    def _expirada(self, ultimo_acesso, agora):
+        return self.ttl_seconds and agora - ultimo_acesso > self.ttl_seconds
+
+    def load(self, session_id):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._sessoes.get(session_id)
+            if item is None:
+                return []
+            if self._expirada(item[0], agora):
+                del self._sessoes[session_id]
+                return []
+            self._sessoes.move_to_end(session_id)
+            return list(item[1])
+
+    def append(self, session_id, contents):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._sessoes.pop(session_id, None)
+            turnos = item[1] if item and not self._expirada(item[0], agora) else []
+            turnos.extend(contents)
+            self._sessoes[session_id] = (agora, turnos)
+            while len(self._sessoes) > self.max_sessions:
+                self._sessoes.popitem(last=False)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessoes.pop(session_id, None)
+
+    def replace_prefix(self, session_id, anterior, contents):
+        with self._lock:
+            item = self._sessoes.get(session_id)
+            if item is None or self._expirada(item[0], time.monotonic()):
+                return False
+            turnos = item[1]
+            if turnos[:len(anterior)] != list(anterior):
+                return False
+            turnos[:len(anterior)] = contents
+            return True
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    Histórico em SQLite, compartilhado entre os workers do gunicorn.
+
+    Cada turno é uma linha, então salvar custa apenas os turnos novos,
+    independentemente do tamanho da conversa.
+    """
+
+    # Faz a limpeza das sessões expiradas a cada N gravações
+    SWEEP_EVERY = 500
+
+    def __init__(self, path="historico_conversas.db", ttl_seconds=3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._gravacoes = 0
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turnos ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL,"
+                " dados TEXT NOT NULL,"
+                " criado REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_turnos_sessao ON turnos (session_id, id)")
+
+    def _conexao(self):
+        # Uma conexão por thread (e por processo, pois é criada sob demanda após o fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, session_id):
+        linhas = self._conexao().execute(
+            "SELECT dados, criado FROM turnos WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        if not linhas:
+            return []
+        if self.ttl_seconds and time.time() - linhas[-1][1] > self.ttl_seconds:
+            self.clear(session_id)
+            return []
+        return [types.Content.model_validate(json.loads(dados)) for dados, _ in linhas]
+
+    def append(self, session_id, contents):
+        agora = time.time()
+        with self._conexao() as conn:
+            conn.executemany(
+                "INSERT INTO turnos (session_id, dados, criado) VALUES (?, ?, ?)",
+                [(session_id, c.model_dump_json(exclude_none=True), agora) for c in contents],
+            )
+        self._gravacoes += 1
+        if self.ttl_seconds and self._gravacoes % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+    def clear(self, session_id):
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM turnos WHERE session_id = ?", (session_id,))
+
+    def replace(self, session_id, contents):
+        # DELETE e INSERTs na mesma transação: quem lê nunca vê o histórico vazio
+        agora = time.time()
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM turnos WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO turnos (session_id, dados, criado) VALUES (?, ?, ?)",
+                [(session_id, c.model_dump_json(exclude_none=True), agora) for c in contents],
+            )
+
+    def replace_prefix(self, session_id, anterior, contents):
+        conn = self._conexao()
+        # BEGIN IMMEDIATE: nenhum outro worker grava entre a conferência e a troca
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            linhas = conn.execute(
+                "SELECT dados, criado FROM turnos WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+            n = len(anterior)
+            prefixo = [types.Content.model_validate(json.loads(dados)) for dados, _ in linhas[:n]]
+            if len(linhas) < n or prefixo != list(anterior):
+                conn.rollback()
+                return False
+            # Os turnos compactados herdam o horário do último turno que substituem
+            criado = linhas[n - 1][1] if n else time.time()
+            conn.execute("DELETE FROM turnos WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO turnos (session_id, dados, criado) VALUES (?, ?, ?)",
+                [(session_id, c.model_dump_json(exclude_none=True), criado) for c in contents]
+                + [(session_id, dados, criado_turno) for dados, criado_turno in linhas[n:]],
+            )
+            conn.commit()
+            return True
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def sweep(self):
+        """Apaga as sessões inativas há mais tempo que o TTL."""
+        limite = time.time() - self.ttl_seconds
+        with self._conexao() as conn:
+            conn.execute(
+                "DELETE FROM turnos WHERE session_id IN ("
+                " SELECT session_id FROM turnos GROUP BY session_id HAVING MAX(criado) < ?)",
+                (limite,),
+            )
+
+
+class CookieHistoryStore(HistoryStore):
+    """
+    Histórico num cookie próprio, assinado e com expiração, no formato de
+    codec_historico (fora do cookie de sessão do Flask, que codificaria os
+    bytes em base64 uma segunda vez).
+
+    `ler()` devolve o valor recebido do cookie nesta requisição e `gravar(valor)`
+    define o valor de resposta (None apaga). O id da sessão é ignorado. Se o
+    cookie passar de `max_bytes`, os turnos mais antigos saem (o resumo fica).
+    """
+
+    fora_da_requisicao = False
+
+    def __init__(self, ler, gravar, segredo, max_bytes=3800, compressao=ZLIB, ttl_seconds=3600):
+        self.ler = ler
+        self.gravar = gravar
+        self.max_bytes = max_bytes
+        self.compressao = compressao
+        self.ttl_seconds = ttl_seconds
+        self._signer = TimestampSigner(segredo, salt="hope-historico")
+        self.descartados = 0
+
+    def _dados(self):
+        valor = self.ler()
+        if not valor:
+            return None
+        try:
+            return base64.urlsafe_b64decode(self._signer.unsign(valor, max_age=self.ttl_seconds or None))
+        except (BadSignature, ValueError):
+            return None  # cookie adulterado, expirado ou de outra chave
+
+    def _corpo(self):
+        dados = self._dados()
+        try:
+            return desempacotar(dados) if dados else b""
+        except CodecError as e:
+            print(f"Erro ao decodificar o histórico do cookie: {e}. Reiniciando histórico.")
+            return b""
+
+    def load(self, session_id):
+        return LazyHistory(decodificar_turnos(self._corpo()))
+
+    def append(self, session_id, contents):
+        # O corpo é uma concatenação de turnos: os novos entram sem decodificar os antigos
+        self._gravar(self._corpo() + codificar_turnos(par_do_turno(c) for c in contents))
+
+    def clear(self, session_id):
+        self.gravar(None)
+
+    def replace(self, session_id, contents):
+        self._gravar(codificar_turnos(par_do_turno(c) for c in contents))
+
+    def replace_prefix(self, session_id, anterior, contents):
+        # O histórico só existe nesta requisição: não há gravação concorrente para conferir
+        turnos = decodificar_turnos(self._corpo())
+        self._gravar(codificar_turnos([par_do_turno(c) for c in contents] + turnos[len(anterior):]))
+        return True
+
+    def _valor(self, corpo):
+        return self._signer.sign(base64.urlsafe_b64encode(empacotar(corpo, self.compressao))).decode("ascii")
+
+    def _gravar(self, corpo):
+        valor = self._valor(corpo)
+        if len(valor) > self.max_bytes:
+            turnos = decodificar_turnos(corpo)
+            inicio = 2 if turnos and turnos[0][1].startswith(MARCADOR_RESUMO) else 0
+            while len(valor) > self.max_bytes and len(turnos) - inicio > 2:
+                del turnos[inicio:inicio + 2]
+                self.descartados += 2
+                valor = self._valor(codificar_turnos(turnos))
+        self.gravar(valor)
+
+
+def varios_workers():
+    """Se pode haver mais de um processo atendendo: rodando no gunicorn ou com WEB_CONCURRENCY > 1."""
+    return (os.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')
+            or int(os.environ.get('WEB_CONCURRENCY', '1')) > 1)
+
+
+def create_history_store(backend=None, cookie=None):
+    """
+    Cria o backend configurado por HISTORY_STORE ('memory', 'sqlite' ou 'cookie').
+    Sem HISTORY_STORE, usa 'sqlite' quando pode haver vários workers (o LRU em
+    memória é de cada processo, e turnos seguidos caem em workers diferentes)
+    e 'memory' num processo só.
+    O backend 'cookie' precisa de `cookie` = (ler, gravar, segredo) do app web.
+    """
+    padrao = 'sqlite' if varios_workers() else 'memory'
+    backend = (backend or os.environ.get('HISTORY_STORE', padrao)).lower()
+    if backend == 'memory' and varios_workers():
+        print("AVISO: HISTORY_STORE=memory com vários workers: cada worker tem o seu histórico, "
+              "e a conversa se perde quando a requisição cai em outro. Use 'sqlite'.")
+    ttl = int(os.environ.get('HISTORY_TTL_SECONDS', '3600'))
+    if backend == 'cookie':
+        if cookie is None:
+            raise ValueError("HISTORY_STORE=cookie só funciona no app web (precisa da sessão da requisição).")
+        compressao = os.environ.get('HISTORY_COOKIE_COMPRESSION', 'zlib').lower()
+        if compressao not in COMPRESSOES:
+            raise ValueError(f"HISTORY_COOKIE_COMPRESSION inválido: {compressao}")
+        return CookieHistoryStore(
+            *cookie,
+            max_bytes=int(os.environ.get('HISTORY_COOKIE_MAX_BYTES', '3800')),
+            compressao=COMPRESSOES[compressao],
+            ttl_seconds=ttl,
+        )
+    if backend == 'sqlite':
+        return SQLiteHistoryStore(os.environ.get('HISTORY_SQLITE_PATH', 'historico_conversas.db'), ttl)
+    if backend == 'memory':
+        return MemoryHistoryStore(int(os.environ.get('HISTORY_MAX_SESSIONS', '1000')), ttl)
+    raise ValueError(f"HISTORY_STORE inválido: {backend}")
@@ -0,0 +1,171 @@
+# indice_conhecimento.py - Índice BM25 da base de conhecimento
+#
+# Divide o arquivo de conhecimento em seções e seleciona apenas as mais
+# relevantes para a mensagem do usuário, respeitando um orçamento de tokens.
+
+import math
+from collections import Counter
+
+from intencao_local import normalizar_texto
+
+# Seções com este marcador são sempre incluídas (instruções para a IA)
+MARCADOR_FIXO = "instrucao para a ia"
+
+STOPWORDS = frozenset(
+    "a o as os um uma uns umas de do da dos das em no na nos nas por para pra pro com sem "
+    "e ou que se me te lhe eu voce voces ele ela nos eles elas meu minha seu sua qual quais "
+    "quem como onde quando e ao aos ate sobre mais muito tem ter ha esta estao ser sao foi".split()
+)
+
+
+def estimar_tokens(texto):
+    """Estimativa barata de tokens (~4 caracteres por token)."""
+    return len(texto) // 4 + 1
+
+
+def tokenizar(texto):
+    """Tokens normalizados (sem acento, minúsculos) sem stopwords."""
+    return [t for t in normalizar_texto(texto).split() if t not in STOPWORDS]
+
+
+def _eh_titulo(linha):
+    return linha.startswith("#") or (linha.endswith(":") and not linha.startswith("-"))
+
+
+def dividir_secoes(conteudo):
+    """
+    Divide o texto em seções: blocos separados por linhas em branco (ou '...').
+    Um título ('# ...' ou linha terminada em ':') também começa uma nova seção.
+    """
+    secoes = []
+    atual = []
+    for linha in conteudo.splitlines():
+        limpa = linha.strip()
+        if not limpa or limpa == "..." or (_eh_titulo(limpa) and atual and not all(_eh_titulo(l.strip()) for l in atual)):
+            if atual:
+                secoes.append("\n".join(atual))
+                atual = []
+            if not limpa or limpa == "...":
+                continue
+        atual.append(linha.rstrip())
+    if atual:
+        secoes.append("\n".join(atual))
+    return secoes
+
+
+class Secao:
+    """Uma seção do conhecimento com seus termos já contados."""
+
+    __slots__ = ("texto", "termos", "tamanho", "tokens", "fixa")
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.termos = Counter(tokenizar(texto))
+        self.tamanho = sum(self.termos.values())
+        self.tokens = estimar_tokens(texto)
+        self.fixa = MARCADOR_FIXO in normalizar_texto(texto)
+
+
+class KnowledgeIndex:
+    """Índice BM25 sobre as seções do arquivo de conhecimento."""
+
+    def __init__(self, conteudo="", k1=1.5, b=0.75, anterior=None):
+        self.k1 = k1
+        self.b = b
+        self.conteudo = conteudo or ""
+        # Versão do conteúdo: cresce a cada atualização, serve de chave para caches
+        self.geracao = anterior.geracao + 1 if anterior else 0
+        # Seções idênticas às do índice anterior são reaproveitadas sem reprocessar
+        reaproveitaveis = {secao.texto: secao for secao in anterior.secoes} if anterior else {}
+        self.secoes = []
+        self.secoes_reprocessadas = 0
+        for texto in dividir_secoes(self.conteudo):
+            secao = reaproveitaveis.get(texto)
+            if secao is None:
+                secao = Secao(texto)
+                self.secoes_reprocessadas += 1
+            self.secoes.append(secao)
+        self._indexar()
+
+    @classmethod
+    def from_file(cls, filepath):
+        """Cria o índice a partir de um arquivo (índice vazio se não existir)."""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return cls(f.read())
+        except FileNotFoundError:
+            return cls("")
+
+    def atualizado(self, conteudo):
+        """Novo índice para `conteudo`, reprocessando apenas as seções que mudaram."""
+        return KnowledgeIndex(conteudo, self.k1, self.b, anterior=self)
+
+    def _indexar(self):
+        self.total_tokens = estimar_tokens(self.conteudo) if self.conteudo else 0
+        self.media_tamanho = (sum(s.tamanho for s in self.secoes) / len(self.secoes)) if self.secoes else 0.0
+        frequencia_documentos = Counter()
+        for secao in self.secoes:
+            frequencia_documentos.update(secao.termos.keys())
+        n = len(self.secoes)
+        self.idf = {
+            termo: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for termo, df in frequencia_documentos.items()
+        }
+
+    def pontuar(self, pergunta):
+        """Retorna a pontuação BM25 de cada seção para a pergunta."""
+        termos = set(tokenizar(pergunta))
+        pontuacoes = []
+        for secao in self.secoes:
+            pontos = 0.0
+            norma = self.k1 * (1 - self.b + self.b * secao.tamanho / (self.media_tamanho or 1))
+            for termo in termos:
+                tf = secao.termos.get(termo)
+                if tf:
+                    pontos += self.idf[termo] * tf * (self.k1 + 1) / (tf + norma)
+            pontuacoes.append(pontos)
+        return pontuacoes
+
+    def selecionar(self, pergunta, top_k=4, token_budget=1500):
+        """
+        Seleciona as seções fixas e as `top_k` mais relevantes dentro do orçamento.
+
+        Returns:
+            tuple: índices das seções escolhidas, na ordem original do arquivo.
+        """
+        pontuacoes = self.pontuar(pergunta)
+        escolhidas = set()
+        usados = 0
+        for i, secao in enumerate(self.secoes):
+            if secao.fixa and usados + secao.tokens <= token_budget:
+                escolhidas.add(i)
+                usados += secao.tokens
+
+        candidatas = sorted(
+            (i for i, pontos in enumerate(pontuacoes) if pontos > 0 and i not in escolhidas),
+            key=lambda i: -pontuacoes[i],
+        )
+        for i in candidatas[:top_k]:
+            if usados + self.secoes[i].tokens <= token_budget:
+                escolhidas.add(i)
+                usados += self.secoes[i].tokens
+
+        return tuple(sorted(escolhidas))
+
+    def melhor_trecho(self, pergunta):
+        """Texto da seção (não fixa) mais relevante para a pergunta, ou None se nenhuma combinar."""
+        pontuacoes = self.pontuar(pergunta)
+        candidatas = [i for i, pontos in enumerate(pontuacoes) if pontos > 0 and not self.secoes[i].fixa]
+        if not candidatas:
+            return None
+        return self.secoes[max(candidatas, key=lambda i: pontuacoes[i])].texto
+
+    def buscar(self, pergunta, top_k=4, token_budget=1500):
+        """Textos das seções escolhidas por `selecionar`."""
+        return [self.secoes[i].texto for i in self.selecionar(pergunta, top_k, token_budget)]
+
+    def montar_contexto(self, pergunta, top_k=4, token_budget=1500):
+        """Texto de conhecimento a injetar: o arquivo inteiro se couber no orçamento, senão os trechos relevantes."""
+        if self.total_tokens <= token_budget:
+            return self.conteudo
+        return "\n\n".join(self.buscar(pergunta, top_k, token_budget))
@@ -0,0 +1,233 @@
+# indice_versiculos.py - Versículos indexados por referência, capítulo e palavra
+#
+# Cada linha de versiculos.txt termina com a referência "(Livro cap:vers)".
+# O VerseStore separa livro, capítulo e versículo e monta três índices:
+# referência -> versículo, (livro, capítulo) -> versículos e palavra -> versículos
+# (índice invertido sobre o texto normalizado). Pedidos como "Salmos 23" ou
+# "um versículo sobre ansiedade" são respondidos localmente em microssegundos.
+#
+# Os índices são gravados num arquivo pré-compilado (versiculos.txt.idx, formato
+# marshal) que é refeito sozinho quando o .txt muda; assim a inicialização
+# continua rápida mesmo com a Bíblia inteira.
+#
+# Uso: python indice_versiculos.py [versiculos.txt]   (pré-compila e mostra os tempos)
+
+import os
+import re
+import sys
+import time
+import marshal
+from collections import Counter
+
+from intencao_local import normalizar_texto
+
+FORMATO = 2  # 2: sem o apelido "jo" -> "joao" nas chaves das referências
+
+_REFERENCIA = re.compile(r"^(?P<texto>.*?)\s*\((?P<livro>(?:[123]\s*)?[^\d()]+?)\s+(?P<cap>\d+):(?P<vers>\d+)(?:-\d+)?\)\.?\s*$")
+# Referência citada na pergunta, já normalizada ("joao 3 16", "salmos 23", "1 corintios 13")
+_CITACAO = re.compile(r"\b((?:[123] )?[a-z]+) (\d{1,3})(?: (\d{1,3}))?\b")
+
+# Palavras que não ajudam a achar um versículo
+PALAVRAS_VAZIAS = frozenset(
+    "a o as os um uma uns umas de do da dos das e em no na nos nas por para pra com sem que se "
+    "me te nos vos lhe eu tu ele ela voces voce meu minha seu sua mais mas como ao aos sobre quero "
+    "manda mande envia versiculo versiculos biblia palavra fala algum alguma tem".split()
+)
+
+# Temas comuns nos pedidos e as palavras que costumam aparecer nos versículos
+TEMAS = {
+    "ansiedade": ["ansiedade", "ansioso", "ansiosos", "ansiosa", "inquieto", "preocupacao", "cuidado", "descanso"],
+    "medo": ["medo", "temas", "temor", "coragem", "esforcate", "anima"],
+    "esperanca": ["esperanca", "espera", "esperam", "confia", "confianca", "futuro"],
+    "forca": ["forca", "fortalece", "forte", "fortaleza", "poder", "tudo posso"],
+    "amor": ["amor", "amou", "ama", "amados", "caridade"],
+    "paz": ["paz", "descanso", "tranquilo", "sossego"],
+    "tristeza": ["tristeza", "triste", "choro", "consolo", "consola", "alegria", "pastor"],
+    "provisao": ["provisao", "faltara", "acrescentadas", "sustento", "reino"],
+    "perdao": ["perdao", "perdoa", "perdoar", "misericordia", "graca"],
+    "fe": ["fe", "cre", "crer", "confia", "confianca"],
+}
+
+# Abreviações e variações frequentes dos nomes dos livros
+# Sem "jo": sem acento, Jó e a abreviação de João ficam iguais ("jo"), e a busca
+# só vê o texto normalizado; "jo" fica sendo o livro de Jó
+APELIDOS_LIVROS = {
+    "sl": "salmos", "salmo": "salmos", "sal": "salmos", "mt": "mateus", "mat": "mateus",
+    "fp": "filipenses", "fil": "filipenses", "pv": "proverbios", "prov": "proverbios", "is": "isaias",
+    "rm": "romanos", "rom": "romanos", "gn": "genesis", "gen": "genesis", "jr": "jeremias", "mc": "marcos",
+    "lc": "lucas", "at": "atos",
+}
+
+
+class Versiculo:
+    __slots__ = ("texto", "livro", "capitulo", "numero")
+
+    def __init__(self, texto, livro, capitulo, numero):
+        self.texto = texto
+        self.livro = livro
+        self.capitulo = capitulo
+        self.numero = numero
+
+    @property
+    def referencia(self):
+        return f"{self.livro} {self.capitulo}:{self.numero}"
+
+    def __str__(self):
+        return f"{self.texto} ({self.referencia})"
+
+
+def chave_livro(livro):
+    livro = normalizar_texto(livro)
+    return APELIDOS_LIVROS.get(livro, livro)
+
+
+def _assinatura(caminho):
+    estado = os.stat(caminho)
+    return [estado.st_mtime_ns, estado.st_size]
+
+
+class VerseStore:
+    """Versículos com busca por referência, por capítulo e por tema/palavra."""
+
+    def __init__(self, versiculos=()):
+        self.versiculos = list(versiculos)
+        self._por_referencia = {}  # "joao 3:16" -> posição
+        self._por_capitulo = {}  # ("joao", 3) -> [posições]
+        self._por_palavra = {}  # palavra normalizada -> [posições]
+        self._indexar()
+
+    # --- Montagem e arquivo pré-compilado ---
+
+    @classmethod
+    def from_lines(cls, linhas):
+        versiculos = []
+        for linha in linhas:
+            m = _REFERENCIA.match(linha.strip())
+            if m:
+                versiculos.append(Versiculo(m["texto"].strip(), " ".join(m["livro"].split()), int(m["cap"]), int(m["vers"])))
+        return cls(versiculos)
+
+    def _indexar(self):
+        for i, v in enumerate(self.versiculos):
+            livro = chave_livro(v.livro)
+            self._por_referencia.setdefault(f"{livro} {v.capitulo}:{v.numero}", i)
+            self._por_capitulo.setdefault((livro, v.capitulo), []).append(i)
+            for palavra in set(normalizar_texto(v.texto).split()) - PALAVRAS_VAZIAS:
+                self._por_palavra.setdefault(palavra, []).append(i)
+
+    def _dados(self, assinatura):
+        return {
+            "formato": FORMATO,
+            "python": list(sys.version_info[:2]),
+            "origem": assinatura,
+            "versiculos": [(v.texto, v.livro, v.capitulo, v.numero) for v in self.versiculos],
+            "referencias": self._por_referencia,
+            "capitulos": [(livro, cap, posicoes) for (livro, cap), posicoes in self._por_capitulo.items()],
+            "palavras": self._por_palavra,
+        }
+
+    @classmethod
+    def _de_dados(cls, dados):
+        store = cls.__new__(cls)
+        store.versiculos = [Versiculo(*campos) for campos in dados["versiculos"]]
+        store._por_referencia = dados["referencias"]
+        store._por_capitulo = {(livro, cap): posicoes for livro, cap, posicoes in dados["capitulos"]}
+        store._por_palavra = dados["palavras"]
+        return store
+
+    @classmethod
+    def load(cls, caminho="versiculos.txt"):
+        """
+        Carrega do arquivo pré-compilado `caminho + '.idx'` se ele estiver em dia
+        com o .txt; senão lê o .txt, indexa e tenta regravar o .idx.
+        """
+        caminho_idx = caminho + ".idx"
+        try:
+            assinatura = _assinatura(caminho)
+        except FileNotFoundError:
+            print(f"ERRO: Arquivo de versículos '{caminho}' não encontrado.")
+            return cls()
+        try:
+            with open(caminho_idx, "rb") as f:
+                dados = marshal.load(f)
+            if (dados.get("formato"), dados.get("python"), dados.get("origem")) == (
+                    FORMATO, list(sys.version_info[:2]), assinatura):
+                return cls._de_dados(dados)
+        except (OSError, EOFError, ValueError, TypeError, AttributeError):
+            pass  # ausente, de outra versão do Python ou corrompido: refaz abaixo
+        with open(caminho, encoding="utf-8") as f:
+            store = cls.from_lines(f)
+        try:
+            store.compilar(caminho_idx, assinatura)
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o índice de versículos '{caminho_idx}': {e}")
+        return store
+
+    def compilar(self, caminho_idx, assinatura):
+        """Grava os índices no arquivo pré-compilado (troca atômica)."""
+        temporario = f"{caminho_idx}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            marshal.dump(self._dados(assinatura), f)
+        os.replace(temporario, caminho_idx)
+
+    # --- Consultas ---
+
+    def __len__(self):
+        return len(self.versiculos)
+
+    def referencia(self, livro, capitulo, numero):
+        """Versículo pela referência (O(1)), ou None."""
+        i = self._por_referencia.get(f"{chave_livro(livro)} {capitulo}:{numero}")
+        return self.versiculos[i] if i is not None else None
+
+    def capitulo(self, livro, capitulo):
+        """Versículos conhecidos de um capítulo, em ordem."""
+        return [self.versiculos[i] for i in self._por_capitulo.get((chave_livro(livro), capitulo), ())]
+
+    def citacao(self, pergunta):
+        """Versículos da referência citada na pergunta ("João 3:16", "Salmos 23"), ou []."""
+        for m in _CITACAO.finditer(normalizar_texto(pergunta)):
+            livro, capitulo, numero = chave_livro(m[1]), int(m[2]), m[3]
+            if numero is not None:
+                versiculo = self.referencia(livro, capitulo, int(numero))
+                if versiculo:
+                    return [versiculo]
+            encontrados = self.capitulo(livro, capitulo)
+            if encontrados:
+                return encontrados
+        return []
+
+    def buscar(self, pergunta, limite=3):
+        """Versículos sobre o tema da pergunta, pelos termos em comum (índice invertido)."""
+        termos = set(normalizar_texto(pergunta).split()) - PALAVRAS_VAZIAS
+        for termo in list(termos):
+            for sinonimo in TEMAS.get(termo, ()):
+                termos.update(sinonimo.split())
+        pontos = Counter()
+        for termo in termos:
+            for i in self._por_palavra.get(termo, ()):
+                pontos[i] += 1
+        return [self.versiculos[i] for i, _ in pontos.most_common(limite)]
+
+    def responder(self, pergunta, limite=1):
+        """Versículos para a pergunta: a referência citada ou, senão, os do tema."""
+        return self.citacao(pergunta)[:max(limite, 1) * 5] or self.buscar(pergunta, limite)
+
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "versiculos.txt"
+    inicio = time.perf_counter()
+    with open(caminho, encoding="utf-8") as f:
+        store = VerseStore.from_lines(f)
+    montagem = time.perf_counter() - inicio
+    store.compilar(caminho + ".idx", _assinatura(caminho))
+    inicio = time.perf_counter()
+    VerseStore.load(caminho)
+    carga = time.perf_counter() - inicio
+    print(f"{len(store)} versículos, {len(store._por_palavra)} palavras indexadas -> {caminho}.idx "
+          f"({os.path.getsize(caminho + '.idx')} bytes)")
+    print(f"  montagem a partir do .txt: {montagem * 1000:.1f} ms | carga do .idx: {carga * 1000:.1f} ms")
+    for pergunta in ("Salmos 23", "João 3:16", "um versículo sobre ansiedade", "preciso de força"):
+        inicio = time.perf_counter()
+        resposta = store.responder(pergunta)
+        print(f"  {pergunta!r}: {(time.perf_counter() - inicio) * 1e6:.0f} µs -> {[v.referencia for v in resposta]}")
@@ -0,0 +1,101 @@
+# intencao_local.py - Roteador de intenções local (sem chamada à IA)
+
+import re
+import unicodedata
+
+# Rótulo usado quando a mensagem não pede nenhum dos botões de contato
+INTENT_CHAT = "chat"
+
+# Tabelas de padrões por intenção (já normalizadas: minúsculas e sem acentos).
+# Cada padrão tem um peso; padrões fortes sozinhos já decidem a intenção.
+PADROES_INTENCAO = {
+    "whatsapp": [
+        ("whatsapp", 1.0), ("whats", 1.0), ("zap", 1.0), ("zapzap", 1.0), ("wpp", 1.0),
+        ("telefone", 0.8), ("celular", 0.8), ("numero de contato", 0.9), ("ligar", 0.6),
+        ("falar com a equipe", 0.9), ("falar com alguem", 0.7), ("contato", 0.5),
+    ],
+    "instagram": [
+        ("instagram", 1.0), ("insta", 1.0), ("ig", 0.6),
+        ("rede social", 0.8), ("redes sociais", 0.8), ("perfil", 0.5),
+    ],
+    "localizacao": [
+        ("endereco", 1.0), ("localizacao", 1.0), ("onde fica", 1.0), ("onde e a igreja", 1.0),
+        ("onde voces ficam", 1.0), ("como chegar", 1.0), ("mapa", 0.9), ("maps", 0.9),
+        ("rota", 0.6), ("gps", 0.8),
+    ],
+    "secretaria": [
+        ("secretaria", 1.0), ("portal", 0.9), ("inscricao", 0.6), ("cadastro", 0.6),
+        ("certificado", 0.6), ("carteirinha", 0.7), ("documento", 0.5),
+    ],
+}
+
+# Palavras que sugerem um pedido de contato genérico: sem padrão forte,
+# a mensagem fica ambígua e deve ir para o classificador da IA.
+PALAVRAS_AMBIGUAS = ("link", "site", "acessar", "acesso", "falar com", "entrar em contato", "rede")
+
+# Pedidos de contato costumam ser curtos; mensagens longas perdem confiança
+PALAVRAS_MENSAGEM_CURTA = 12
+
+
+def normalizar_texto(texto):
+    """Remove acentos, converte para minúsculas e troca pontuação por espaços."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", texto.lower()).split())
+
+
+def compilar_padroes(padroes):
+    """Compila uma lista de (padrão, peso) em uma única regex com grupos nomeados."""
+    pesos = {}
+    alternativas = []
+    # Padrões mais longos primeiro para "falar com a equipe" vencer "contato"
+    for i, (padrao, peso) in enumerate(sorted(padroes, key=lambda p: -len(p[0]))):
+        nome = f"p{i}"
+        pesos[nome] = peso
+        alternativas.append(rf"(?P<{nome}>\b{re.escape(padrao)}\b)")
+    return re.compile("|".join(alternativas)), pesos
+
+
+_REGEX_INTENCAO = {intent: compilar_padroes(padroes) for intent, padroes in PADROES_INTENCAO.items()}
+_REGEX_AMBIGUA = re.compile("|".join(rf"\b{re.escape(p)}\b" for p in PALAVRAS_AMBIGUAS))
+
+
+def _pontuar(texto_normalizado):
+    """Soma os pesos dos padrões encontrados para cada intenção."""
+    pontuacao = {}
+    for intent, (regex, pesos) in _REGEX_INTENCAO.items():
+        total = 0.0
+        for m in regex.finditer(texto_normalizado):
+            total += pesos[m.lastgroup]
+        if total:
+            pontuacao[intent] = total
+    return pontuacao
+
+
+def classificar_intencao_local(user_message):
+    """
+    Classifica a mensagem entre os botões de contato e 'chat' sem chamar a IA.
+
+    Returns:
+        tuple: (intenção, confiança entre 0 e 1). Quem chama decide se a
+        confiança é suficiente ou se deve consultar o classificador da IA.
+    """
+    texto = normalizar_texto(user_message)
+    if not texto:
+        return INTENT_CHAT, 1.0
+
+    fator_tamanho = 1.0 if len(texto.split()) <= PALAVRAS_MENSAGEM_CURTA else 0.6
+    pontuacao = _pontuar(texto)
+
+    if not pontuacao:
+        if _REGEX_AMBIGUA.search(texto):
+            return INTENT_CHAT, 0.3
+        return INTENT_CHAT, 0.9
+
+    ordenadas = sorted(pontuacao.items(), key=lambda item: -item[1])
+    intent, melhor = ordenadas[0]
+    segundo = ordenadas[1][1] if len(ordenadas) > 1 else 0.0
+
+    # Força absoluta (saturada em 1) ponderada pela margem sobre a segunda opção
+    confianca = min(melhor, 1.0) * (melhor / (melhor + segundo)) * fator_tamanho
+    return intent, round(confianca, 3)
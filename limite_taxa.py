@@ -0,0 +1,222 @@
+# limite_taxa.py - Limite de mensagens por cliente (janela deslizante)
+#
+# Cada chave ("sessao:...", "ip:...") guarda só três números: o índice da janela
+# atual, as mensagens nela e as da janela anterior. A contagem dos últimos
+# `janela` segundos é estimada pesando a janela anterior pela parte dela que
+# ainda cai no intervalo (contador de janela deslizante): memória O(1) por chave,
+# em vez de uma lista com o horário de cada mensagem.
+#
+# Backends: 'memory' (por processo, com varredura das chaves ociosas) e
+# 'sqlite' (compartilhado entre os workers do gunicorn).
+
+import os
+import math
+import time
+import sqlite3
+import threading
+
+from historico_store import varios_workers
+
+
+def _rolar(estado, indice):
+    """Leva (janela, atual, anterior) para a janela `indice`."""
+    janela, atual, anterior = estado
+    if indice == janela:
+        return estado
+    if indice == janela + 1:
+        return (indice, 0, atual)
+    return (indice, 0, 0)
+
+
+def _avaliar(estado, limite, janela_segundos, agora):
+    """
+    (novo estado se a mensagem entrar, segundos até poder entrar). O primeiro
+    é None quando a mensagem passaria do limite.
+    """
+    indice = int(agora // janela_segundos)
+    estado = _rolar(estado or (indice, 0, 0), indice)
+    _, atual, anterior = estado
+    decorrido = agora / janela_segundos - indice  # fração da janela atual já passada
+    if anterior * (1 - decorrido) + atual + 1 <= limite:
+        return (indice, atual + 1, anterior), 0.0
+    if atual + 1 <= limite:
+        # Basta a janela anterior "sair" o suficiente do intervalo
+        espera = 1 - (limite - 1 - atual) / anterior - decorrido
+    else:
+        # Só na próxima janela, quando a atual vira a anterior
+        espera = 1 - decorrido + max(0.0, 1 - (limite - 1) / atual)
+    return None, max(espera * janela_segundos, 0.0)
+
+
+class MemoryRateBackend:
+    """Estados por chave num dicionário do processo; chaves ociosas são varridas de tempos em tempos."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        self._estados = {}
+        self._lock = threading.Lock()
+        self._consultas = 0
+
+    def consumir(self, itens, agora):
+        """`itens`: (chave, limite, janela). Retorna (permitido, segundos até poder entrar)."""
+        with self._lock:
+            novos, espera = [], 0.0
+            for chave, limite, janela in itens:
+                novo, segundos = _avaliar(self._estados.get(chave), limite, janela, agora)
+                novos.append((chave, novo))
+                espera = max(espera, segundos)
+            # Tudo ou nada: recusada numa chave, não conta nas outras
+            permitido = all(novo is not None for _, novo in novos)
+            if permitido:
+                for chave, novo in novos:
+                    self._estados[chave] = novo
+            self._consultas += 1
+            if self._consultas % self.SWEEP_EVERY == 0:
+                self._varrer(itens, agora)
+            return permitido, espera
+
+    def _varrer(self, itens, agora):
+        # Uma chave sem mensagens nas duas últimas janelas é igual a uma chave nova
+        janela = max(j for _, _, j in itens)
+        indice = int(agora // janela)
+        for chave in [c for c, estado in self._estados.items() if estado[0] < indice - 1]:
+            del self._estados[chave]
+
+    def __len__(self):
+        return len(self._estados)
+
+
+class SQLiteRateBackend:
+    """Estados por chave numa tabela SQLite, compartilhada entre os workers do gunicorn."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path="limites_taxa.db"):
+        self.path = path
+        self._local = threading.local()
+        self._consultas = 0
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS limites ("
+                " chave TEXT PRIMARY KEY,"
+                " janela INTEGER NOT NULL,"
+                " atual INTEGER NOT NULL,"
+                " anterior INTEGER NOT NULL) WITHOUT ROWID"
+            )
+
+    def _conexao(self):
+        # Uma conexão por thread (e por processo, pois é criada sob demanda após o fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consumir(self, itens, agora):
+        conn = self._conexao()
+        # BEGIN IMMEDIATE: leitura e gravação sem outro worker no meio
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            novos, espera, permitido = [], 0.0, True
+            for chave, limite, janela in itens:
+                estado = conn.execute(
+                    "SELECT janela, atual, anterior FROM limites WHERE chave = ?", (chave,)).fetchone()
+                novo, segundos = _avaliar(estado, limite, janela, agora)
+                if novo is None:
+                    permitido = False
+                else:
+                    novos.append((chave,) + novo)
+                espera = max(espera, segundos)
+            if permitido:
+                conn.executemany(
+                    "INSERT INTO limites (chave, janela, atual, anterior) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(chave) DO UPDATE SET janela = excluded.janela,"
+                    " atual = excluded.atual, anterior = excluded.anterior",
+                    novos,
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._consultas += 1
+        if self._consultas % self.SWEEP_EVERY == 0:
+            janela = max(j for _, _, j in itens)
+            self.sweep(int(agora // janela) - 1)
+        return permitido, espera
+
+    def sweep(self, indice_minimo):
+        """Remove as chaves sem mensagens desde antes da janela `indice_minimo`."""
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM limites WHERE janela < ?", (indice_minimo,))
+
+    def __len__(self):
+        return self._conexao().execute("SELECT COUNT(*) FROM limites").fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Limite de mensagens por sessão e por IP, em `janela` segundos.
+
+    O limite por IP é mais folgado: a rede da igreja pode colocar muita gente
+    atrás do mesmo IP.
+    """
+
+    def __init__(self, backend, por_sessao=20, por_ip=120, janela=60.0):
+        self.backend = backend
+        self.por_sessao = por_sessao
+        self.por_ip = por_ip
+        self.janela = janela
+        self.recusadas = 0
+
+    def permitir(self, sessao=None, ip=None):
+        """(permitido, segundos para o Retry-After). Sem sessão nem IP, sempre permite."""
+        itens = []
+        if sessao and self.por_sessao:
+            itens.append((f"sessao:{sessao}", self.por_sessao, self.janela))
+        if ip and self.por_ip:
+            itens.append((f"ip:{ip}", self.por_ip, self.janela))
+        if not itens:
+            return True, 0
+        permitido, espera = self.backend.consumir(itens, time.time())
+        if permitido:
+            return True, 0
+        self.recusadas += 1
+        return False, max(1, math.ceil(espera))
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "per_session": self.por_sessao,
+            "per_ip": self.por_ip,
+            "window_seconds": self.janela,
+            "tracked_keys": len(self.backend),
+            "rejected": self.recusadas,
+        }
+
+
+def create_rate_limiter(backend=None):
+    """
+    RateLimiter configurado por RATE_LIMIT_BACKEND ('memory' ou 'sqlite'),
+    RATE_LIMIT_SESSION_PER_MINUTE e RATE_LIMIT_IP_PER_MINUTE (0 desliga cada um).
+    Sem RATE_LIMIT_BACKEND, usa 'sqlite' quando pode haver vários workers (com
+    'memory' cada worker contaria a sua janela, e o limite real seria N vezes o
+    configurado) e 'memory' num processo só.
+    """
+    padrao = 'sqlite' if varios_workers() else 'memory'
+    backend = (backend or os.environ.get('RATE_LIMIT_BACKEND', padrao)).lower()
+    if backend == 'sqlite':
+        armazenamento = SQLiteRateBackend(os.environ.get('RATE_LIMIT_SQLITE_PATH', 'limites_taxa.db'))
+    elif backend == 'memory':
+        armazenamento = MemoryRateBackend()
+    else:
+        raise ValueError(f"RATE_LIMIT_BACKEND inválido: {backend}")
+    return RateLimiter(
+        armazenamento,
+        por_sessao=int(os.environ.get('RATE_LIMIT_SESSION_PER_MINUTE', '20')),
+        por_ip=int(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '120')),
+        janela=60.0,
+    )
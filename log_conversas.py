@@ -0,0 +1,306 @@
+# log_conversas.py - Log de conversas assíncrono, em lotes e com rotação
+#
+# A thread da requisição só coloca o registro numa fila (QueueHandler, sem
+# bloquear: fila cheia descarta e conta). Uma thread do QueueListener monta as
+# linhas JSON e grava em lotes; o arquivo roda por tamanho e por tempo, os
+# antigos são comprimidos com gzip e só os `backups` mais recentes ficam.
+# Os logs de acesso (werkzeug/gunicorn/uvicorn) e os tempos por etapa vão para
+# um arquivo próprio, separados das conversas.
+#
+# Cada processo (worker do gunicorn) grava e roda os seus próprios arquivos:
+# `conversas.jsonl`, `conversas-1.jsonl`, ... (a vaga é uma trava mantida
+# enquanto o processo vive), então dois workers nunca rodam o mesmo arquivo.
+# No gunicorn as vagas só são pegas no post_fork: com --preload o master
+# importa o app, e a trava que ele pegasse ficaria presa com ele.
+
+import os
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import itertools
+import threading
+from datetime import datetime, timezone
+from logging.handlers import BaseRotatingHandler, QueueHandler, QueueListener
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+LOGGER_CONVERSAS = "hope.conversas"
+LOGGER_TEMPOS = "hope.tempos"
+LOGGERS_ACESSO = ("werkzeug", "gunicorn.access", "uvicorn.access", LOGGER_TEMPOS)
+# Servidor de desenvolvimento do Flask: os acessos continuam também no console
+LOGGERS_NO_CONSOLE = ("werkzeug",)
+
+
+class JsonLinhaFormatter(logging.Formatter):
+    """Uma linha JSON por registro: horário, nível, mensagem e os campos de `extra={'dados': {...}}`."""
+
+    def format(self, record):
+        linha = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "evento": record.getMessage(),
+        }
+        linha.update(getattr(record, "dados", None) or {})
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que nunca espera: com a fila cheia o registro é descartado e contado."""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener que descarrega os lotes dos handlers pelo menos a cada `flush_segundos`."""
+
+    def __init__(self, fila, *handlers, flush_segundos=1.0):
+        super().__init__(fila, *handlers, respect_handler_level=True)
+        self.flush_segundos = flush_segundos
+        self._proximo_flush = time.monotonic() + flush_segundos
+
+    def _descarregar(self):
+        for handler in self.handlers:
+            handler.flush()
+        self._proximo_flush = time.monotonic() + self.flush_segundos
+
+    def dequeue(self, block):
+        while True:
+            espera = self._proximo_flush - time.monotonic()
+            if espera <= 0:
+                self._descarregar()
+                continue
+            try:
+                return self.queue.get(block, timeout=espera)
+            except queue.Empty:
+                self._descarregar()
+
+
+class BatchedRotatingFileHandler(BaseRotatingHandler):
+    """
+    Arquivo gravado em lotes de até `lote` linhas (uma escrita por lote) que
+    roda ao passar de `max_bytes` ou a cada `intervalo_segundos`. O arquivo
+    rodado ganha o horário no nome, é comprimido (gzip) e só os `backups`
+    mais recentes são mantidos.
+    """
+
+    def __init__(self, arquivo, max_bytes=10 * 1024 * 1024, intervalo_segundos=86400, backups=14,
+                 comprimir=True, lote=64):
+        super().__init__(arquivo, "a", encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+        self.intervalo_segundos = intervalo_segundos
+        self.backups = backups
+        self.comprimir = comprimir
+        self.lote = lote
+        self._linhas = []
+        self._bytes = os.path.getsize(arquivo) if os.path.exists(arquivo) else 0
+        self._proxima_rotacao = self._calcular_proxima(time.time())
+
+    def _calcular_proxima(self, agora):
+        return agora + self.intervalo_segundos if self.intervalo_segundos else float("inf")
+
+    def emit(self, record):
+        try:
+            self._linhas.append(self.format(record) + "\n")
+            if len(self._linhas) >= self.lote:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if not self._linhas:
+                return
+            texto = "".join(self._linhas)
+            self._linhas = []
+            if self._bytes and (self._bytes + len(texto) > self.max_bytes or time.time() >= self._proxima_rotacao):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(texto)
+            self.stream.flush()
+            self._bytes += len(texto.encode("utf-8"))
+        except Exception as e:
+            print(f"Erro ao gravar o log {self.baseFilename}: {e}")
+        finally:
+            self.release()
+
+    def shouldRollover(self, record):
+        return False  # decidido por lote em flush()
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        agora = time.time()
+        destino = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S', time.localtime(agora))}"
+        sufixo = 1
+        while os.path.exists(destino) or os.path.exists(destino + ".gz"):
+            destino = f"{destino.rsplit('~', 1)[0]}~{sufixo}"
+            sufixo += 1
+        if os.path.exists(self.baseFilename):
+            os.replace(self.baseFilename, destino)
+            if self.comprimir:
+                with open(destino, "rb") as origem, gzip.open(destino + ".gz", "wb") as comprimido:
+                    shutil.copyfileobj(origem, comprimido)
+                os.remove(destino)
+        self._apagar_antigos()
+        self._bytes = 0
+        self._proxima_rotacao = self._calcular_proxima(agora)
+
+    def _apagar_antigos(self):
+        antigos = sorted(glob.glob(glob.escape(self.baseFilename) + ".*"), key=os.path.getmtime)
+        for caminho in antigos[:max(len(antigos) - self.backups, 0)]:
+            os.remove(caminho)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+_travas = []  # travas das vagas de arquivo deste processo
+_pid_adiado = None  # processo que só monta o pipeline nos filhos (master do gunicorn)
+
+
+def adiar_para_os_filhos():
+    """
+    Chamado no master do gunicorn (gunicorn.conf.py): neste processo
+    configurar_log_conversas() não monta o pipeline nem pega vaga de arquivo;
+    cada worker monta o seu no post_fork.
+    """
+    global _pid_adiado
+    _pid_adiado = os.getpid()
+
+
+def _arquivo_do_processo(arquivo):
+    """Primeira vaga livre entre `arquivo`, `<raiz>-1<ext>`, ...; a trava fica aberta até o processo terminar."""
+    if fcntl is None:
+        return arquivo
+    raiz, extensao = os.path.splitext(arquivo)
+    for vaga in itertools.count():
+        nome = arquivo if vaga == 0 else f"{raiz}-{vaga}{extensao}"
+        diretorio, base = os.path.split(os.path.abspath(nome))
+        trava = open(os.path.join(diretorio, f".{base}.lock"), "a")
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            trava.close()
+            continue
+        _travas.append(trava)
+        return nome
+
+
+def _handler_arquivo(arquivo, formatter):
+    handler = BatchedRotatingFileHandler(
+        _arquivo_do_processo(arquivo),
+        max_bytes=int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+        intervalo_segundos=int(float(os.environ.get('LOG_ROTATE_HOURS', '24')) * 3600),
+        backups=int(os.environ.get('LOG_BACKUPS', '14')),
+        comprimir=os.environ.get('LOG_COMPRESS', '1') == '1',
+        lote=int(os.environ.get('LOG_BATCH', '64')),
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+
+def configurar_log_conversas():
+    """
+    Liga o pipeline uma vez por processo e retorna o logger das conversas.
+    Conversas vão para CONVERSATION_LOG_FILE (JSON lines); os acessos do
+    werkzeug/gunicorn/uvicorn e os tempos por etapa (logger "hope.tempos") para
+    ACCESS_LOG_FILE. Todos passam pela mesma fila.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        logger = logging.getLogger(LOGGER_CONVERSAS)
+        if _pipeline is not None or _pid_adiado == os.getpid():
+            return logger
+        conversas = _handler_arquivo(os.environ.get('CONVERSATION_LOG_FILE', 'conversas.jsonl'), JsonLinhaFormatter())
+        conversas.addFilter(lambda record: record.name == LOGGER_CONVERSAS)
+        acessos = _handler_arquivo(os.environ.get('ACCESS_LOG_FILE', 'acessos.log'),
+                                   logging.Formatter('%(asctime)s | %(name)s | %(message)s'))
+        acessos.addFilter(lambda record: record.name in LOGGERS_ACESSO)
+
+        fila = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', '10000')))
+        entrada = NonBlockingQueueHandler(fila)
+        listener = BatchingQueueListener(fila, conversas, acessos,
+                                         flush_segundos=float(os.environ.get('LOG_FLUSH_SECONDS', '1')))
+        listener.start()
+
+        # Fora do log geral (console): conversas e acessos só nos arquivos próprios
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(entrada)
+        for nome in LOGGERS_ACESSO:
+            acesso = logging.getLogger(nome)
+            if acesso.level == logging.NOTSET:
+                acesso.setLevel(logging.INFO)
+            if nome in LOGGERS_NO_CONSOLE:
+                # O werkzeug só põe o seu handler de console se não achar nenhum
+                if not acesso.hasHandlers():
+                    acesso.addHandler(logging.StreamHandler())
+            else:
+                acesso.propagate = False
+            acesso.addHandler(entrada)
+
+        pid = os.getpid()
+
+        def parar():
+            if os.getpid() != pid:
+                return  # processo filho: o listener e os arquivos são do pai
+            listener.stop()
+            for handler in (conversas, acessos):
+                handler.close()
+
+        atexit.register(parar)
+        _pipeline = (entrada, listener, (conversas, acessos))
+        return logger
+
+
+def _apos_fork():
+    """
+    No processo filho a thread do listener não existe mais e as vagas de
+    arquivo são do pai: desmonta o pipeline herdado. Quem precisa logar no
+    filho (o worker do gunicorn, no post_fork de gunicorn.conf.py) chama
+    configurar_log_conversas() de novo.
+    """
+    global _pipeline, _pipeline_lock
+    _pipeline_lock = threading.Lock()
+    if _pipeline is None:
+        return
+    entrada, _, handlers = _pipeline
+    for handler in handlers:
+        handler._linhas = []  # o lote pendente é do pai; não gravar de novo
+    for nome in (LOGGER_CONVERSAS,) + LOGGERS_ACESSO:
+        logging.getLogger(nome).removeHandler(entrada)
+    for trava in _travas:
+        trava.close()
+    _travas.clear()
+    _pipeline = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_apos_fork)
+
+
+def registros_descartados():
+    """Registros perdidos por fila cheia desde o início do processo."""
+    return _pipeline[0].descartados if _pipeline else 0
@@ -0,0 +1,214 @@
+# login_admin.py - Login do Painel Admin sem bloquear o chat
+#
+# O bcrypt com custo 12 gasta ~250 ms de CPU por tentativa. Aqui a verificação
+# roda num pool de processos pequeno e com fila limitada (uma rajada de logins
+# não come a CPU dos workers do chat), cada IP e cada usuário têm um balde de
+# fichas (token bucket) de tentativas, e o login bem-sucedido vira um token
+# assinado de vida curta: as ações do admin conferem o token, não a senha.
+
+import os
+import hmac
+import time
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+# Resultados de AdminLogin.verificar
+OK = "ok"
+INVALIDO = "invalido"
+LIMITADO = "limitado"
+OCUPADO = "ocupado"
+ERRO_HASH = "erro_hash"
+
+
+def _checkpw(senha, hash_armazenado):
+    """Roda no processo do pool (função de módulo para poder ser serializada)."""
+    return bcrypt.checkpw(senha, hash_armazenado)
+
+
+class LoginThrottle:
+    """
+    Um balde de fichas por chave ("ip:...", "usuario:..."): `capacidade`
+    tentativas seguidas e uma ficha nova a cada `intervalo` segundos.
+    """
+
+    def __init__(self, capacidade=5, intervalo=12.0, max_chaves=10000):
+        self.capacidade = capacidade
+        self.intervalo = intervalo
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()  # chave -> [fichas, instante da última atualização]
+        self._lock = threading.Lock()
+        self.bloqueios = 0
+
+    def consumir(self, *chaves):
+        """
+        Tira uma ficha de cada chave se todas tiverem ficha; senão não tira nenhuma.
+        Retorna (permitido, segundos até a próxima ficha).
+        """
+        agora = time.monotonic()
+        with self._lock:
+            baldes = []
+            espera = 0.0
+            for chave in chaves:
+                balde = self._baldes.pop(chave, None) or [float(self.capacidade), agora]
+                balde[0] = min(self.capacidade, balde[0] + (agora - balde[1]) / self.intervalo)
+                balde[1] = agora
+                self._baldes[chave] = balde
+                baldes.append(balde)
+                if balde[0] < 1:
+                    espera = max(espera, (1 - balde[0]) * self.intervalo)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+            if espera:
+                self.bloqueios += 1
+                return False, espera
+            for balde in baldes:
+                balde[0] -= 1
+            return True, 0.0
+
+    def __len__(self):
+        return len(self._baldes)
+
+
+def _contexto_pool():
+    """
+    forkserver (ou spawn onde não existe): um fork direto do worker do gunicorn,
+    que tem outras threads, pode herdar travas presas e travar o processo filho.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class PasswordVerifier:
+    """bcrypt.checkpw num pool de processos criado na primeira tentativa, com fila limitada."""
+
+    def __init__(self, workers=1, max_pendentes=4, timeout=5.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._vagas = threading.BoundedSemaphore(workers + max_pendentes)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.rejeitadas = 0
+
+    def _executor(self):
+        # Criado sob demanda: depois do fork dos workers do gunicorn, não antes
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_contexto_pool())
+            return self._pool
+
+    def verificar(self, senha, hash_armazenado):
+        """
+        True/False para a senha; None se a fila estiver cheia ou a verificação
+        não terminar no prazo. ValueError se o hash estiver mal formatado.
+        """
+        if not self._vagas.acquire(blocking=False):
+            self.rejeitadas += 1
+            return None
+        try:
+            futuro = self._executor().submit(_checkpw, senha, hash_armazenado)
+        except BaseException as e:
+            self._vagas.release()
+            if not isinstance(e, BrokenProcessPool):
+                raise
+            self._pool_quebrado(e)
+            return None
+        # A vaga só volta quando o processo termina o hash, mesmo depois do prazo:
+        # senão, sob ataque, a fila do pool cresceria além do limite
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except BrokenProcessPool as e:
+            self._pool_quebrado(e)
+            return None
+        except FuturesTimeout:
+            self.rejeitadas += 1
+            return None
+
+    def _pool_quebrado(self, erro):
+        print(f"Erro no pool de verificação de senha: {erro}. Recriando o pool.")
+        with self._lock:
+            self._pool = None
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+class AdminLogin:
+    """Verificação de credenciais com limite de tentativas e token assinado de sessão do admin."""
+
+    def __init__(self, usuario, hash_senha, segredo, throttle=None, verificador=None, token_ttl_seconds=900):
+        self.usuario = usuario
+        self.hash_senha = hash_senha.encode("utf-8")
+        self.throttle = throttle if throttle is not None else LoginThrottle()
+        self.verificador = verificador if verificador is not None else PasswordVerifier()
+        self.token_ttl_seconds = token_ttl_seconds
+        self._serializer = URLSafeTimedSerializer(segredo, salt="hope-admin")
+        # Tokens emitidos com outro hash (senha trocada) deixam de valer
+        self._impressao = hashlib.sha256(self.hash_senha).hexdigest()[:16]
+
+    def verificar(self, ip, usuario, senha):
+        """(resultado, segundos para tentar de novo) — resultado é OK, INVALIDO, LIMITADO, OCUPADO ou ERRO_HASH."""
+        usuario = usuario or ""
+        permitido, espera = self.throttle.consumir(f"ip:{ip}", f"usuario:{usuario.lower()}")
+        if not permitido:
+            return LIMITADO, espera
+        # Usuário errado não gasta bcrypt
+        if not hmac.compare_digest(usuario.encode("utf-8"), self.usuario.encode("utf-8")):
+            return INVALIDO, 0.0
+        try:
+            valida = self.verificador.verificar((senha or "").encode("utf-8"), self.hash_senha)
+        except ValueError:
+            return ERRO_HASH, 0.0
+        if valida is None:
+            return OCUPADO, self.verificador.timeout
+        return (OK if valida else INVALIDO), 0.0
+
+    def emitir_token(self, usuario):
+        return self._serializer.dumps({"u": usuario, "h": self._impressao})
+
+    def token_valido(self, token):
+        if not token:
+            return False
+        try:
+            dados = self._serializer.loads(token, max_age=self.token_ttl_seconds)
+        except BadSignature:
+            return False  # adulterado, expirado ou de outra chave
+        return dados.get("u") == self.usuario and dados.get("h") == self._impressao
+
+    def stats(self):
+        return {
+            "throttled": self.throttle.bloqueios,
+            "tracked_keys": len(self.throttle),
+            "rejected_busy": self.verificador.rejeitadas,
+            "token_ttl_seconds": self.token_ttl_seconds,
+        }
+
+
+def create_admin_login(usuario, hash_senha, segredo):
+    """AdminLogin configurado pelas variáveis ADMIN_LOGIN_* e ADMIN_TOKEN_TTL_SECONDS."""
+    return AdminLogin(
+        usuario,
+        hash_senha,
+        segredo,
+        throttle=LoginThrottle(
+            capacidade=int(os.environ.get('ADMIN_LOGIN_BURST', '5')),
+            intervalo=60.0 / float(os.environ.get('ADMIN_LOGIN_PER_MINUTE', '5')),
+        ),
+        verificador=PasswordVerifier(
+            workers=int(os.environ.get('ADMIN_LOGIN_WORKERS', '1')),
+            max_pendentes=int(os.environ.get('ADMIN_LOGIN_MAX_PENDING', '4')),
+            timeout=float(os.environ.get('ADMIN_LOGIN_TIMEOUT_SECONDS', '5')),
+        ),
+        token_ttl_seconds=int(os.environ.get('ADMIN_TOKEN_TTL_SECONDS', '900')),
+    )
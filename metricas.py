@@ -0,0 +1,147 @@
+# metricas.py - Contadores e histogramas no formato de texto do Prometheus
+#
+# Implementação mínima (sem dependências) para o endpoint /metrics. Os valores
+# são por processo: com vários workers do gunicorn, cada coleta vê um worker, e
+# toda série leva o rótulo worker (pid) para que as séries de workers diferentes
+# não se misturem (o Prometheus veria resets falsos) e possam ser somadas.
+
+import os
+import math
+import threading
+
+# Limites padrão (em segundos) para latências, de 5 ms até 30 s
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, extra=()):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    pares += [f'{nome}="{valor}"' for nome, valor in extra]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor):
+    if valor == math.inf:
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico, opcionalmente separado por rótulos."""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(rotulos.get(nome, "") for nome in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        chave = tuple(rotulos.get(nome, "") for nome in self.rotulos)
+        with self._lock:
+            return self._valores.get(chave, 0)
+
+    def amostras(self, fixos=()):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave, fixos)} {_formatar_numero(v)}" for chave, v in itens]
+
+
+class Histograma:
+    """Histograma com limites fixos (buckets cumulativos, soma e contagem)."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # rótulos -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, valor, **rotulos):
+        chave = tuple(rotulos.get(nome, "") for nome in self.rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def amostras(self, fixos=()):
+        with self._lock:
+            series = sorted((chave, (list(contagens), soma, total)) for chave, (contagens, soma, total) in self._series.items())
+        linhas = []
+        for chave, (contagens, soma, total) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, [*fixos, ("le", _formatar_numero(limite))])
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave, fixos)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {total}")
+        return linhas
+
+
+class Coletado:
+    """Valor lido na hora da coleta (ex.: estado de um componente), sem rótulos."""
+
+    def __init__(self, nome, ajuda, tipo, ler):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.tipo = tipo
+        self.ler = ler
+
+    def amostras(self, fixos=()):
+        return [f"{self.nome}{_formatar_rotulos((), (), fixos)} {_formatar_numero(self.ler())}"]
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas no /metrics."""
+
+    def __init__(self, rotulo_processo="worker"):
+        self.rotulo_processo = rotulo_processo
+        self._metricas = []
+
+    def contador(self, nome, ajuda, rotulos=()):
+        metrica = Contador(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        metrica = Histograma(nome, ajuda, rotulos, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def coletado(self, nome, ajuda, ler, tipo="gauge"):
+        """Métrica cujo valor vem de `ler()` a cada coleta ('gauge' ou 'counter')."""
+        metrica = Coletado(nome, ajuda, tipo, ler)
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        # pid lido na hora: o registro pode ter sido criado no mestre (--preload)
+        fixos = [(self.rotulo_processo, os.getpid())] if self.rotulo_processo else []
+        linhas = []
+        for metrica in self._metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.amostras(fixos))
+        return "\n".join(linhas) + "\n"
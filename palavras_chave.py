@@ -0,0 +1,78 @@
+# palavras_chave.py - Busca de várias palavras-chave de uma vez (Aho–Corasick)
+#
+# O autômato é montado uma vez com todas as palavras-chave (já normalizadas:
+# sem acentos, minúsculas) e percorre a pergunta uma única vez, qualquer que
+# seja a quantidade de palavras-chave. Cada palavra-chave aponta para uma
+# resposta e tem uma prioridade; quando a pergunta cita mais de uma resposta,
+# vence a de maior prioridade.
+
+from collections import deque
+
+# A mesma normalização do roteador de intenções
+from intencao_local import normalizar_texto
+
+
+class KeywordMatcher:
+    """
+    Autômato de Aho–Corasick sobre o texto normalizado.
+
+    As palavras-chave casam a partir do início de uma palavra da pergunta:
+    "horario" casa com "horários", mas "ceu" não casa dentro de "museu".
+    """
+
+    def __init__(self, palavras_chave):
+        """`palavras_chave`: iterável de (palavra-chave, resposta, prioridade)."""
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._saida = [None]  # melhor (prioridade, resposta) que termina no estado
+        self.total = 0
+        for palavra, resposta, prioridade in palavras_chave:
+            self._inserir(" " + normalizar_texto(palavra), resposta, prioridade)
+        self._montar_falhas()
+
+    def _inserir(self, padrao, resposta, prioridade):
+        estado = 0
+        for c in padrao:
+            proximo = self._transicoes[estado].get(c)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes[estado][c] = proximo
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._saida.append(None)
+            estado = proximo
+        atual = self._saida[estado]
+        if atual is None or prioridade > atual[0]:
+            self._saida[estado] = (prioridade, resposta)
+        self.total += 1
+
+    def _montar_falhas(self):
+        # Busca em largura: o estado de falha de cada nó já está pronto quando ele é visitado
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for c, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and c not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(c, 0)
+                self._falha[proximo] = destino if destino != proximo else 0
+                # Herda a saída do estado de falha (palavra-chave que é sufixo desta)
+                herdada = self._saida[self._falha[proximo]]
+                if herdada and (self._saida[proximo] is None or herdada[0] > self._saida[proximo][0]):
+                    self._saida[proximo] = herdada
+
+    def buscar(self, texto):
+        """Resposta de maior prioridade citada no texto (a primeira em caso de empate), ou None."""
+        transicoes, falha, saida = self._transicoes, self._falha, self._saida
+        melhor = None
+        estado = 0
+        for c in " " + normalizar_texto(texto):
+            while estado and c not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(c, 0)
+            achado = saida[estado]
+            if achado is not None and (melhor is None or achado[0] > melhor[0]):
+                melhor = achado
+        return melhor[1] if melhor else None
@@ -0,0 +1,303 @@
+# resiliencia.py - Prazos, retentativas, hedging e disjuntor para as chamadas à IA
+#
+# Cada chamada recebe um prazo total; as tentativas usam o tempo que resta como
+# timeout HTTP, então uma chamada lenta nunca prende um worker além do prazo.
+# Erros transitórios (429, 5xx, timeout, conexão) são repetidos com espera
+# exponencial e jitter. Com o hedging ligado, se a primeira tentativa passar do
+# p95 recente, uma segunda é disparada em paralelo e vale a que terminar antes.
+# O disjuntor abre depois de falhas seguidas e passa a falhar na hora, para o
+# app responder do cache ou localmente enquanto a API está degradada.
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import httpx
+from google.genai import errors, types
+
+CODIGOS_RETENTAVEIS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class CircuitoAberto(Exception):
+    """A API está degradada; a chamada nem foi feita."""
+
+
+class PrazoEsgotado(Exception):
+    """O prazo total da chamada acabou antes de uma resposta."""
+
+
+def retentavel(erro):
+    """Erros transitórios que valem uma nova tentativa (e contam como degradação)."""
+    if isinstance(erro, errors.APIError):
+        return erro.code in CODIGOS_RETENTAVEIS
+    return isinstance(erro, (httpx.TimeoutException, httpx.TransportError, PrazoEsgotado))
+
+
+def com_timeout(config, segundos):
+    """Cópia do config com o timeout HTTP desta tentativa (o config original é compartilhado)."""
+    opcoes = types.HttpOptions(timeout=max(1, int(segundos * 1000)))
+    if config is None:
+        return types.GenerateContentConfig(http_options=opcoes)
+    return config.model_copy(update={"http_options": opcoes})
+
+
+class CircuitBreaker:
+    """
+    Disjuntor: fechado -> aberto após `limite_falhas` falhas seguidas; depois de
+    `tempo_aberto` segundos deixa passar uma chamada de teste (meio aberto), que
+    fecha o circuito se der certo ou o reabre se falhar.
+    """
+
+    def __init__(self, limite_falhas=5, tempo_aberto=30.0):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+        self._lock = threading.Lock()
+        self.aberturas = 0
+        self.rejeitadas = 0
+
+    @property
+    def aberto(self):
+        return self._falhas >= self.limite_falhas
+
+    def permitir(self):
+        with self._lock:
+            if not self.aberto:
+                return True
+            if time.monotonic() >= self._aberto_ate and not self._testando:
+                self._testando = True  # meio aberto: uma chamada de teste
+                return True
+            self.rejeitadas += 1
+            return False
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+            if self._falhas >= self.limite_falhas:
+                if self._falhas == self.limite_falhas:
+                    self.aberturas += 1
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+
+
+class LatencyWindow:
+    """Latências das últimas chamadas bem-sucedidas, para o limite do hedging."""
+
+    def __init__(self, tamanho=200):
+        self._valores = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos):
+        with self._lock:
+            self._valores.append(segundos)
+
+    def percentil(self, p):
+        with self._lock:
+            valores = sorted(self._valores)
+        if len(valores) < 20:
+            return None  # amostras insuficientes
+        return valores[min(len(valores) - 1, int(p / 100 * len(valores)))]
+
+
+class ResilientCaller:
+    """
+    Executa `func(timeout_segundos)` com prazo, retentativas, hedging e disjuntor.
+
+    `func` deve usar o timeout recebido na chamada HTTP (ver `com_timeout`).
+    """
+
+    def __init__(self, breaker=None, prazo=20.0, retentativas=2, atraso_inicial=0.5, atraso_maximo=4.0,
+                 hedge=False, hedge_percentil=95, hedge_minimo=1.0, hedge_workers=16):
+        self.breaker = breaker or CircuitBreaker()
+        self.prazo = prazo
+        self.retentativas = retentativas
+        self.atraso_inicial = atraso_inicial
+        self.atraso_maximo = atraso_maximo
+        self.hedge = hedge
+        self.hedge_percentil = hedge_percentil
+        self.hedge_minimo = hedge_minimo
+        self.latencias = LatencyWindow()
+        self._pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='hedge') if hedge else None
+        self.retentativas_feitas = 0
+        self.hedges_disparados = 0
+        self.hedges_vencedores = 0
+
+    def _espera(self, tentativa, restante):
+        """Backoff exponencial com jitter completo, limitado ao prazo restante."""
+        teto = min(self.atraso_maximo, self.atraso_inicial * (2 ** tentativa))
+        return min(random.uniform(0, teto), max(0.0, restante - 0.05))
+
+    def _limite_hedge(self):
+        p = self.latencias.percentil(self.hedge_percentil)
+        return max(p, self.hedge_minimo) if p is not None else None
+
+    def _resultado(self, erro):
+        # Erros do cliente (400, 403...) mostram que a API responde: não contam como degradação
+        if erro is not None and retentavel(erro):
+            self.breaker.falha()
+        else:
+            self.breaker.sucesso()
+
+    def chamar(self, func, hedge=True):
+        if not self.breaker.permitir():
+            raise CircuitoAberto("Circuito aberto: API Gemini degradada.")
+        fim = time.monotonic() + self.prazo
+        tentativa = 0
+        while True:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                self._resultado(PrazoEsgotado())
+                raise PrazoEsgotado(f"Prazo de {self.prazo:.0f}s esgotado.")
+            inicio = time.monotonic()
+            try:
+                if hedge and self._pool is not None:
+                    resultado = self._com_hedge(func, fim)
+                else:
+                    resultado = func(restante)
+                self.latencias.registrar(time.monotonic() - inicio)
+                self._resultado(None)
+                return resultado
+            except Exception as e:
+                restante = fim - time.monotonic()
+                if not retentavel(e) or tentativa >= self.retentativas or restante <= 0.1:
+                    self._resultado(e)
+                    raise
+                tentativa += 1
+                self.retentativas_feitas += 1
+                time.sleep(self._espera(tentativa, restante))
+
+    def _com_hedge(self, func, fim):
+        limite = self._limite_hedge()
+        primeira = self._pool.submit(func, fim - time.monotonic())
+        if limite is None:
+            return primeira.result()
+        prontas, _ = wait([primeira], timeout=min(limite, max(0.0, fim - time.monotonic())))
+        if prontas:
+            return primeira.result()
+        self.hedges_disparados += 1
+        segunda = self._pool.submit(func, max(0.001, fim - time.monotonic()))
+        pendentes = {primeira, segunda}
+        erro = None
+        while pendentes:
+            prontas, pendentes = wait(pendentes, timeout=max(0.0, fim - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not prontas:
+                raise PrazoEsgotado("Prazo esgotado com o hedging em andamento.")
+            for futuro in prontas:
+                if futuro.exception() is None:
+                    if futuro is segunda:
+                        self.hedges_vencedores += 1
+                    return futuro.result()
+                erro = futuro.exception()
+        raise erro
+
+    async def chamar_async(self, func, hedge=True):
+        """Versão assíncrona: `func(timeout_segundos)` devolve um awaitable."""
+        if not self.breaker.permitir():
+            raise CircuitoAberto("Circuito aberto: API Gemini degradada.")
+        fim = time.monotonic() + self.prazo
+        tentativa = 0
+        while True:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                self._resultado(PrazoEsgotado())
+                raise PrazoEsgotado(f"Prazo de {self.prazo:.0f}s esgotado.")
+            inicio = time.monotonic()
+            try:
+                if hedge and self.hedge:
+                    resultado = await self._com_hedge_async(func, fim)
+                else:
+                    resultado = await asyncio.wait_for(func(restante), restante)
+                self.latencias.registrar(time.monotonic() - inicio)
+                self._resultado(None)
+                return resultado
+            except asyncio.TimeoutError:
+                erro = PrazoEsgotado(f"Prazo de {self.prazo:.0f}s esgotado.")
+                self._resultado(erro)
+                raise erro
+            except Exception as e:
+                restante = fim - time.monotonic()
+                if not retentavel(e) or tentativa >= self.retentativas or restante <= 0.1:
+                    self._resultado(e)
+                    raise
+                tentativa += 1
+                self.retentativas_feitas += 1
+                await asyncio.sleep(self._espera(tentativa, restante))
+
+    async def _com_hedge_async(self, func, fim):
+        limite = self._limite_hedge()
+        primeira = asyncio.ensure_future(func(fim - time.monotonic()))
+        if limite is None:
+            return await asyncio.wait_for(primeira, max(0.001, fim - time.monotonic()))
+        prontas, _ = await asyncio.wait([primeira], timeout=min(limite, max(0.0, fim - time.monotonic())))
+        if prontas:
+            return primeira.result()
+        self.hedges_disparados += 1
+        segunda = asyncio.ensure_future(func(max(0.001, fim - time.monotonic())))
+        pendentes = {primeira, segunda}
+        erro = None
+        try:
+            while pendentes:
+                prontas, pendentes = await asyncio.wait(
+                    pendentes, timeout=max(0.0, fim - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+                if not prontas:
+                    raise asyncio.TimeoutError()
+                for tarefa in prontas:
+                    if tarefa.exception() is None:
+                        if tarefa is segunda:
+                            self.hedges_vencedores += 1
+                        return tarefa.result()
+                    erro = tarefa.exception()
+            raise erro
+        finally:
+            for tarefa in pendentes:
+                tarefa.cancel()  # no modo async a tentativa perdedora é cancelada de fato
+
+    def stats(self):
+        return {
+            "circuit_open": self.breaker.aberto,
+            "circuit_openings": self.breaker.aberturas,
+            "rejected": self.breaker.rejeitadas,
+            "retries": self.retentativas_feitas,
+            "hedges": self.hedges_disparados,
+            "hedges_won": self.hedges_vencedores,
+        }
+
+
+def create_resilient_caller():
+    """ResilientCaller configurado pelas variáveis GEMINI_DEADLINE_SECONDS, GEMINI_RETRIES, GEMINI_HEDGE etc."""
+    return ResilientCaller(
+        breaker=CircuitBreaker(
+            limite_falhas=int(os.environ.get('CIRCUIT_FAILURES', '5')),
+            tempo_aberto=float(os.environ.get('CIRCUIT_OPEN_SECONDS', '30')),
+        ),
+        prazo=float(os.environ.get('GEMINI_DEADLINE_SECONDS', '20')),
+        retentativas=int(os.environ.get('GEMINI_RETRIES', '2')),
+        atraso_inicial=float(os.environ.get('GEMINI_RETRY_BASE_SECONDS', '0.5')),
+        hedge=os.environ.get('GEMINI_HEDGE', '0') == '1',
+        hedge_percentil=float(os.environ.get('GEMINI_HEDGE_PERCENTILE', '95')),
+        hedge_minimo=float(os.environ.get('GEMINI_HEDGE_MIN_SECONDS', '1.0')),
+    )
+
+
+def create_classifier_caller(breaker):
+    """
+    ResilientCaller das chamadas curtas (classificador de intenção): prazo de
+    GEMINI_CLASSIFIER_DEADLINE_SECONDS, sem retentativas nem hedging (na dúvida
+    a mensagem segue como "chat"). Usa o mesmo disjuntor das demais chamadas.
+    """
+    return ResilientCaller(
+        breaker=breaker,
+        prazo=float(os.environ.get('GEMINI_CLASSIFIER_DEADLINE_SECONDS', '3')),
+        retentativas=0,
+    )
@@ -0,0 +1,141 @@
+# rotacao_versiculos.py - Versículo do dia e rodízio de versículos por usuário
+#
+# Em vez de sortear com random.choice a cada pedido, a ordem dos versículos é uma
+# permutação embaralhada com semente fixa: uma por ciclo de dias (versículo do
+# dia) e uma por dia e por balde de usuários (rodízio). Assim o mesmo usuário não
+# recebe o mesmo versículo duas vezes seguidas, todas as instâncias do app
+# concordam sobre o versículo do dia e a página dele pode ser cacheada por CDNs e
+# navegadores até a meia-noite (ETag forte + Cache-Control).
+
+import json
+import zlib
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+
+def _texto(versiculo):
+    return getattr(versiculo, "texto", str(versiculo))
+
+
+class VerseRotation:
+    """
+    Ordem determinística dos versículos por dia e por usuário.
+
+    `versiculos` pode ser a lista de textos de carregar_versiculos() ou os
+    Versiculo de um VerseStore (aí a página do dia traz a referência separada).
+    """
+
+    def __init__(self, versiculos, semente="", baldes=64, max_usuarios=10000, fuso=None):
+        self.versiculos = list(versiculos)
+        self.semente = semente
+        self.baldes = max(int(baldes), 1)
+        self.max_usuarios = max_usuarios
+        self.fuso = ZoneInfo(fuso) if fuso and ZoneInfo else None
+        self._permutacoes = OrderedDict()  # chave -> permutação (as mais recentes)
+        self._usuarios = OrderedDict()  # usuário -> [dia, posição, último índice entregue]
+        self._pagina = None  # (dia, corpo, etag) do versículo do dia já renderizado
+        self._lock = threading.Lock()
+
+    def hoje(self):
+        return datetime.now(self.fuso).date()
+
+    def _permutacao(self, *chave):
+        """Permutação dos índices com semente (semente, chave); mantém as mais usadas em memória."""
+        perm = self._permutacoes.get(chave)
+        if perm is None:
+            perm = list(range(len(self.versiculos)))
+            random.Random(f"{self.semente}:{chave}").shuffle(perm)
+            self._permutacoes[chave] = perm
+            if len(self._permutacoes) > self.baldes * 2 + 4:
+                self._permutacoes.popitem(last=False)
+        else:
+            self._permutacoes.move_to_end(chave)
+        return perm
+
+    # --- Versículo do dia ---
+
+    def indice_do_dia(self, dia):
+        total = len(self.versiculos)
+        if total <= 2:
+            return dia.toordinal() % total
+        # Um ciclo de `total` dias percorre todos os versículos sem repetir
+        ciclo, posicao = divmod(dia.toordinal(), total)
+        perm = self._permutacao("dia", ciclo)
+        if posicao <= 1 and perm[0] == self._permutacao("dia", ciclo - 1)[-1]:
+            # Virada de ciclo: não repete o último dia do ciclo anterior. A troca
+            # é feita numa cópia, para não depender do que está no cache
+            perm = [perm[1], perm[0]]
+        return perm[posicao]
+
+    def do_dia(self, dia=None):
+        """Versículo do dia (o mesmo em todas as instâncias com a mesma semente), ou None."""
+        if not self.versiculos:
+            return None
+        with self._lock:
+            return self.versiculos[self.indice_do_dia(dia or self.hoje())]
+
+    def pagina_do_dia(self):
+        """
+        (corpo JSON, etag, segundos até a meia-noite) do versículo do dia. O corpo
+        é renderizado uma vez por dia; o ETag muda só quando o versículo muda.
+        """
+        dia = self.hoje()
+        with self._lock:
+            if self._pagina is None or self._pagina[0] != dia:
+                versiculo = self.versiculos[self.indice_do_dia(dia)] if self.versiculos else None
+                dados = {"data": dia.isoformat(), "versiculo": _texto(versiculo) if versiculo else None,
+                         "referencia": getattr(versiculo, "referencia", None)}
+                corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+                self._pagina = (dia, corpo, hashlib.sha256(corpo).hexdigest()[:20])
+            _, corpo, etag = self._pagina
+        agora = datetime.now(self.fuso)
+        meia_noite = datetime.combine(dia + timedelta(days=1), datetime.min.time(), tzinfo=agora.tzinfo)
+        return corpo, etag, max(int((meia_noite - agora).total_seconds()), 1)
+
+    # --- Rodízio por usuário ---
+
+    def proximo(self, usuario, dia=None):
+        """
+        Próximo versículo do usuário: segue a permutação do dia do balde dele,
+        a partir de um deslocamento próprio, sem repetir o último entregue.
+        """
+        total = len(self.versiculos)
+        if not total:
+            return None
+        dia = dia or self.hoje()
+        hash_usuario = zlib.crc32(str(usuario).encode("utf-8"))
+        with self._lock:
+            perm = self._permutacao("usuario", dia.toordinal(), hash_usuario % self.baldes)
+            estado = self._usuarios.pop(usuario, None)
+            if estado is None or estado[0] != dia:
+                ultimo = estado[2] if estado else None
+                posicao = (hash_usuario // self.baldes) % total
+            else:
+                _, posicao, ultimo = estado
+            indice = perm[posicao % total]
+            if indice == ultimo and total > 1:
+                # Só acontece na virada do dia (dentro da permutação não há repetição)
+                posicao += 1
+                indice = perm[posicao % total]
+            self._usuarios[usuario] = [dia, posicao + 1, indice]
+            if len(self._usuarios) > self.max_usuarios:
+                self._usuarios.popitem(last=False)
+        return self.versiculos[indice]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "verses": len(self.versiculos),
+                "buckets": self.baldes,
+                "users": len(self._usuarios),
+                "permutations": len(self._permutacoes),
+                "rendered_day": self._pagina[0].isoformat() if self._pagina else None,
+            }
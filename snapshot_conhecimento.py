@@ -0,0 +1,130 @@
+# snapshot_conhecimento.py - Versão compartilhada da base de conhecimento entre workers
+#
+# O admin salva em um worker do gunicorn; os demais percebem a mudança por um
+# os.stat barato a cada requisição e recarregam sob demanda. A gravação é
+# atômica (arquivo temporário + rename), então nenhum leitor vê o arquivo pela metade.
+
+import os
+import stat
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+from indice_conhecimento import KnowledgeIndex
+
+
+def _modo_do_arquivo(caminho):
+    """Permissões do arquivo existente; para um arquivo novo, 0644."""
+    # Sem consultar a umask: os.umask() troca a do processo todo, e outra thread
+    # do servidor poderia criar um arquivo nesse meio-tempo
+    try:
+        return stat.S_IMODE(os.stat(caminho).st_mode)
+    except FileNotFoundError:
+        return 0o644
+
+
+def escrever_atomico(caminho, conteudo):
+    """Grava em um arquivo temporário no mesmo diretório e troca com os.replace."""
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".tmp-", suffix=os.path.basename(caminho))
+    try:
+        # fdopen antes de tudo: se algo falhar depois, o with fecha o descritor
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # mkstemp cria com 0600: mantém as permissões de quem já lia o arquivo
+            os.chmod(temporario, _modo_do_arquivo(caminho))
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+class KnowledgeSnapshot:
+    """
+    Conteúdo, índice BM25 e número de versão do arquivo de conhecimento.
+
+    O número de versão fica em `<arquivo>.version` e é incrementado a cada
+    gravação; `refresh()` compara a assinatura (mtime/tamanho) dos dois
+    arquivos e só relê o conhecimento quando ela muda.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.version_path = filepath + ".version"
+        self.version = 0
+        self.content = ""
+        self.index = KnowledgeIndex("")
+        self._assinatura = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _assinatura_atual(self):
+        assinatura = []
+        for caminho in (self.filepath, self.version_path):
+            try:
+                st = os.stat(caminho)
+                assinatura.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                assinatura.append(None)
+        return tuple(assinatura)
+
+    def _ler_versao(self):
+        try:
+            with open(self.version_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def refresh(self):
+        """Recarrega se o arquivo ou a versão mudaram. Retorna True quando houve recarga."""
+        assinatura = self._assinatura_atual()
+        if assinatura == self._assinatura:
+            return False
+        with self._lock:
+            if assinatura == self._assinatura:
+                return False
+            try:
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                print(f"CRÍTICO: Arquivo de conhecimento '{self.filepath}' não encontrado.")
+                content = ""
+            except Exception as e:
+                print(f"ERRO: Falha ao ler o arquivo de conhecimento: {e}")
+                return False
+            self._aplicar(content, self._ler_versao())
+            self._assinatura = assinatura
+            print(f"INFO: Conhecimento carregado (versão {self.version}, "
+                  f"{self.index.secoes_reprocessadas} de {len(self.index.secoes)} seções reindexadas).")
+            return True
+
+    def _aplicar(self, content, version):
+        # O índice novo é montado antes da troca; leitores concorrentes continuam com o anterior
+        self.index = self.index.atualizado(content)
+        self.content = content
+        self.version = version
+
+    def save(self, content):
+        """Grava o conhecimento de forma atômica, incrementa a versão e recarrega localmente."""
+        with open(self.version_path + ".lock", 'a') as trava:
+            if fcntl:
+                fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                escrever_atomico(self.filepath, content)
+                version = self._ler_versao() + 1
+                escrever_atomico(self.version_path, str(version))
+                assinatura = self._assinatura_atual()
+            finally:
+                if fcntl:
+                    fcntl.flock(trava, fcntl.LOCK_UN)
+        with self._lock:
+            self._aplicar(content, version)
+            self._assinatura = assinatura
+        return version
@@ -1,4 +1,4 @@
-// static/script.js - VERSÃO V60.55 (Envio de Áudio Restaurado)
+// static/script.js - VERSÃO V60.56 (Respostas em Streaming via SSE)
 
 // --- Funções de Ajuda ---
 
@@ -54,6 +54,14 @@ function appendMessage(text, sender, type = 'text', data = null) {
 
     chatBox.appendChild(messageElement);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return messageElement;
+}
+
+// V60.56: Atualiza uma mensagem já exibida com o texto acumulado do streaming
+function updateMessage(messageElement, text) {
+    const chatBox = document.getElementById('chat-box');
+    messageElement.innerHTML = simpleMarkdownToHtml(text);
+    chatBox.scrollTop = chatBox.scrollHeight;
 }
 
 function showTypingIndicator() {
@@ -71,6 +79,50 @@ function showTypingIndicator() {
 }
 
 
+// V60.56: Lê a resposta SSE do /api/chat/stream e renderiza cada trecho ao chegar
+async function renderStreamedResponse(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let fullText = '';
+    let messageElement = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Eventos SSE são separados por uma linha em branco
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+
+            let eventName = 'message';
+            let eventData = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) eventData += line.slice(6);
+            });
+
+            if (eventName === 'chunk') {
+                fullText += JSON.parse(eventData).texto;
+                if (messageElement) {
+                    updateMessage(messageElement, fullText);
+                } else {
+                    // O primeiro trecho substitui o indicador de digitação
+                    messageElement = appendMessage(fullText, 'ia');
+                }
+            }
+        }
+    }
+
+    if (!messageElement) {
+        throw new Error('Resposta vazia do streaming');
+    }
+}
+
+
 // --- Lógica Principal ---
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -157,9 +209,10 @@ document.addEventListener('DOMContentLoaded', function() {
         // 2. Exibir indicador de digitação
         showTypingIndicator();
 
-        // 3. Enviar mensagem para a API
+        // 3. Enviar mensagem para a API (com streaming quando habilitado)
+        const useStreaming = typeof CHAT_STREAMING !== 'undefined' && CHAT_STREAMING && window.ReadableStream;
         try {
-            const response = await fetch('/api/chat', {
+            const response = await fetch(useStreaming ? '/api/chat/stream' : '/api/chat', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -167,10 +220,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify({ mensagem: userMessage })
             });
 
-            if (!response.ok) {
+            // Sobrecarga (503) e limite de mensagens (429) trazem a resposta da Hope em JSON
+            if (!response.ok && response.status !== 503 && response.status !== 429) {
                 throw new Error(`Erro de rede: ${response.status}`);
             }
 
+            // Respostas de texto chegam como SSE; botões e erros continuam em JSON
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.startsWith('text/event-stream')) {
+                await renderStreamedResponse(response);
+                return;
+            }
+
             const data = await response.json();
             
             // 4. Exibir resposta da IA